@@ -0,0 +1,257 @@
+import os
+import json
+import threading
+import numpy as np
+
+from index_version import REWRITES_INDEX, read_index_version
+from vector_index import VectorIndex, iter_embedded_articles, normalize_rows, top_k
+
+# --- SETTINGS ---
+CACHE_DIR = os.getenv("ERBLOGX_CACHE_DIR", ".cache")
+ANN_INDEX_DIR = os.getenv("ANN_INDEX_DIR", os.path.join(CACHE_DIR, "ann"))
+# Lists probed per query; higher means better recall and slower queries.
+DEFAULT_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+# Inserts kept in the exact delta before they are folded into the lists (and saved).
+ANN_DELTA_LIMIT = int(os.getenv("ANN_DELTA_LIMIT", "4096"))
+ASSIGN_CHUNK = 8192
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest (highest cosine) centroid for every row, computed in chunks to bound memory."""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_CHUNK):
+        chunk = np.asarray(vectors[start:start + ASSIGN_CHUNK], dtype=np.float32)
+        assignments[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, iterations: int = 10,
+                    sample_size: int = 100_000, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a sample of L2-normalized vectors."""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > sample_size:
+        vectors = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+    nlist = min(nlist, len(vectors))
+    centroids = np.array(vectors[rng.choice(len(vectors), nlist, replace=False)], dtype=np.float32)
+
+    for _ in range(iterations):
+        assignments = assign_lists(vectors, centroids)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=nlist)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+        centroids[filled] = np.add.reduceat(vectors[order], starts, axis=0)
+        # Re-seed empty lists from random points so every list stays useful.
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+        centroids = normalize_rows(centroids)
+    return centroids
+
+
+def read_all_embeddings(supabase, dim: int = 768) -> tuple:
+    """(ids, float32 embeddings) of every embedded article; empty arrays for an empty corpus."""
+    ids, vectors = [], []
+    for rows, embeddings in iter_embedded_articles(supabase, 'id'):
+        ids.extend(row['id'] for row in rows)
+        vectors.append(embeddings)
+    if not vectors:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, dim), dtype=np.float32)
+    return np.asarray(ids, dtype=np.int64), np.concatenate(vectors)
+
+
+class IvfIndex:
+    """IVF-flat approximate nearest-neighbour index over L2-normalized embeddings.
+
+    Vectors are stored grouped by their nearest k-means centroid in one contiguous array, so
+    a query scores `nprobe` centroids and then only the rows of those lists. The arrays are
+    saved as .npy files and memory-mapped on load. Inserts since the last save live in a small
+    exact `VectorIndex` that is always scanned in full and merged in by `save`. `rewrite_version`
+    is the REWRITES_INDEX version the stored vectors were read at.
+    """
+
+    def __init__(self, centroids: np.ndarray, vectors: np.ndarray, ids: np.ndarray,
+                 offsets: np.ndarray, max_id: int = 0, rewrite_version: int = 0):
+        self.centroids = centroids
+        self.vectors = vectors
+        self.ids = ids
+        self.offsets = offsets
+        self.max_id = max_id
+        self.rewrite_version = rewrite_version
+        self.dim = centroids.shape[1]
+        self.delta = VectorIndex(self.dim)
+        self._lock = threading.Lock()
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    def __len__(self) -> int:
+        return len(self.ids) + len(self.delta)
+
+    @classmethod
+    def build(cls, ids, vectors, nlist: int = None, iterations: int = 10, seed: int = 0) -> "IvfIndex":
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        ids = np.asarray(ids, dtype=np.int64)
+        nlist = nlist or max(1, int(np.sqrt(len(vectors))))
+        centroids = train_centroids(vectors, nlist, iterations=iterations, seed=seed)
+        return cls._from_assignments(centroids, vectors, ids)
+
+    @classmethod
+    def _from_assignments(cls, centroids, vectors, ids) -> "IvfIndex":
+        assignments = assign_lists(vectors, centroids)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=len(centroids))
+        offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        max_id = int(ids.max()) if len(ids) else 0
+        return cls(centroids, vectors[order], ids[order], offsets, max_id)
+
+    # --- persistence ---
+
+    def compacted(self) -> "IvfIndex":
+        """A new index with the pending inserts folded into their lists; this one is left as is."""
+        with self._lock:
+            delta_ids = np.array([row['id'] for row in self.delta.rows], dtype=np.int64)
+            vectors = np.concatenate([np.asarray(self.vectors), self.delta.matrix[:len(self.delta)]])
+            ids = np.concatenate([np.asarray(self.ids), delta_ids])
+        merged = self._from_assignments(self.centroids, vectors, ids)
+        merged.max_id = max(self.max_id, merged.max_id)
+        merged.rewrite_version = self.rewrite_version
+        return merged
+
+    def save(self, path: str = ANN_INDEX_DIR):
+        """Merges pending inserts and writes the index as .npy files plus a small meta.json."""
+        if len(self.delta):
+            merged = self.compacted()
+            with self._lock:
+                self.vectors, self.ids, self.offsets = merged.vectors, merged.ids, merged.offsets
+                self.max_id = merged.max_id
+                self.delta = VectorIndex(self.dim)
+
+        with self._lock:
+            os.makedirs(path, exist_ok=True)
+            for name in ("centroids", "vectors", "ids", "offsets"):
+                np.save(os.path.join(path, f"{name}.tmp.npy"), getattr(self, name))
+            for name in ("centroids", "vectors", "ids", "offsets"):
+                os.replace(os.path.join(path, f"{name}.tmp.npy"), os.path.join(path, f"{name}.npy"))
+            with open(os.path.join(path, "meta.json"), "w") as f:
+                json.dump({"dim": self.dim, "nlist": self.nlist, "count": len(self.ids), "max_id": self.max_id,
+                           "rewrite_version": self.rewrite_version}, f)
+
+    @classmethod
+    def load(cls, path: str = ANN_INDEX_DIR, mmap: bool = True) -> "IvfIndex":
+        mode = "r" if mmap else None
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        index = cls(
+            centroids=np.load(os.path.join(path, "centroids.npy")),
+            vectors=np.load(os.path.join(path, "vectors.npy"), mmap_mode=mode),
+            ids=np.load(os.path.join(path, "ids.npy"), mmap_mode=mode),
+            offsets=np.load(os.path.join(path, "offsets.npy")),
+            max_id=meta.get("max_id", 0),
+            rewrite_version=meta.get("rewrite_version", 0),
+        )
+        print(f"ANN index loaded from {path}: {len(index)} vectors in {index.nlist} lists.")
+        return index
+
+    # --- updates ---
+
+    def add_many(self, ids, embeddings):
+        ids = [int(i) for i in ids]
+        if not ids:
+            return
+        with self._lock:
+            self.delta.add_many([{'id': i} for i in ids], embeddings)
+            self.max_id = max(self.max_id, max(ids))
+
+    def add(self, row: dict, embedding):
+        self.add_many([row['id']], np.asarray(embedding, dtype=np.float32)[None, :])
+
+    def sync(self, supabase) -> int:
+        """Adds every embedded article inserted since the index was built or last synced."""
+        added = 0
+        for rows, embeddings in iter_embedded_articles(supabase, 'id', after_id=self.max_id):
+            self.add_many([row['id'] for row in rows], embeddings)
+            added += len(rows)
+        return added
+
+    def reassigned(self, supabase) -> "IvfIndex":
+        """A new index over every embedded article, assigned to the current centroids (no retraining)."""
+        ids, vectors = read_all_embeddings(supabase, self.dim)
+        return self._from_assignments(self.centroids, normalize_rows(vectors), ids)
+
+    def refresh(self, supabase) -> "IvfIndex":
+        """Brings the index up to date: this index with new articles added, or a replacement.
+
+        Sync only sees ids above `max_id`, so when existing articles were rewritten (embedded late
+        by vector.py, re-embedded by enrichment) every embedding is read again into a new index.
+        A delta that reached `ANN_DELTA_LIMIT` is folded into a new index too. Replacements are
+        built aside, so searches keep using this index meanwhile; the caller saves them.
+        """
+        rewrite_version = read_index_version(supabase, REWRITES_INDEX)
+        if rewrite_version is not None and rewrite_version != self.rewrite_version:
+            index = self.reassigned(supabase)
+            index.rewrite_version = rewrite_version
+            print(f"ANN index reloaded after rewrites: {len(index)} vectors.")
+            return index
+        print(f"ANN index synced: {self.sync(supabase)} new articles.")
+        return self.compacted() if len(self.delta) >= ANN_DELTA_LIMIT else self
+
+    # --- search ---
+
+    def search(self, query, k: int = 10, nprobe: int = DEFAULT_NPROBE):
+        """Approximate top-k as (ids, cosine scores), best first."""
+        query = normalize_rows(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        probe = top_k(self.centroids @ query, nprobe)
+        # One consistent view: inserts from POST /articles and `save` swap these concurrently
+        with self._lock:
+            vectors, ids, offsets = self.vectors, self.ids, self.offsets
+            size = len(self.delta)
+            delta_matrix = self.delta.matrix[:size]
+            delta_ids = np.array([row['id'] for row in self.delta.rows[:size]], dtype=np.int64)
+
+        id_parts, score_parts = [], []
+        for list_no in probe:
+            start, end = offsets[list_no], offsets[list_no + 1]
+            if end > start:
+                score_parts.append(vectors[start:end] @ query)
+                id_parts.append(ids[start:end])
+        if size:
+            score_parts.append(delta_matrix @ query)
+            id_parts.append(delta_ids)
+        if not score_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        scores = np.concatenate(score_parts)
+        ids = np.concatenate(id_parts)
+        best = top_k(scores, k)
+        return ids[best], scores[best]
+
+
+if __name__ == "__main__":
+    # Offline build / update:  python ann_index.py [--rebuild] [--nlist N]
+    import argparse
+    from dotenv import load_dotenv
+    from supabase import create_client
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rebuild", action="store_true", help="retrain centroids from scratch")
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--path", default=ANN_INDEX_DIR)
+    args = parser.parse_args()
+
+    load_dotenv()
+    supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_ANON"))
+
+    if not args.rebuild and os.path.exists(os.path.join(args.path, "meta.json")):
+        ann = IvfIndex.load(args.path, mmap=False).refresh(supabase)
+    else:
+        rewrite_version = read_index_version(supabase, REWRITES_INDEX) or 0
+        all_ids, all_vectors = read_all_embeddings(supabase)
+        if not len(all_ids):
+            raise SystemExit("No embedded articles yet; run vector.py first.")
+        print(f"Building IVF index over {len(all_ids)} articles...")
+        ann = IvfIndex.build(all_ids, all_vectors, nlist=args.nlist)
+        ann.rewrite_version = rewrite_version
+    ann.save(args.path)
+    print(f"Saved ANN index to {args.path}: {len(ann)} vectors in {ann.nlist} lists.")
@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import time
+
+
+class Histogram:
+    """Counts of observed values in fixed `<= bound` buckets, plus an overflow bucket."""
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            for i, bound in enumerate(self.bounds):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+            else:
+                self.counts[-1] += 1
+            self.count += 1
+            self.total += value
+
+    def stats(self) -> dict:
+        buckets = {f"le_{bound}": n for bound, n in zip(self.bounds, self.counts)}
+        buckets["inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else 0.0,
+            "buckets": buckets,
+        }
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-item requests into one batched call.
+
+    `submit(item)` queues the item and waits for its result. A collector task takes the
+    first queued item, keeps gathering until `window_ms` has passed or `max_batch` items are
+    waiting, then runs `process_batch(items)` once in `executor` and hands every caller its
+    own entry of the returned sequence. Identical items in a batch are processed once.
+    """
+
+    def __init__(self, process_batch, executor=None, window_ms: float = 5, max_batch: int = 32):
+        self.process_batch = process_batch
+        self.executor = executor
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64, 128])
+        self.queue_depths = Histogram([0, 1, 2, 4, 8, 16, 32, 64, 128, 256])
+        self.wait_ms = Histogram([1, 2, 5, 10, 20, 50, 100, 250, 1000])
+        self.batches = 0
+        self.items = 0
+        self._queue = None
+        self._arrived = None
+        self._worker = None
+
+    def _ensure_worker(self):
+        # Created lazily so they bind to the event loop the server is running on
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._arrived = asyncio.Event()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, item):
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        self.queue_depths.observe(self._queue.qsize())
+        self._queue.put_nowait((item, future, time.perf_counter()))
+        self._arrived.set()
+        return await future
+
+    def _drain(self, batch: list):
+        while len(batch) < self.max_batch and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while True:
+            self._drain(batch)
+            remaining = deadline - time.perf_counter()
+            if len(batch) >= self.max_batch or remaining <= 0:
+                return batch
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), remaining)
+            except asyncio.TimeoutError:
+                self._drain(batch)
+                return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            started = time.perf_counter()
+            unique = list(dict.fromkeys(item for item, _, _ in batch))
+            self.batches += 1
+            self.items += len(batch)
+            self.batch_sizes.observe(len(unique))
+            for _, _, queued_at in batch:
+                self.wait_ms.observe((started - queued_at) * 1000)
+            try:
+                results = await loop.run_in_executor(self.executor, self.process_batch, unique)
+                by_item = dict(zip(unique, results))
+                for item, future, _ in batch:
+                    if not future.done():
+                        future.set_result(by_item[item])
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "items": self.items,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_depth_on_submit": self.queue_depths.stats(),
+            "batch_size": self.batch_sizes.stats(),
+            "queue_wait_ms": self.wait_ms.stats(),
+        }
@@ -0,0 +1,65 @@
+"""recall@10 vs. latency of the IVF index against exact search, across nprobe settings.
+
+The synthetic corpus is a mixture of Gaussian topics, which is closer to real article
+embeddings than uniform noise (where no ANN method does well).
+
+Run from backend/:
+    python -m benchmarks.ann_recall --size 100000 --nprobe 1,2,4,8,16,32,64
+"""
+import argparse
+import time
+
+import numpy as np
+
+from ann_index import IvfIndex
+from vector_index import normalize_rows, top_k
+
+
+def clustered_corpus(size: int, dim: int, topics: int, spread: float = 0.6, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, dim), dtype=np.float32)
+    labels = rng.integers(0, topics, size)
+    vectors = centers[labels] + spread * rng.standard_normal((size, dim), dtype=np.float32)
+    return normalize_rows(vectors)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", default="1,2,4,8,16,32,64")
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    corpus = clustered_corpus(args.size, args.dim, args.topics)
+    queries = clustered_corpus(args.queries, args.dim, args.topics, seed=0)[::-1].copy()
+    queries = normalize_rows(queries + 0.1 * np.random.default_rng(2).standard_normal(queries.shape, dtype=np.float32))
+
+    start = time.perf_counter()
+    ann = IvfIndex.build(np.arange(args.size), corpus, nlist=args.nlist)
+    print(f"built {ann.nlist} lists over {args.size} vectors in {time.perf_counter() - start:.1f}s")
+
+    exact_ms, truth = [], []
+    for q in queries:
+        start = time.perf_counter()
+        truth.append(set(top_k(corpus @ q, args.k).tolist()))
+        exact_ms.append((time.perf_counter() - start) * 1000)
+    print(f"{'exact':>8}  recall@{args.k}=1.000  p50={np.percentile(exact_ms, 50):7.2f} ms  "
+          f"p99={np.percentile(exact_ms, 99):7.2f} ms")
+
+    for nprobe in (int(n) for n in args.nprobe.split(",")):
+        timings, hits = [], 0
+        for q, expected in zip(queries, truth):
+            start = time.perf_counter()
+            ids, _ = ann.search(q, args.k, nprobe=nprobe)
+            timings.append((time.perf_counter() - start) * 1000)
+            hits += len(expected & set(ids.tolist()))
+        print(f"nprobe={nprobe:<3} recall@{args.k}={hits / (args.k * len(queries)):.3f}  "
+              f"p50={np.percentile(timings, 50):7.2f} ms  p99={np.percentile(timings, 99):7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""BM25 latency and exact-term relevance, alone and fused with vector search, on a synthetic corpus.
+
+Run from backend/:
+    python -m benchmarks.bm25_search --articles 16000
+
+Every query is a rare identifier (like "pgvector" or "io_uring") planted in a few articles, plus a
+common word. The "semantic" ranking is simulated: article vectors sit around topic centroids and
+the query vector only knows the topic, which is how an embedding treats an unseen tool name.
+Recall@10 is the share of the planted articles found in the top 10.
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from bm25 import Bm25Index, reciprocal_rank_fusion
+from vector_index import VectorIndex
+
+
+def synthetic_corpus(articles: int, identifiers: int, seed: int = 0):
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(20_000)]
+    weights = 1 / np.arange(1, len(vocabulary) + 1)  # Zipf-like term frequencies
+    cumulative = np.cumsum(weights / weights.sum())
+    nprng = np.random.default_rng(seed)
+
+    def words(count):
+        return [vocabulary[i] for i in np.searchsorted(cumulative, nprng.random(count))]
+
+    rows = []
+    for i in range(articles):
+        rows.append({
+            "id": i + 1,
+            "title": " ".join(words(8)),
+            "content": " ".join(words(rng.choice([150, 400, 800, 1500]))),
+        })
+
+    planted = {}
+    for j in range(identifiers):
+        name = f"tool_{j}x"
+        targets = rng.sample(range(articles), 3)
+        for t in targets:
+            rows[t]["content"] += f" we benchmarked {name} in production."
+        planted[name] = {rows[t]["id"] for t in targets}
+    return rows, planted
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--articles", type=int, default=16000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--topics", type=int, default=50)
+    parser.add_argument("--depth", type=int, default=50, help="candidates per ranking before fusion")
+    args = parser.parse_args()
+
+    rows, planted = synthetic_corpus(args.articles, args.queries)
+    start = time.perf_counter()
+    index = Bm25Index()
+    for i in range(0, len(rows), 500):
+        index.add_many(rows[i:i + 500])
+    index._compact()
+    print(f"Indexed {len(index)} articles, {len(index.vocab)} terms in {time.perf_counter() - start:.1f}s; "
+          f"postings {index.nbytes / 1e6:.1f} MB")
+
+    rng = np.random.default_rng(1)
+    centroids = rng.standard_normal((args.topics, args.dim), dtype=np.float32)
+    topic_of = rng.integers(0, args.topics, len(rows))
+    vectors = VectorIndex(args.dim)
+    vectors.add_many([{"id": row["id"]} for row in rows],
+                     centroids[topic_of] + 0.8 * rng.standard_normal((len(rows), args.dim), dtype=np.float32))
+
+    recall = {"bm25": [], "semantic": [], "hybrid": []}
+    latency = {"bm25": [], "hybrid": []}
+    for name, relevant in planted.items():
+        query = f"{name} term3"
+        some_target = next(iter(relevant)) - 1
+        query_vector = centroids[topic_of[some_target]] + 0.8 * rng.standard_normal(args.dim, dtype=np.float32)
+
+        t = time.perf_counter()
+        lexical_ids, _ = index.search(query, args.depth)
+        latency["bm25"].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        semantic = [row["id"] for row in vectors.search(query_vector, -1.0, args.depth)]
+        lexical_ids, _ = index.search(query, args.depth)
+        fused = [doc_id for doc_id, _ in reciprocal_rank_fusion(semantic, lexical_ids.tolist())[:10]]
+        latency["hybrid"].append(time.perf_counter() - t)
+
+        recall["bm25"].append(len(relevant & set(lexical_ids[:10].tolist())) / len(relevant))
+        recall["semantic"].append(len(relevant & set(semantic[:10])) / len(relevant))
+        recall["hybrid"].append(len(relevant & set(fused)) / len(relevant))
+
+    print(f"{'ranking':<10} {'recall@10':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for ranking in ("bm25", "semantic", "hybrid"):
+        line = f"{ranking:<10} {np.mean(recall[ranking]):>10.3f}"
+        if ranking in latency:
+            ms = np.array(latency[ranking]) * 1000
+            line += f" {np.percentile(ms, 50):>8.2f} {np.percentile(ms, 99):>8.2f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Rows/second written by per-feed inserts versus the shared BulkWriter, against benchmarks.fake_postgrest.
+
+Run from backend/:
+    python -m benchmarks.bulk_writes --articles 5000 --fail-rate 0.05
+
+Starts the fake PostgREST server in a subprocess. Articles arrive in feeds of a few rows, each
+with a 768-float embedding, and --bad-every'th one is a row the database rejects. The baseline
+is the old write path: one insert per feed with the embedding as a JSON float list, where any
+error loses the whole feed. The writer batches across feeds by rows and bytes, sends compact
+vector literals, runs --concurrency flushes at once, retries 503s and splits rejected batches.
+"""
+import argparse
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+from supabase import create_client
+
+from bulk_writer import WRITE_BATCH_BYTES, WRITE_BATCH_ROWS, BulkWriter
+
+PARAGRAPH = ("We moved the ingestion path to batched writes and measured p99 latency before and "
+             "after the change, then rolled it out behind a flag to one region at a time. ")
+
+
+def start_server(args) -> subprocess.Popen:
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.fake_postgrest", "--port", str(args.port),
+                               "--delay", str(args.delay), "--mb-per-s", str(args.mb_per_s),
+                               "--fail-rate", str(args.fail_rate)])
+    for _ in range(100):
+        try:
+            httpx.get(f"{args.url}/stats")
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("fake PostgREST server did not start")
+
+
+def make_feeds(articles: int, feed_size: int, bad_every: int, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((articles, 768)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    rows = [{
+        "title": f"{'BAD ' if bad_every and i % bad_every == bad_every - 1 else ''}Post {i}",
+        "url": f"https://blog.example.com/posts/{i}",
+        "published_date": "2026-01-01T00:00:00Z",
+        "company": f"Company {i // feed_size}",
+        "content": PARAGRAPH * int(rng.integers(5, 40)),
+        "embedding": embeddings[i],
+    } for i in range(articles)]
+    return [rows[i:i + feed_size] for i in range(0, articles, feed_size)]
+
+
+def server_stats(args) -> dict:
+    return httpx.get(f"{args.url}/stats").json()
+
+
+def report(label: str, args, seconds: float, attempted: int):
+    stats = server_stats(args)
+    stored = stats["rows"].get("articles", 0)
+    print(f"{label:<28} {stored / seconds:>8.0f} {stats['requests']:>8} {stats['bytes'] / 1e6:>8.1f} "
+          f"{stored:>7} {attempted - stored:>6}")
+    httpx.post(f"{args.url}/reset")
+
+
+def per_feed_inserts(supabase, feeds: list) -> int:
+    """The old path: one insert per feed, float lists in the JSON, a failed feed is dropped."""
+    attempted = 0
+    for feed in feeds:
+        rows = [dict(row, embedding=row["embedding"].tolist()) for row in feed]
+        attempted += len(rows)
+        try:
+            supabase.table("articles").insert(rows, returning="minimal").execute()
+        except Exception:
+            pass
+    return attempted
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--articles", type=int, default=5000)
+    parser.add_argument("--feed-size", type=int, default=10)
+    parser.add_argument("--bad-every", type=int, default=1000, help="every n-th row is rejected (0 = none)")
+    parser.add_argument("--port", type=int, default=8003)
+    parser.add_argument("--delay", type=float, default=0.03, help="fake server seconds per request")
+    parser.add_argument("--mb-per-s", type=float, default=20.0, help="fake server body throughput")
+    parser.add_argument("--fail-rate", type=float, default=0.05, help="share of requests answered with a 503")
+    parser.add_argument("--concurrency", type=lambda v: [int(n) for n in v.split(",")], default=[1, 4, 8])
+    args = parser.parse_args()
+    args.url = f"http://localhost:{args.port}"
+
+    server = start_server(args)
+    try:
+        supabase = create_client(args.url, "anon-key")
+        print(f"{'writer':<28} {'rows/s':>8} {'requests':>8} {'MB sent':>8} {'stored':>7} {'lost':>6}")
+
+        feeds = make_feeds(args.articles, args.feed_size, args.bad_every)
+        start = time.perf_counter()
+        attempted = per_feed_inserts(supabase, feeds)
+        report("per-feed insert", args, time.perf_counter() - start, attempted)
+
+        for concurrency in args.concurrency:
+            feeds = make_feeds(args.articles, args.feed_size, args.bad_every)
+            writer = BulkWriter(supabase, "articles", concurrency=concurrency, backoff=0.05)
+            start = time.perf_counter()
+            for feed in feeds:
+                writer.add_many(feed)
+            writer.close()
+            report(f"BulkWriter x{concurrency}", args, time.perf_counter() - start, args.articles)
+            print(f"  {writer.report()}")
+        print(f"(batches of up to {WRITE_BATCH_ROWS} rows / {WRITE_BATCH_BYTES / 1e6:.1f} MB)")
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
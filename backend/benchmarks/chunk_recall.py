@@ -0,0 +1,92 @@
+"""Recall and latency of passage (chunk) search vs. one embedding per article, on a synthetic corpus.
+
+Run from backend/:
+    python -m benchmarks.chunk_recall --articles 16000
+
+Each article is a sequence of passage vectors drifting around its topic. The single-vector
+baseline embeds only the first FIRST_PASSAGES passages (like content[:4000]); the chunk index
+holds up to MAX_CHUNKS_PER_ARTICLE passages. Every query paraphrases one passage taken from
+anywhere in a random article, and a hit means that article is in the top 10.
+"""
+import argparse
+import copy
+import time
+
+import numpy as np
+
+from chunks import ChunkIndex, MAX_CHUNKS_PER_ARTICLE
+from vector_index import VectorIndex, normalize_rows
+
+FIRST_PASSAGES = 3  # ~4000 characters at 1200-character chunks with overlap
+PASSAGE_DRIFT = 10.0  # how far passages wander from their article's topic
+QUERY_NOISE = 5.0     # how loosely a query paraphrases its passage
+
+
+def synthetic_corpus(articles: int, dim: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    topics = normalize_rows(rng.standard_normal((articles, dim), dtype=np.float32))
+    lengths = rng.choice([1, 2, 4, 8, 16, 24], size=articles, p=[0.1, 0.2, 0.25, 0.25, 0.1, 0.1])
+    lengths = np.minimum(lengths, MAX_CHUNKS_PER_ARTICLE)
+    owners = np.repeat(np.arange(articles), lengths)
+    drift = rng.standard_normal((len(owners), dim), dtype=np.float32) / np.sqrt(dim)
+    passages = normalize_rows(topics[owners] + PASSAGE_DRIFT * drift)
+    return passages, owners, lengths
+
+
+def measure(search, queries):
+    results, timings = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search(query))
+        timings.append(time.perf_counter() - start)
+    return results, np.array(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--articles", type=int, default=16000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--nprobe", type=lambda v: [int(n) for n in v.split(",")], default=[16, 32, 64])
+    args = parser.parse_args()
+
+    passages, owners, lengths = synthetic_corpus(args.articles, args.dim)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    ids = np.arange(1, args.articles + 1)
+
+    single = VectorIndex(args.dim)
+    first = np.stack([passages[s:s + min(n, FIRST_PASSAGES)].mean(axis=0) for s, n in zip(starts, lengths)])
+    single.add_many([{"id": int(i)} for i in ids], first)
+
+    indexes = {}
+    for dtype in ("float16", "int8"):
+        start = time.perf_counter()
+        index = ChunkIndex(args.dim, dtype=dtype)
+        for s in range(0, len(passages), 5000):
+            index.add_many(ids[owners[s:s + 5000]].tolist(), passages[s:s + 5000])
+        print(f"{dtype} chunk index built in {time.perf_counter() - start:.1f}s")
+        for pooling in ("max", "mean"):
+            for nprobe in args.nprobe:
+                view = copy.copy(index)
+                view.pooling, view.nprobe = pooling, nprobe
+                indexes[f"chunks {pooling} {dtype} p{nprobe}"] = view
+
+    rng = np.random.default_rng(1)
+    picked = rng.integers(0, len(passages), args.queries)
+    noise = rng.standard_normal((args.queries, args.dim), dtype=np.float32) / np.sqrt(args.dim)
+    queries = normalize_rows(passages[picked] + QUERY_NOISE * noise)
+    expected = ids[owners[picked]]
+
+    print(f"{len(passages)} chunks for {args.articles} articles")
+    print(f"{'index':<26} {'recall@10':>10} {'p50 ms':>8} {'p99 ms':>8} {'MB':>8}")
+    results, ms = measure(lambda q: [row["id"] for row in single.search(q, -1.0, 10)], queries)
+    hits = np.mean([e in r for e, r in zip(expected, results)])
+    print(f"{'single vector f32':<26} {hits:>10.3f} {np.percentile(ms, 50):>8.2f} {np.percentile(ms, 99):>8.2f} {single.nbytes / 1e6:>8.1f}")
+    for name, index in indexes.items():
+        results, ms = measure(lambda q: index.search(q, 10)[0].tolist(), queries)
+        hits = np.mean([e in r for e, r in zip(expected, results)])
+        print(f"{name:<26} {hits:>10.3f} {np.percentile(ms, 50):>8.2f} {np.percentile(ms, 99):>8.2f} {index.nbytes / 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Summarization prompt size with raw content prefixes vs. precomputed article digests.
+
+Run from backend/:
+    python -m benchmarks.digest_prompts --articles 10
+Prompt tokens are estimated at ~4 characters per token; completion latency of the real API
+grows with them, so compare `/summarize-results/stream` ttft_ms before and after as well.
+"""
+import argparse
+import random
+import time
+
+from digests import add_digests
+from embeddings import MODEL_NAME, load_embedder
+from summaries import build_prompts
+
+BOILERPLATE = (
+    "Subscribe to our newsletter to get the latest posts delivered to your inbox. "
+    "This post is part of our engineering blog series. Follow us for more updates. "
+)
+TOPICS = ["Postgres", "Kafka", "Kubernetes", "the search service", "our CDN", "the feature store"]
+CLAIMS = [
+    "We reduced p99 latency by batching writes to {t} and sharding hot partitions.",
+    "Profiling showed that most of the time in {t} went to serialization and lock contention.",
+    "The migration of {t} used dual writes and shadow reads before the final cutover.",
+    "Capacity planning for {t} now relies on load tests that replay production traffic.",
+    "Our on-call team added alerts on saturation signals for {t} instead of raw CPU usage.",
+    "Caching the expensive lookups in {t} cut the number of database round-trips in half.",
+]
+
+
+def synthetic_articles(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    articles = []
+    for i in range(count):
+        topic = rng.choice(TOPICS)
+        sentences = [rng.choice(CLAIMS).format(t=topic) for _ in range(rng.randint(15, 60))]
+        articles.append({
+            "id": i,
+            "title": f"Scaling {topic} at Example",
+            "company": "Example Engineering",
+            "content": BOILERPLATE + " ".join(sentences),
+        })
+    return articles
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--articles", type=int, default=10)
+    parser.add_argument("--model", default=MODEL_NAME, help="sentence-transformer name or local path")
+    args = parser.parse_args()
+
+    model = load_embedder("torch", args.model)
+    articles = synthetic_articles(args.articles)
+    raw_system, raw_user = build_prompts("scaling databases", articles)
+
+    start = time.perf_counter()
+    add_digests(model, articles)
+    digest_seconds = time.perf_counter() - start
+    digest_system, digest_user = build_prompts("scaling databases", articles)
+
+    raw_chars = len(raw_system) + len(raw_user)
+    digest_chars = len(digest_system) + len(digest_user)
+    print(f"{'prompt':<10} {'chars':>8} {'~tokens':>8}")
+    print(f"{'raw':<10} {raw_chars:>8} {raw_chars // 4:>8}")
+    print(f"{'digest':<10} {digest_chars:>8} {digest_chars // 4:>8}  ({digest_chars / raw_chars:.0%} of raw)")
+    print(f"digest cost at ingestion: {digest_seconds / len(articles) * 1000:.1f} ms/article")
+    print(f"example digest: {articles[0]['digest'][:200]}...")
+    print(f"example keywords: {articles[0]['keywords']}")
+
+
+if __name__ == "__main__":
+    main()
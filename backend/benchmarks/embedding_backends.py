@@ -0,0 +1,51 @@
+"""Single-query latency and batch throughput of the torch / onnx / onnx-int8 embedding backends.
+
+Run from backend/ (export the ONNX models first with `python embeddings.py export`):
+    python -m benchmarks.embedding_backends --backends torch,onnx,onnx-int8
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.embedding_throughput import synthetic_articles
+from embeddings import encode_texts, load_embedder
+
+QUERIES = ["kubernetes autoscaling", "how to use ai apps", "postgres replication lag",
+           "rust async runtime internals", "machine learning feature store"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--articles", type=int, default=128)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    articles = synthetic_articles(args.articles)
+    reference = None
+    print(f"{'backend':<10} {'query p50 ms':>12} {'query p99 ms':>12} {'articles/sec':>12} {'min cos':>8}")
+    for backend in args.backends.split(","):
+        model = load_embedder(backend)
+        model.encode(QUERIES)  # warm-up
+
+        timings = []
+        for i in range(args.queries):
+            start = time.perf_counter()
+            model.encode(QUERIES[i % len(QUERIES)])
+            timings.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        vectors = encode_texts(model, articles, batch_size=args.batch_size, normalize=True)
+        throughput = len(articles) / (time.perf_counter() - start)
+
+        if reference is None:
+            reference = vectors
+        min_cos = float((reference * vectors).sum(axis=1).min())
+        print(f"{backend:<10} {np.percentile(timings, 50):>12.1f} {np.percentile(timings, 99):>12.1f} "
+              f"{throughput:>12.1f} {min_cos:>8.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Articles/sec of the old per-item model.encode loop vs. the batched embedding stage.
+
+Run from backend/:
+    python -m benchmarks.embedding_throughput --articles 256 --batch-size 32
+"""
+import argparse
+import random
+import time
+
+import torch
+from sentence_transformers import SentenceTransformer
+
+from embeddings import MAX_EMBED_CHARS, encode_texts
+
+WORDS = ("kafka postgres latency cache shard replica index query kernel rust python tokio "
+         "service deploy rollout incident gpu model vector search compiler memory thread").split()
+
+
+def synthetic_articles(count: int, seed: int = 0) -> list:
+    """Articles with a realistic spread of lengths, from a short summary to a long post."""
+    rng = random.Random(seed)
+    articles = []
+    for _ in range(count):
+        length = rng.choice([300, 800, 1500, 3000, 6000])
+        words = []
+        while sum(len(w) + 1 for w in words) < length:
+            words.append(rng.choice(WORDS))
+        articles.append(" ".join(words))
+    return articles
+
+
+def per_item(model, texts):
+    return [model.encode(text[:MAX_EMBED_CHARS]).tolist() for text in texts]
+
+
+def batched(model, texts, batch_size):
+    return encode_texts(model, texts, batch_size=batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--articles", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = default)")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    model = SentenceTransformer('all-mpnet-base-v2', device="cpu")
+    texts = synthetic_articles(args.articles)
+    model.encode(texts[:4])  # warm-up
+
+    start = time.perf_counter()
+    per_item(model, texts)
+    per_item_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched(model, texts, args.batch_size)
+    batched_secs = time.perf_counter() - start
+
+    print(f"articles: {len(texts)}, batch size: {args.batch_size}, torch threads: {torch.get_num_threads()}")
+    print(f"per-item : {len(texts) / per_item_secs:8.1f} articles/sec ({per_item_secs:.1f}s)")
+    print(f"batched  : {len(texts) / batched_secs:8.1f} articles/sec ({batched_secs:.1f}s)")
+    print(f"speed-up : {per_item_secs / batched_secs:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""A local stand-in for the Hacker News Firebase API and the pages its stories link to.
+
+Serves /v0/maxitem.json, /v0/item/{id}.json and /v0/newstories.json over --items synthetic
+items (every --story-every'th one a story, the rest comments, a few deleted or missing), and
+/article/{id} HTML pages for the story URLs, each after --delay / --page-delay seconds:
+
+    python -m benchmarks.fake_hn_server --port 8002 --items 100000
+    HN_API_BASE=http://localhost:8002/v0 python hn.py
+"""
+import argparse
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.responses import HTMLResponse, JSONResponse
+
+PARAGRAPH = ("We moved the ingestion path to batched writes and measured p99 latency before and "
+             "after the change, then rolled it out behind a flag to one region at a time. ")
+
+
+def create_app(items: int = 100_000, story_every: int = 5, delay: float = 0.02, page_delay: float = 0.05,
+               public_url: str = "http://localhost:8002") -> FastAPI:
+    app = FastAPI()
+    base_time = 1_700_000_000
+
+    def item(item_id: int):
+        if item_id < 1 or item_id > items or item_id % 211 == 0:
+            return None  # ids that were never created
+        if item_id % story_every:
+            return {"id": item_id, "type": "comment", "by": f"user{item_id % 997}", "parent": item_id - 1,
+                    "time": base_time + item_id, "text": "Interesting write-up."}
+        story = {"id": item_id, "type": "story", "by": f"user{item_id % 997}", "time": base_time + item_id,
+                 "title": f"Story {item_id}: how we scaled service {item_id % 50}", "score": item_id % 300}
+        if item_id % (story_every * 7):
+            # Every 7th story is an Ask HN post without a URL; every 53rd item id reposts a URL
+            url_id = item_id - story_every if item_id % 53 == 0 else item_id
+            story["url"] = f"{public_url}/article/{url_id}"
+        if item_id % 97 == 0:
+            story["deleted"] = True
+        return story
+
+    @app.get("/v0/maxitem.json")
+    async def maxitem():
+        return items
+
+    @app.get("/v0/newstories.json")
+    async def newstories():
+        return [i for i in range(items, 0, -1) if i % story_every == 0][:500]
+
+    @app.get("/v0/item/{item_id}.json")
+    async def get_item(item_id: int):
+        await asyncio.sleep(delay)
+        return JSONResponse(item(item_id))
+
+    @app.get("/article/{article_id}")
+    async def article(article_id: int):
+        await asyncio.sleep(page_delay)
+        body = "".join(f"<p>{PARAGRAPH * (1 + (article_id + i) % 3)}</p>" for i in range(8))
+        return HTMLResponse(f"<html><head><title>Post {article_id}</title><script>track()</script></head>"
+                            f"<body><nav>Home | About</nav><article><h1>Post {article_id}</h1>{body}</article>"
+                            f"<footer>(c) Example</footer></body></html>")
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--story-every", type=int, default=5)
+    parser.add_argument("--delay", type=float, default=0.02, help="seconds per item request")
+    parser.add_argument("--page-delay", type=float, default=0.05, help="seconds per article page")
+    args = parser.parse_args()
+    app = create_app(args.items, args.story_every, args.delay, args.page_delay, f"http://localhost:{args.port}")
+    uvicorn.run(app, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
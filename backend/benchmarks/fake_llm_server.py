@@ -0,0 +1,90 @@
+"""A local stand-in for the OpenAI-compatible ZnapAI chat API.
+
+POST /chat/completions answers with canned markdown, either as one JSON completion or, with
+"stream": true, as server-sent chunks spaced --token-delay apart after --first-token-delay.
+Point the API at it to exercise /summarize-results and /summarize-results/stream offline:
+
+    python -m benchmarks.fake_llm_server --port 8001
+    ZNAPAI_BASE_URL=http://localhost:8001/ ZNAPAI_API_KEY=fake uvicorn main:app --port 8000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CANNED_SUMMARY = (
+    "### Key Themes\n"
+    "- **Scaling data stores:** Teams shard, cache and batch writes to keep latency flat.\n"
+    "- **Platform engineering:** Internal platforms standardize deploys and observability.\n\n"
+    "### Technical Insights\n"
+    "- **Measure first:** Profiling and load tests drive every optimization described.\n"
+    "- **Incremental migrations:** Dual writes and shadow reads de-risk large rewrites.\n"
+)
+
+
+def create_app(first_token_delay: float = 0.3, token_delay: float = 0.02, tokens: int = 0) -> FastAPI:
+    app = FastAPI()
+    words = CANNED_SUMMARY.split(" ")
+    if tokens:
+        words = (words * (tokens // len(words) + 1))[:tokens]
+    pieces = [word + " " for word in words[:-1]] + words[-1:]
+
+    def chunk(model: str, created: int, delta: dict, finish_reason=None) -> str:
+        return "data: " + json.dumps({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }) + "\n\n"
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "gpt-4o-mini")
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(first_token_delay + token_delay * len(pieces))
+            return JSONResponse({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "".join(pieces)}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(pieces), "total_tokens": len(pieces)},
+            })
+
+        async def stream():
+            await asyncio.sleep(first_token_delay)
+            yield chunk(model, created, {"role": "assistant", "content": ""})
+            for i, piece in enumerate(pieces):
+                if i:
+                    await asyncio.sleep(token_delay)
+                yield chunk(model, created, {"content": piece})
+            yield chunk(model, created, {}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--first-token-delay", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds between tokens")
+    parser.add_argument("--tokens", type=int, default=0, help="repeat the canned text to this many tokens")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.first_token_delay, args.token_delay, args.tokens), port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""A local stand-in for Supabase's PostgREST endpoint, enough for bulk inserts and upserts.
+
+Accepts POST /rest/v1/{table} with a JSON array (or object) and keeps only row counts. Every
+request takes --delay seconds plus its body size at --mb-per-s, like a remote database would;
+--fail-rate of the requests fail with a bare 503 (a transient gateway error), and a batch holding
+any row whose title starts with "BAD" is rejected as a whole with a Postgres error, as a real
+insert would be:
+
+    python -m benchmarks.fake_postgrest --port 8003 --fail-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import random
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+
+
+def create_app(delay: float = 0.03, mb_per_s: float = 20.0, fail_rate: float = 0.0, seed: int = 0) -> FastAPI:
+    app = FastAPI()
+    rng = random.Random(seed)
+    stats = {"requests": 0, "bytes": 0, "rows": {}, "transient_errors": 0, "rejected_batches": 0}
+
+    @app.post("/rest/v1/{table}")
+    async def write(table: str, request: Request):
+        body = await request.body()
+        stats["requests"] += 1
+        stats["bytes"] += len(body)
+        await asyncio.sleep(delay + len(body) / (mb_per_s * 1e6))
+        if rng.random() < fail_rate:
+            stats["transient_errors"] += 1
+            return PlainTextResponse("upstream connect error", status_code=503)
+
+        rows = json.loads(body)
+        rows = rows if isinstance(rows, list) else [rows]
+        if any(str(row.get("title", "")).startswith("BAD") for row in rows):
+            stats["rejected_batches"] += 1
+            return JSONResponse({"code": "22P02", "message": "invalid input syntax for type vector",
+                                 "details": None, "hint": None}, status_code=400)
+        stats["rows"][table] = stats["rows"].get(table, 0) + len(rows)
+        return Response(status_code=201)
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/reset")
+    async def reset():
+        stats.update(requests=0, bytes=0, rows={}, transient_errors=0, rejected_batches=0)
+        return stats
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8003)
+    parser.add_argument("--delay", type=float, default=0.03, help="seconds per request")
+    parser.add_argument("--mb-per-s", type=float, default=20.0, help="request body throughput")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests failing with 503")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.delay, args.mb_per_s, args.fail_rate), port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Items/second of the HN ingester against the fake HN API, versus one sequential request per item.
+
+Run from backend/:
+    python -m benchmarks.hn_ingest --items 20000 --delay 0.02
+
+Starts benchmarks.fake_hn_server in a subprocess, scans every item into a throwaway cursor
+(pages are downloaded and extracted; saving sleeps --save-ms per article in place of embedding
+and the insert), then runs again to show that a resumed run only covers new ids.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+from bs4 import BeautifulSoup
+
+import hn
+
+
+def start_server(args) -> subprocess.Popen:
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.fake_hn_server", "--port", str(args.port),
+                               "--items", str(args.items), "--delay", str(args.delay),
+                               "--page-delay", str(args.page_delay)])
+    for _ in range(100):
+        try:
+            hn.fetch_max_item()
+            return server
+        except requests.RequestException:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("fake HN server did not start")
+
+
+def extract(html) -> str:
+    article = BeautifulSoup(html, "html.parser").find("article")
+    return article.get_text(separator="\n", strip=True) if article else ""
+
+
+def sequential_baseline(sample: int) -> float:
+    """The old loop: one blocking request per item, newest first."""
+    max_item = hn.fetch_max_item()
+    start = time.perf_counter()
+    for item_id in range(max_item, max_item - sample, -1):
+        requests.get(f"{hn.HN_API_BASE}/item/{item_id}.json", timeout=10).json()
+    return sample / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=20_000)
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--delay", type=float, default=0.02, help="fake API latency per item (s)")
+    parser.add_argument("--page-delay", type=float, default=0.05, help="fake page latency (s)")
+    parser.add_argument("--save-ms", type=float, default=2.0, help="simulated embed + insert cost per article")
+    parser.add_argument("--baseline-sample", type=int, default=200)
+    args = parser.parse_args()
+
+    hn.HN_API_BASE = f"http://localhost:{args.port}/v0"
+    server = start_server(args)
+    try:
+        run(args)
+    finally:
+        server.terminate()
+
+
+def run(args):
+    baseline = sequential_baseline(args.baseline_sample)
+    print(f"sequential: {baseline:.0f} items/s ({args.items / baseline:.0f}s for {args.items} items)")
+
+    saved = []
+
+    def save(articles):
+        time.sleep(args.save_ms / 1000 * len(articles))
+        saved.extend(articles)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cursor = hn.HnCursor(os.path.join(tmp, "hn_cursor.json"))
+        stats = hn.ingest_hacker_news(save, lambda urls: urls, extract, cursor=cursor, max_new=args.items)
+        print(f"ingester:   {stats['items'] / stats['seconds']:.0f} items/s, {stats['articles']} stories, "
+              f"{sum(len(a['content']) for a in saved) / max(1, len(saved)):.0f} chars of content each, "
+              f"{stats['failed']} failed")
+
+        resumed = hn.ingest_hacker_news(save, lambda urls: urls, extract, cursor=hn.HnCursor.load(cursor.path),
+                                        max_new=args.items)
+        print(f"resumed run scanned {resumed['items']} items (cursor {cursor.low}..{cursor.high})")
+
+
+if __name__ == "__main__":
+    main()
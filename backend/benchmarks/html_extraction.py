@@ -0,0 +1,102 @@
+"""Documents/second of article extraction inline vs. on the ExtractionPool, over saved HTML files.
+
+Run from backend/:
+    python -m benchmarks.html_extraction --corpus .cache/html_corpus --workers 1,2,4
+
+Every *.html file under --corpus is one document (save real pages there to measure them); when
+the directory is empty it is filled with --generate synthetic blog pages, a few of them huge or
+deeply nested. Inline extraction runs trafilatura and BeautifulSoup on this thread, like the
+scraper used to; the pool streams results back in completion order.
+"""
+import argparse
+import os
+import random
+import time
+
+import numpy as np
+
+from extract import EXTRACT_TIMEOUT, MAX_HTML_BYTES, ExtractionPool, extract_text
+
+WORDS = ("latency throughput cache shard replica index query kernel runtime deploy rollout "
+         "memory allocator scheduler pipeline queue consumer producer batch stream schema").split()
+
+
+def synthetic_page(rng: random.Random, i: int) -> str:
+    def sentence():
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+
+    paragraphs = "".join(f"<p>{' '.join(sentence() for _ in range(rng.randint(2, 6)))}</p>"
+                         for _ in range(rng.choice([5, 15, 40, 120])))
+    nav = "".join(f'<li><a href="/tag/{w}">{w}</a></li>' for w in WORDS)
+    comments = "".join(f'<div class="comment"><p>{sentence()}</p></div>' for _ in range(rng.randint(0, 50)))
+    scripts = "<script>" + "var x=1;" * rng.randint(10, 5000) + "</script>"
+    page = (f"<html><head><title>Post {i}</title>{scripts}</head><body><nav><ul>{nav}</ul></nav>"
+            f"<article><h1>How we tuned {rng.choice(WORDS)} #{i}</h1>{paragraphs}</article>"
+            f"<aside><ul>{nav}</ul></aside><section class='comments'>{comments}</section>"
+            f"<footer>(c) Example Engineering</footer></body></html>")
+    if i % 97 == 0:
+        page = page.replace("</article>", "<div>" * 5000 + "deep" + "</div>" * 5000 + "</article>")
+    if i % 151 == 0:
+        page = page.replace("</article>", paragraphs * 200 + "</article>")  # several MB
+    return page
+
+
+def load_corpus(path: str, generate: int) -> list:
+    os.makedirs(path, exist_ok=True)
+    if not any(name.endswith(".html") for name in os.listdir(path)):
+        rng = random.Random(0)
+        for i in range(generate):
+            with open(os.path.join(path, f"page-{i:05d}.html"), "w") as f:
+                f.write(synthetic_page(rng, i))
+    documents = []
+    for name in sorted(os.listdir(path)):
+        if name.endswith(".html"):
+            with open(os.path.join(path, name), "rb") as f:
+                documents.append((name, f.read()))
+    return documents
+
+
+def report(label: str, documents: list, seconds: float, latencies: list, texts: dict):
+    total_mb = sum(len(html) for _, html in documents) / 1e6
+    ms = np.array(latencies) * 1000
+    print(f"{label:<14} {len(documents) / seconds:>8.1f} {total_mb / seconds:>7.1f} {ms[0]:>9.0f} "
+          f"{np.percentile(ms, 50):>8.0f} {sum(bool(t) for t in texts.values()):>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default=os.path.join(".cache", "html_corpus"))
+    parser.add_argument("--generate", type=int, default=300, help="synthetic pages written into an empty corpus")
+    parser.add_argument("--workers", type=lambda v: [int(n) for n in v.split(",")],
+                        default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument("--timeout", type=float, default=EXTRACT_TIMEOUT)
+    parser.add_argument("--max-bytes", type=int, default=MAX_HTML_BYTES)
+    args = parser.parse_args()
+
+    documents = load_corpus(args.corpus, args.generate)
+    print(f"{len(documents)} documents, {sum(len(h) for _, h in documents) / 1e6:.1f} MB, "
+          f"largest {max(len(h) for _, h in documents) / 1e6:.1f} MB")
+    print(f"{'mode':<14} {'docs/s':>8} {'MB/s':>7} {'first ms':>9} {'p50 ms':>8} {'texts':>7}")
+
+    start = time.perf_counter()
+    texts, latencies = {}, []
+    for name, html in documents:
+        texts[name] = extract_text(html)
+        latencies.append(time.perf_counter() - start)
+    report("inline", documents, time.perf_counter() - start, latencies, texts)
+
+    for workers in args.workers:
+        pool = ExtractionPool(workers, timeout=args.timeout, max_bytes=args.max_bytes)
+        pool.extract(b"<html><body><article><p>warm up</p></article></body></html>")  # start the workers
+        start = time.perf_counter()
+        texts, latencies = {}, []
+        for name, text in pool.extract_many(documents):
+            texts[name] = text
+            latencies.append(time.perf_counter() - start)
+        report(f"pool x{workers}", documents, time.perf_counter() - start, latencies, texts)
+        print(f"  {pool.report()}")
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
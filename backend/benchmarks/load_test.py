@@ -0,0 +1,86 @@
+"""Throughput and latency of a running API under concurrent clients.
+
+Start the server, then run from backend/:
+    uvicorn main:app --port 8000
+    python -m benchmarks.load_test --url http://localhost:8000 --clients 50 --requests 1000
+
+Each query string is made unique (unless --repeat) so the result and embedding caches
+don't hide the encode and database work. Run it against the old and the new build to compare.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+import numpy as np
+
+QUERIES = [
+    "scaling postgres writes",
+    "kubernetes autoscaling",
+    "rust async runtime memory leak",
+    "feature store for machine learning",
+    "migrating a monolith to microservices",
+    "observability and distributed tracing",
+]
+
+
+async def client_loop(client: httpx.AsyncClient, endpoint: str, queue: asyncio.Queue, timings: list,
+                      errors: list, user_id: str):
+    while True:
+        try:
+            query = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        params = {"q": query}
+        if user_id:
+            params["user_id"] = user_id
+        start = time.perf_counter()
+        try:
+            response = await client.get(endpoint, params=params)
+            response.raise_for_status()
+            timings.append(time.perf_counter() - start)
+        except Exception as e:
+            errors.append(e)
+
+
+async def run(url: str, endpoint: str, clients: int, total: int, repeat: bool, user_id: str):
+    queue = asyncio.Queue()
+    for i in range(total):
+        query = QUERIES[i % len(QUERIES)]
+        queue.put_nowait(query if repeat else f"{query} {i}")
+
+    timings, errors = [], []
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        await client.get("/ready")
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            client_loop(client, endpoint, queue, timings, errors, user_id) for _ in range(clients)
+        ))
+        elapsed = time.perf_counter() - started
+    return np.array(timings) * 1000, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", default="/ai-search", help="/ai-search or /search")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--repeat", action="store_true", help="reuse query strings (measures the cached path)")
+    parser.add_argument("--user-id", default=None, help="also exercise search logging")
+    args = parser.parse_args()
+
+    ms, errors, elapsed = asyncio.run(
+        run(args.url, args.endpoint, args.clients, args.requests, args.repeat, args.user_id)
+    )
+    print(f"{args.endpoint}: {len(ms)} ok, {len(errors)} failed, {args.clients} clients, {elapsed:.1f}s")
+    if len(ms):
+        print(f"throughput {len(ms) / elapsed:8.1f} req/s")
+        print(f"p50 {np.percentile(ms, 50):8.1f} ms   p99 {np.percentile(ms, 99):8.1f} ms   max {ms.max():8.1f} ms")
+    if errors:
+        print(f"first error: {errors[0]!r}")
+
+
+if __name__ == "__main__":
+    main()
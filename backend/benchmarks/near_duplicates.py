@@ -0,0 +1,110 @@
+"""Near-duplicate checks per second against a 100k-article MinHash index, and how many copies they catch.
+
+Run from backend/:
+    python -m benchmarks.near_duplicates --articles 100000 --queries 2000
+
+Articles are synthetic posts drawn from a Zipf vocabulary, so unrelated posts still share common
+words. Half of the queries are mirrored copies of indexed posts (a syndication header and footer,
+a few percent of words edited, sometimes the tail cut off); the other half are new posts. Each
+query is checked with the LSH bands and, for comparison, against every stored signature.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from duplicates import DUPLICATE_JACCARD, NUM_HASHES, DuplicateIndex, PendingDuplicate, minhash
+
+HEADER = "This post originally appeared on the example engineering blog and is republished with permission"
+FOOTER = "Share this post on twitter and linkedin and subscribe to our newsletter for more posts like this"
+
+
+class Corpus:
+    def __init__(self, vocabulary: int = 30_000, seed: int = 0):
+        self.words = np.array([f"term{i}" for i in range(vocabulary)])
+        weights = 1 / np.arange(1, vocabulary + 1)  # Zipf-like term frequencies
+        self.cumulative = np.cumsum(weights / weights.sum())
+        self.rng = np.random.default_rng(seed)
+
+    def post(self) -> list:
+        length = self.rng.choice([150, 300, 600, 1200])
+        return self.words[np.searchsorted(self.cumulative, self.rng.random(length))].tolist()
+
+    def mirror(self, words: list) -> str:
+        words = list(words)
+        for i in self.rng.choice(len(words), size=max(1, len(words) // 50), replace=False):
+            words[i] = "edited"
+        if self.rng.random() < 0.3:
+            words = words[:int(len(words) * 0.9)]  # mirror cut the last paragraph
+        return f"{HEADER} {' '.join(words)} {FOOTER}"
+
+
+def timed(label: str, queries: list, check, truth: list, total: int):
+    start = time.perf_counter()
+    found = [check(signature) for signature in queries]
+    seconds = time.perf_counter() - start
+    copies = [(hit, source) for hit, source in zip(found, truth) if source is not None]
+    fresh = [hit for hit, source in zip(found, truth) if source is None]
+    recall = sum(hit == source for hit, source in copies) / max(1, len(copies))
+    false_hits = sum(hit is not None for hit in fresh)
+    print(f"{label:<22} {len(queries) / seconds:>10.0f} {seconds / len(queries) * 1e6:>8.1f} "
+          f"{recall:>8.3f} {false_hits:>6}/{len(fresh)}  (vs {total} articles)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--articles", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--threshold", type=float, default=DUPLICATE_JACCARD)
+    args = parser.parse_args()
+
+    corpus = Corpus()
+    print(f"Fingerprinting {args.articles} articles...")
+    posts = [corpus.post() for _ in range(args.articles)]
+    start = time.perf_counter()
+    signatures = np.stack([minhash(" ".join(words)) for words in posts])
+    seconds = time.perf_counter() - start
+    print(f"minhash: {args.articles / seconds:.0f} articles/s ({seconds / args.articles * 1e3:.2f} ms each)")
+
+    index = DuplicateIndex(os.path.join(tempfile.mkdtemp(), "minhash.npz"), threshold=args.threshold)
+    start = time.perf_counter()
+    index.add_many(np.arange(1, args.articles + 1), signatures)
+    index._sort()
+    print(f"index: built in {time.perf_counter() - start:.2f}s, {index.nbytes / 1e6:.1f} MB in memory", end="")
+    index.save()
+    print(f", {os.path.getsize(index.path) / 1e6:.1f} MB on disk")
+
+    texts, truth = [], []
+    for i in range(args.queries):
+        if i % 2:
+            source = int(corpus.rng.integers(args.articles))
+            texts.append(corpus.mirror(posts[source]))
+            truth.append(source + 1)
+        else:
+            texts.append(" ".join(corpus.post()))
+            truth.append(None)
+    queries = [minhash(text) for text in texts]
+
+    def brute_force(signature):
+        similarity = (signatures == signature).sum(axis=1) / NUM_HASHES
+        best = int(np.argmax(similarity))
+        return best + 1 if similarity[best] >= args.threshold else None
+
+    print(f"{'check':<22} {'checks/s':>10} {'us each':>8} {'recall':>8} {'false hits':>10}")
+    timed("LSH bands", queries, index.find, truth, args.articles)
+    timed("all signatures", queries, brute_force, truth, args.articles)
+
+    start = time.perf_counter()
+    for i, text in enumerate(texts):
+        try:
+            index.claim(f"query-{i}", text)
+        except PendingDuplicate:
+            pass
+    seconds = time.perf_counter() - start
+    print(f"claim (minhash + LSH): {len(texts) / seconds:.0f} articles/s; {index.report()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Memory, payload size, latency and recall@10 of float16 / int8 embedding storage vs. float32.
+
+Run from backend/:
+    python -m benchmarks.quantized_recall --size 100000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.ann_recall import clustered_corpus
+from quantize import QuantizedVectorIndex, format_embedding
+from vector_index import VectorIndex
+
+
+def build(index, corpus):
+    chunk = 20_000
+    for start in range(0, len(corpus), chunk):
+        part = corpus[start:start + chunk]
+        index.add_many([{"id": start + i} for i in range(len(part))], part)
+    return index
+
+
+def evaluate(index, queries, truth, k):
+    timings, hits = [], 0
+    for q, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = index.search(q, match_threshold=-1.0, match_count=k)
+        timings.append((time.perf_counter() - start) * 1000)
+        hits += len(expected & {row["id"] for row in found})
+    return hits / (k * len(queries)), np.percentile(timings, 50)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    corpus = clustered_corpus(args.size, args.dim, topics=500)
+    queries = clustered_corpus(args.queries, args.dim, topics=500, seed=7)
+
+    exact = build(VectorIndex(args.dim), corpus)
+    truth = [{row["id"] for row in exact.search(q, -1.0, args.k)} for q in queries]
+    _, exact_p50 = evaluate(exact, queries, truth, args.k)
+
+    print(f"{'storage':<18} {'MB':>8} {'ratio':>6} {'recall@' + str(args.k):>10} {'p50 ms':>8}")
+    print(f"{'float32':<18} {exact.nbytes / 1e6:>8.1f} {1.0:>6.2f} {1.0:>10.3f} {exact_p50:>8.2f}")
+    for dtype in ("float16", "int8"):
+        for rerank in (False, True):
+            index = build(QuantizedVectorIndex(args.dim, dtype=dtype, rerank=rerank), corpus)
+            recall, p50 = evaluate(index, queries, truth, args.k)
+            label = f"{dtype}{' + rerank' if rerank else ''}"
+            print(f"{label:<18} {index.nbytes / 1e6:>8.1f} {exact.nbytes / index.nbytes:>6.2f} {recall:>10.3f} {p50:>8.2f}")
+
+    vector = corpus[0]
+    print("\nPostgREST payload per embedding:")
+    print(f"  json .tolist()   {len(json.dumps(vector.tolist())):>6} bytes")
+    for payload in ("float32", "float16"):
+        print(f"  {payload:<16} {len(json.dumps(format_embedding(vector, payload))):>6} bytes")
+
+
+if __name__ == "__main__":
+    main()
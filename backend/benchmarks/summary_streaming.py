@@ -0,0 +1,71 @@
+"""Time to first token vs. total time of streamed summaries, against the fake ZnapAI server.
+
+Run from backend/ (starts benchmarks.fake_llm_server in-process; needs no API key):
+    python -m benchmarks.summary_streaming --runs 10 --tokens 400
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+import numpy as np
+
+from benchmarks.fake_llm_server import create_app
+from summaries import build_prompts, stream_completion, summary_request
+
+ARTICLES = [
+    {"title": f"Scaling service {i}", "company": "Example", "content": "Sharding, caching and batching. " * 40}
+    for i in range(10)
+]
+
+
+def start_fake_server(port: int, first_token_delay: float, token_delay: float, tokens: int):
+    import uvicorn
+
+    config = uvicorn.Config(create_app(first_token_delay, token_delay, tokens), port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def measure(base_url: str, runs: int):
+    import openai
+
+    client = openai.AsyncOpenAI(api_key="fake", base_url=base_url)
+    system_prompt, user_prompt = build_prompts("scaling", ARTICLES)
+    blocking, ttft, streamed = [], [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await client.chat.completions.create(**summary_request(system_prompt, user_prompt))
+        blocking.append(time.perf_counter() - start)
+
+        start, first = time.perf_counter(), None
+        async for _ in stream_completion(client, system_prompt, user_prompt):
+            if first is None:
+                first = time.perf_counter() - start
+        ttft.append(first)
+        streamed.append(time.perf_counter() - start)
+    return np.array(blocking) * 1000, np.array(ttft) * 1000, np.array(streamed) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--first-token-delay", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    parser.add_argument("--tokens", type=int, default=400)
+    args = parser.parse_args()
+
+    start_fake_server(args.port, args.first_token_delay, args.token_delay, args.tokens)
+    blocking, ttft, streamed = asyncio.run(measure(f"http://127.0.0.1:{args.port}/", args.runs))
+    print(f"{'mode':<22} {'p50 ms':>8} {'p99 ms':>8}")
+    print(f"{'blocking (first byte)':<22} {np.percentile(blocking, 50):8.1f} {np.percentile(blocking, 99):8.1f}")
+    print(f"{'streamed ttft':<22} {np.percentile(ttft, 50):8.1f} {np.percentile(ttft, 99):8.1f}")
+    print(f"{'streamed total':<22} {np.percentile(streamed, 50):8.1f} {np.percentile(streamed, 99):8.1f}")
+
+
+if __name__ == "__main__":
+    main()
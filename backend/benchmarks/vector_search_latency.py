@@ -0,0 +1,56 @@
+"""p50/p99 latency of the local exact-search engine on a synthetic corpus.
+
+Run from backend/:
+    python -m benchmarks.vector_search_latency --sizes 16000,100000,1000000
+(1M x 768 float32 vectors need ~3 GB of RAM.)
+"""
+import argparse
+import time
+
+import numpy as np
+
+from vector_index import VectorIndex
+
+
+def synthetic_index(size: int, dim: int, seed: int = 0) -> VectorIndex:
+    rng = np.random.default_rng(seed)
+    index = VectorIndex(dim)
+    chunk = 50_000
+    for start in range(0, size, chunk):
+        count = min(chunk, size - start)
+        rows = [{"id": start + i} for i in range(count)]
+        index.add_many(rows, rng.standard_normal((count, dim), dtype=np.float32))
+    return index
+
+
+def measure(index: VectorIndex, queries: np.ndarray, threshold: float, count: int) -> np.ndarray:
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, match_threshold=threshold, match_count=count)
+        timings.append(time.perf_counter() - start)
+    return np.array(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="16000,100000,1000000")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--threshold", type=float, default=-1.0, help="-1 keeps every top-k hit")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    print(f"{'vectors':>10} {'matrix MB':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        index = synthetic_index(size, args.dim)
+        queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+        measure(index, queries[:5], args.threshold, args.count)  # warm-up
+        ms = measure(index, queries, args.threshold, args.count)
+        print(f"{size:>10} {size * args.dim * 4 / 1e6:>10.0f} {np.percentile(ms, 50):>8.2f} {np.percentile(ms, 99):>8.2f}")
+        del index
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import os
+import re
+import threading
+import numpy as np
+
+from digests import STOPWORDS
+from duplicates import LINK_DUPLICATES
+from index_version import REWRITES_INDEX, read_index_version
+from vector_index import PAGE_SIZE, top_k
+
+# --- SETTINGS ---
+CACHE_DIR = os.getenv("ERBLOGX_CACHE_DIR", ".cache")
+BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH", os.path.join(CACHE_DIR, "bm25.npz"))
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Title terms are counted this many times, so a match in the title outweighs one in the body.
+TITLE_WEIGHT = 3
+# Characters of content indexed per article (full posts; the cap only guards against huge pages).
+MAX_INDEXED_CHARS = 100_000
+# Documents added since the last compaction are kept in per-term lists until there are this many.
+DELTA_LIMIT = 2048
+# Reciprocal rank fusion constant; 60 is the value from the original RRF paper.
+RRF_K = 60
+
+# Keeps identifiers like io_uring, c++, node.js and gpt-4o intact.
+TOKEN = re.compile(r"[a-z0-9][a-z0-9_+#]*(?:[.\-][a-z0-9_+#]+)*")
+
+
+def tokenize(text: str) -> list:
+    return [token for token in TOKEN.findall((text or "").lower()) if token not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(*rankings, k: int = RRF_K) -> list:
+    """Fuses ranked id lists: each id scores sum(1 / (k + rank)); returns (id, score) best first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+class Bm25Index:
+    """Okapi BM25 over article titles and content, with array-backed postings.
+
+    Postings are stored CSR-style: `offsets[t]:offsets[t + 1]` slices `postings` (document
+    positions, int32) and `frequencies` (term counts, uint16) for term id `t`. Articles added
+    after a compaction go to small per-term Python lists that are scanned alongside and folded
+    into the arrays once `DELTA_LIMIT` documents have accumulated (or on save). `rewrite_version`
+    is the REWRITES_INDEX version the indexed content was read at.
+    """
+
+    def __init__(self):
+        self.vocab = {}                                   # term -> term id
+        self.ids = np.zeros(0, dtype=np.int64)            # article id per document position
+        self.lengths = np.zeros(0, dtype=np.float32)      # weighted token count per document
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.postings = np.zeros(0, dtype=np.int32)
+        self.frequencies = np.zeros(0, dtype=np.uint16)
+        self.document_frequency = np.zeros(0, dtype=np.int32)
+        self.max_id = 0
+        self.rewrite_version = 0
+        self._delta = {}                                  # term id -> ([positions], [frequencies])
+        self._delta_docs = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.ids, self.lengths, self.offsets, self.postings,
+                                      self.frequencies, self.document_frequency))
+
+    # --- updates ---
+
+    def add_many(self, rows: list):
+        """Indexes rows with 'id', 'title' and 'content'."""
+        with self._lock:
+            ids, lengths = [], []
+            for row in rows:
+                counts = {}
+                for token in tokenize(row.get('title')):
+                    counts[token] = counts.get(token, 0) + TITLE_WEIGHT
+                for token in tokenize((row.get('content') or "")[:MAX_INDEXED_CHARS]):
+                    counts[token] = counts.get(token, 0) + 1
+                position = len(self.ids) + len(ids)
+                for token, count in counts.items():
+                    term = self.vocab.setdefault(token, len(self.vocab))
+                    positions, frequencies = self._delta.setdefault(term, ([], []))
+                    positions.append(position)
+                    frequencies.append(min(count, 65535))
+                ids.append(int(row['id']))
+                lengths.append(sum(counts.values()))
+            if not ids:
+                return
+            self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+            self.lengths = np.concatenate([self.lengths, np.asarray(lengths, dtype=np.float32)])
+            self.max_id = max(self.max_id, max(ids))
+            self._delta_docs += len(ids)
+            if self._delta_docs >= DELTA_LIMIT:
+                self._compact()
+
+    def _compact(self):
+        """Folds the per-term delta lists into the postings arrays."""
+        if not self._delta:
+            return
+        terms = len(self.vocab)
+        counts = np.zeros(terms, dtype=np.int64)
+        counts[:len(self.offsets) - 1] = np.diff(self.offsets)
+        for term, (positions, _) in self._delta.items():
+            counts[term] += len(positions)
+        offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        postings = np.empty(offsets[-1], dtype=np.int32)
+        frequencies = np.empty(offsets[-1], dtype=np.uint16)
+
+        # Existing postings keep their place at the start of each term's slice; positions only grow,
+        # so appending the delta keeps every slice sorted.
+        old_terms = len(self.offsets) - 1
+        old_counts = np.diff(self.offsets)
+        starts = offsets[:old_terms]
+        if len(self.postings):
+            target = np.repeat(starts - self.offsets[:-1], old_counts) + np.arange(len(self.postings))
+            postings[target] = self.postings
+            frequencies[target] = self.frequencies
+        for term, (positions, freqs) in self._delta.items():
+            start = offsets[term] + (old_counts[term] if term < old_terms else 0)
+            postings[start:start + len(positions)] = positions
+            frequencies[start:start + len(freqs)] = freqs
+
+        self.offsets, self.postings, self.frequencies = offsets, postings, frequencies
+        self.document_frequency = np.diff(offsets).astype(np.int32)
+        self._delta = {}
+        self._delta_docs = 0
+
+    def sync(self, supabase, page_size: int = PAGE_SIZE) -> int:
+        """Indexes every article inserted since the index was built or last synced."""
+        added = 0
+        while True:
+            query = supabase.table('articles').select('id, title, content').gt('id', self.max_id)
+            if LINK_DUPLICATES:
+                # Copies linked to a canonical article are left out, so rankings never repeat a post
+                query = query.is_('duplicate_of', 'null')
+            rows = query.order('id').limit(page_size).execute().data or []
+            self.add_many(rows)
+            added += len(rows)
+            if len(rows) < page_size:
+                return added
+
+    def refresh(self, supabase) -> "Bm25Index":
+        """This index with new articles added, or a new one when existing articles were rewritten.
+
+        Sync only sees ids above `max_id`, so content rewritten later (HN stories enriched from a
+        title to the full post) is picked up by reindexing everything once the rewrites version
+        moves. The new index is built aside; searches keep using this one meanwhile.
+        """
+        rewrite_version = read_index_version(supabase, REWRITES_INDEX)
+        if rewrite_version is not None and rewrite_version != self.rewrite_version:
+            index = Bm25Index()
+            index.rewrite_version = rewrite_version
+            print(f"BM25 index rebuilt after rewrites: {index.sync(supabase)} articles.")
+            return index
+        print(f"BM25 index synced: {self.sync(supabase)} new articles, {len(self)} total.")
+        return self
+
+    # --- persistence ---
+
+    def save(self, path: str = BM25_INDEX_PATH):
+        with self._lock:
+            self._compact()
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            terms = np.empty(len(self.vocab), dtype=object)
+            for term, term_id in self.vocab.items():
+                terms[term_id] = term
+            tmp_path = f"{path}.tmp.npz"
+            np.savez(tmp_path, terms=terms.astype(str), ids=self.ids, lengths=self.lengths, offsets=self.offsets,
+                     postings=self.postings, frequencies=self.frequencies, max_id=self.max_id,
+                     rewrite_version=self.rewrite_version)
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = BM25_INDEX_PATH) -> "Bm25Index":
+        index = cls()
+        with np.load(path) as data:
+            index.vocab = {term: i for i, term in enumerate(data["terms"].tolist())}
+            index.ids, index.lengths = data["ids"], data["lengths"]
+            index.offsets, index.postings, index.frequencies = data["offsets"], data["postings"], data["frequencies"]
+            index.max_id = int(data["max_id"])
+            index.rewrite_version = int(data["rewrite_version"]) if "rewrite_version" in data else 0
+        index.document_frequency = np.diff(index.offsets).astype(np.int32)
+        print(f"BM25 index loaded from {path}: {len(index)} articles, {len(index.vocab)} terms.")
+        return index
+
+    # --- search ---
+
+    def _postings(self, term: int):
+        if term < len(self.offsets) - 1:
+            start, end = self.offsets[term], self.offsets[term + 1]
+            positions, frequencies = self.postings[start:end], self.frequencies[start:end]
+        else:
+            positions, frequencies = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.uint16)
+        if term in self._delta:
+            delta_positions, delta_frequencies = self._delta[term]
+            positions = np.concatenate([positions, np.asarray(delta_positions, dtype=np.int32)])
+            frequencies = np.concatenate([frequencies, np.asarray(delta_frequencies, dtype=np.uint16)])
+        return positions, frequencies
+
+    def scores(self, query: str) -> np.ndarray:
+        with self._lock:
+            return self._scores(query)
+
+    def _scores(self, query: str) -> np.ndarray:
+        n = len(self.ids)
+        scores = np.zeros(n, dtype=np.float32)
+        if not n:
+            return scores
+        average_length = float(self.lengths.mean()) or 1.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths / average_length)
+        for token in set(tokenize(query)):
+            term = self.vocab.get(token)
+            if term is None:
+                continue
+            positions, frequencies = self._postings(term)
+            if not len(positions):
+                continue
+            idf = np.log(1 + (n - len(positions) + 0.5) / (len(positions) + 0.5))
+            tf = frequencies.astype(np.float32)
+            # Each document appears once per term, so plain fancy-index addition is safe.
+            scores[positions] += idf * tf * (BM25_K1 + 1) / (tf + norm[positions])
+        return scores
+
+    def search(self, query: str, k: int = 10):
+        """Top-k article ids and BM25 scores, best first (only documents matching a query term)."""
+        scores = self.scores(query)
+        best = top_k(scores, k)
+        best = best[scores[best] > 0]
+        return self.ids[best], scores[best]
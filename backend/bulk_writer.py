@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+
+from quantize import format_embedding
+
+# --- SETTINGS ---
+# A batch is sent once it holds this many rows or this many bytes of JSON, whichever comes first.
+WRITE_BATCH_ROWS = int(os.getenv("WRITE_BATCH_ROWS", "500"))
+WRITE_BATCH_BYTES = int(os.getenv("WRITE_BATCH_BYTES", str(2 * 1024 * 1024)))
+# Batches in flight at once per writer; add() blocks while this many more are waiting.
+WRITE_CONCURRENCY = int(os.getenv("WRITE_CONCURRENCY", "4"))
+# Attempts per batch for transient errors, with exponential backoff (and jitter) starting here.
+WRITE_RETRIES = int(os.getenv("WRITE_RETRIES", "4"))
+WRITE_BACKOFF = float(os.getenv("WRITE_BACKOFF", "0.5"))
+
+# Postgres error classes worth retrying: connection, transaction rollback (deadlock, serialization),
+# insufficient resources and operator intervention, plus PostgREST's own connection errors.
+TRANSIENT_SQLSTATE_CLASSES = ("08", "40", "53", "57")
+TRANSIENT_POSTGREST_CODES = {"PGRST000", "PGRST001", "PGRST002", "PGRST003"}
+# Errors caused by the size of the batch itself: statement timeout, payload too large.
+SIZE_ERROR_CODES = {"57014", "413"}
+
+
+def error_kind(error: Exception) -> str:
+    """"size" (send smaller batches), "transient" (retry as is) or "rows" (some row is bad)."""
+    code = getattr(error, "code", None)
+    if code is None:
+        # Network errors, timeouts and gateway pages that aren't PostgREST JSON
+        return "transient"
+    code = str(code)
+    if code in SIZE_ERROR_CODES:
+        return "size"
+    if code.isdigit() and len(code) == 3:
+        # HTTP status of a response without a PostgREST error body
+        return "transient" if code in ("408", "429") or code >= "500" else "rows"
+    if code[:2] in TRANSIENT_SQLSTATE_CLASSES or code in TRANSIENT_POSTGREST_CODES:
+        return "transient"
+    return "rows"
+
+
+def compact_row(row: dict, vector_columns: tuple = ("embedding",)) -> dict:
+    """Vector columns as pgvector text literals at the configured payload precision, not float lists."""
+    for column in vector_columns:
+        value = row.get(column)
+        if isinstance(value, (list, tuple, np.ndarray)):
+            row[column] = format_embedding(value)
+    return row
+
+
+def row_bytes(row: dict) -> int:
+    return len(json.dumps(row, separators=(",", ":"), default=str))
+
+
+class BulkWriter:
+    """Batched inserts or upserts into one Supabase table, shared by every writer of that table.
+
+    Rows are grouped into batches of at most `max_rows` rows and `max_bytes` of JSON, and up to
+    `concurrency` batches are sent at once on a small thread pool. A batch that fails with a
+    transient error is retried with exponential backoff, and fails as a whole if it keeps failing;
+    one that is too large or holds a bad row is split in half until the rows that cause the error
+    are isolated, so one bad row or one flaky request never costs the rest of the batch.
+
+    `write(rows)` sends rows and returns one error (None when written) per row, for callers that
+    retry failures themselves. `add(row)` / `flush()` accumulate rows across calls instead and
+    collect whatever still failed in `failed`.
+    """
+
+    def __init__(self, supabase, table: str, upsert: bool = False, on_conflict: str = "",
+                 max_rows: int = WRITE_BATCH_ROWS, max_bytes: int = WRITE_BATCH_BYTES,
+                 concurrency: int = WRITE_CONCURRENCY, retries: int = WRITE_RETRIES, backoff: float = WRITE_BACKOFF,
+                 vector_columns: tuple = ("embedding",)):
+        self.supabase = supabase
+        self.table = table
+        self.upsert = upsert
+        self.on_conflict = on_conflict
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self.vector_columns = vector_columns
+        self.failed = []        # (row, error) pairs from add()/flush() that could not be written
+        self._executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix=f"write-{table}")
+        self._slots = threading.BoundedSemaphore(2 * self.concurrency)
+        self._lock = threading.Lock()
+        self._buffer, self._buffer_bytes = [], 0
+        self._futures = set()
+        self._started_at = time.perf_counter()
+        self.stats = {"rows": 0, "failed": 0, "requests": 0, "batches": 0, "retries": 0, "splits": 0,
+                      "bytes": 0}
+
+    # --- sending ---
+
+    def _send(self, rows: list):
+        if self.upsert:
+            query = self.supabase.table(self.table).upsert(rows, returning="minimal", on_conflict=self.on_conflict)
+        else:
+            query = self.supabase.table(self.table).insert(rows, returning="minimal")
+        query.execute()
+
+    def _write_batch(self, batch: list) -> list:
+        """Writes (row, size) pairs; returns the error per row (None when written), in order."""
+        rows = [row for row, _ in batch]
+        for attempt in range(self.retries + 1):
+            try:
+                self._send(rows)
+                kind, error = None, None
+            except Exception as e:
+                kind, error = error_kind(e), e
+            with self._lock:
+                self.stats["requests"] += 1
+                if error is None:
+                    self.stats["rows"] += len(rows)
+                    self.stats["bytes"] += sum(size for _, size in batch)
+                    return [None] * len(rows)
+                if kind == "transient" and attempt < self.retries:
+                    self.stats["retries"] += 1
+            if kind != "transient" or attempt == self.retries:
+                break
+            time.sleep(self.backoff * 2 ** attempt * (0.5 + random.random()))
+
+        if len(batch) == 1 or kind == "transient":
+            # Still failing after the retries (e.g. an outage): splitting would only multiply the
+            # requests, so the whole batch fails and the caller retries it later
+            with self._lock:
+                self.stats["failed"] += len(batch)
+            print(f"  !!!!!! Could not write {len(batch)} rows to {self.table}. Error: {error} !!!!!!")
+            return [error] * len(batch)
+        # Split in half: the good rows get through, the bad ones end up alone
+        with self._lock:
+            self.stats["splits"] += 1
+        middle = len(batch) // 2
+        return self._write_batch(batch[:middle]) + self._write_batch(batch[middle:])
+
+    def _prepare(self, rows: list) -> list:
+        return [(row, row_bytes(row)) for row in (compact_row(row, self.vector_columns) for row in rows)]
+
+    def _batches(self, sized_rows: list) -> list:
+        batches, batch, batch_bytes = [], [], 0
+        for row, size in sized_rows:
+            if batch and (len(batch) >= self.max_rows or batch_bytes + size > self.max_bytes):
+                batches.append(batch)
+                batch, batch_bytes = [], 0
+            batch.append((row, size))
+            batch_bytes += size
+        if batch:
+            batches.append(batch)
+        return batches
+
+    # --- blocking writes ---
+
+    def write(self, rows: list) -> list:
+        """Writes `rows` now, batches in parallel; returns one error (None when written) per row."""
+        batches = self._batches(self._prepare(rows))
+        with self._lock:
+            self.stats["batches"] += len(batches)
+        return [error for errors in self._executor.map(self._write_batch, batches) for error in errors]
+
+    # --- buffered writes ---
+
+    def _dispatch(self, batch: list):
+        self._slots.acquire()  # backpressure: at most 2 * concurrency batches queued or in flight
+        with self._lock:
+            self.stats["batches"] += 1
+        future = self._executor.submit(self._write_batch, batch)
+        future.batch = batch
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._finished)
+
+    def _finished(self, future):
+        self._slots.release()
+        errors = future.result() if not future.exception() else [future.exception()] * len(future.batch)
+        with self._lock:
+            self._futures.discard(future)
+            self.failed.extend((row, error) for (row, _), error in zip(future.batch, errors) if error is not None)
+
+    def add(self, row: dict):
+        self.add_many([row])
+
+    def add_many(self, rows: list):
+        """Buffers rows, sending a batch whenever the buffer reaches `max_rows` or `max_bytes`."""
+        for row, size in self._prepare(rows):
+            with self._lock:
+                full = bool(self._buffer) and (len(self._buffer) >= self.max_rows or
+                                               self._buffer_bytes + size > self.max_bytes)
+                if full:
+                    batch, self._buffer, self._buffer_bytes = self._buffer, [], 0
+                self._buffer.append((row, size))
+                self._buffer_bytes += size
+            if full:
+                self._dispatch(batch)
+
+    def flush(self) -> list:
+        """Sends the buffered rows and waits for every batch in flight; returns the failures so far."""
+        with self._lock:
+            batch, self._buffer, self._buffer_bytes = self._buffer, [], 0
+        if batch:
+            self._dispatch(batch)
+        with self._lock:
+            futures = list(self._futures)
+        wait(futures)
+        return self.failed
+
+    def close(self):
+        self.flush()
+        self._executor.shutdown()
+
+    def report(self) -> str:
+        s = self.stats
+        elapsed = time.perf_counter() - self._started_at
+        return (f"Writes to {self.table}: {s['rows']} rows in {s['batches']} batches ({s['requests']} requests, "
+                f"{s['retries']} retries, {s['splits']} splits), {s['failed']} rows failed, "
+                f"{s['bytes'] / 1e6:.1f} MB, {s['rows'] / elapsed if elapsed else 0:.0f} rows/s.")
@@ -0,0 +1,300 @@
+import os
+import threading
+import numpy as np
+
+from ann_index import assign_lists, train_centroids
+from bulk_writer import BulkWriter
+from embeddings import encode_texts
+from index_version import REWRITES_INDEX, read_index_version
+from quantize import format_embedding, quantize_int8, to_float16
+from vector_index import PAGE_SIZE, normalize_rows, parse_embedding, top_k
+
+# --- SETTINGS ---
+# Set ARTICLE_CHUNKS=1 to store passage embeddings at ingestion (needs the article_chunks table)
+ARTICLE_CHUNKS = os.getenv("ARTICLE_CHUNKS", "0") == "1"
+# Passages of ~CHUNK_CHARS characters overlapping by CHUNK_OVERLAP, cut on word boundaries.
+# all-mpnet-base-v2 reads at most 384 tokens, roughly 1500 characters of English.
+CHUNK_CHARS = int(os.getenv("CHUNK_CHARS", "1200"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+# Caps the chunks of very long pages so one article can't dominate the index.
+MAX_CHUNKS_PER_ARTICLE = int(os.getenv("MAX_CHUNKS_PER_ARTICLE", "24"))
+#   create table article_chunks (article_id bigint references articles(id) on delete cascade,
+#     chunk int not null, embedding vector(768), primary key (article_id, chunk));
+CHUNKS_TABLE = "article_chunks"
+# In-memory storage of chunk vectors: int8 (1 byte/dim + a scale) or float16 (2 bytes/dim)
+CHUNK_INDEX_DTYPE = os.getenv("CHUNK_INDEX_DTYPE", "int8")
+# How chunk similarities become an article score: max (best passage) or mean
+CHUNK_POOLING = os.getenv("CHUNK_POOLING", "max")
+# Chunks are partitioned into IVF lists once there are this many; queries then probe CHUNK_NPROBE lists.
+PARTITION_MIN_CHUNKS = int(os.getenv("CHUNK_PARTITION_MIN", "20000"))
+CHUNK_NPROBE = int(os.getenv("CHUNK_NPROBE", "64"))
+# New chunks are scanned exhaustively until this many have accumulated, then assigned to their lists.
+PARTITION_DELTA = 4096
+SCORE_BLOCK = 16384
+
+
+def split_passages(text: str, size: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP,
+                   max_chunks: int = MAX_CHUNKS_PER_ARTICLE) -> list:
+    """Overlapping passages of about `size` characters, cut between words."""
+    words = (text or "").split()
+    passages, start = [], 0
+    while start < len(words) and len(passages) < max_chunks:
+        end, length = start, 0
+        while end < len(words) and (length == 0 or length + len(words[end]) + 1 <= size):
+            length += len(words[end]) + 1
+            end += 1
+        passages.append(" ".join(words[start:end]))
+        if end >= len(words):
+            break
+        # Step back over roughly `overlap` characters of the passage just emitted
+        back, step = end, 0
+        while back > start + 1 and step + len(words[back - 1]) + 1 <= overlap:
+            back -= 1
+            step += len(words[back]) + 1
+        start = back
+    return passages
+
+
+def embed_chunks(model, rows: list, text_key: str = "content") -> list:
+    """Chunk rows ({'article_id', 'chunk', 'embedding'}) for articles with an 'id', encoded in one batched pass."""
+    passages, owners = [], []
+    for row in rows:
+        for number, passage in enumerate(split_passages(row.get(text_key))):
+            passages.append(passage)
+            owners.append((row['id'], number))
+    vectors = encode_texts(model, passages, max_chars=CHUNK_CHARS)
+    return [
+        {'article_id': article_id, 'chunk': number, 'embedding': format_embedding(vector)}
+        for (article_id, number), vector in zip(owners, vectors)
+    ]
+
+
+def store_chunks(supabase, model, rows: list, replace: bool = False, batch_size: int = 500) -> int:
+    """Embeds and stores the passages of inserted articles; rows without an 'id' are looked up by url.
+
+    With `replace=True` existing chunks of those articles are deleted first (content changed).
+    """
+    missing = [row['url'] for row in rows if 'id' not in row]
+    if missing:
+        found = supabase.table('articles').select('id, url').in_('url', missing).execute().data or []
+        ids_by_url = {row['url']: row['id'] for row in found}
+        rows = [dict(row, id=ids_by_url[row['url']]) if 'id' not in row else row
+                for row in rows if 'id' in row or row['url'] in ids_by_url]
+    if not rows:
+        return 0
+    if replace:
+        supabase.table(CHUNKS_TABLE).delete().in_('article_id', [row['id'] for row in rows]).execute()
+    return insert_chunks(supabase, embed_chunks(model, rows), batch_size)
+
+
+def insert_chunks(supabase, chunk_rows: list, batch_size: int = 500) -> int:
+    """Bulk-inserts chunk rows; raises the first error once every other row has been written."""
+    writer = BulkWriter(supabase, CHUNKS_TABLE, max_rows=batch_size)
+    try:
+        errors = writer.write(chunk_rows)
+    finally:
+        writer.close()
+    for error in errors:
+        if error is not None:
+            raise error
+    return len(chunk_rows)
+
+
+def iter_chunks(supabase, after_article_id: int = 0, page_size: int = PAGE_SIZE):
+    """Yields (article_ids, float32 embeddings) pages of chunks, ordered by article then chunk."""
+    # Keyset pagination on (article_id, chunk); the first page starts after every chunk of after_article_id
+    last_article, last_chunk = after_article_id, 2 ** 31 - 1
+    while True:
+        rows = (
+            supabase.table(CHUNKS_TABLE)
+            .select('article_id, chunk, embedding')
+            .or_(f'article_id.gt.{last_article},and(article_id.eq.{last_article},chunk.gt.{last_chunk})')
+            .order('article_id')
+            .order('chunk')
+            .limit(page_size)
+            .execute()
+        ).data or []
+        if rows:
+            last_article, last_chunk = rows[-1]['article_id'], rows[-1]['chunk']
+            yield [row['article_id'] for row in rows], np.stack([parse_embedding(row['embedding']) for row in rows])
+        if len(rows) < page_size:
+            return
+
+
+class ChunkIndex:
+    """Passage vectors of every article, searched and pooled back to article scores.
+
+    Chunk vectors are stored as int8 + scale (or float16) codes with the position of their
+    article in `owners`. Once there are `PARTITION_MIN_CHUNKS` of them they are grouped into
+    k-means lists like the IVF index, and a query decodes and scores only the `nprobe` nearest
+    lists plus the chunks added since the last partitioning. Scores are then pooled per article:
+    max takes each article's best passage, mean averages its scored passages. `rewrite_version`
+    is the REWRITES_INDEX version the chunks were read at.
+    """
+
+    def __init__(self, dim: int = 768, dtype: str = CHUNK_INDEX_DTYPE, pooling: str = CHUNK_POOLING,
+                 nprobe: int = CHUNK_NPROBE):
+        self.dim = dim
+        self.dtype = dtype
+        self.pooling = pooling
+        self.nprobe = nprobe
+        self.codes = np.zeros((0, dim), dtype=np.int8 if dtype == "int8" else np.float16)
+        self.scales = np.zeros(0, dtype=np.float32)
+        self.owners = np.zeros(0, dtype=np.int32)      # article position of every chunk
+        self.article_ids = []                           # article id of every article position
+        self._positions = {}                            # article id -> article position
+        self.max_article_id = 0
+        self.rewrite_version = 0
+        self.centroids = None                           # (nlist, dim) once partitioned
+        self.offsets = None                             # list boundaries over the first `_partitioned` rows
+        self._partitioned = 0
+        self._trained_at = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.article_ids)
+
+    @property
+    def chunk_count(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        centroids = self.centroids.nbytes if self.centroids is not None else 0
+        return self.codes.nbytes + self.scales.nbytes + self.owners.nbytes + centroids
+
+    @classmethod
+    def load(cls, supabase, dim: int = 768, **kwargs) -> "ChunkIndex":
+        index = cls(dim, **kwargs)
+        index.rewrite_version = read_index_version(supabase, REWRITES_INDEX) or 0
+        index.sync(supabase)
+        print(f"Chunk index loaded: {index.chunk_count} chunks of {len(index)} articles, {index.nbytes / 1e6:.0f} MB.")
+        return index
+
+    def sync(self, supabase) -> int:
+        """Adds the chunks of every article newer than the newest one indexed."""
+        added = 0
+        for article_ids, embeddings in iter_chunks(supabase, after_article_id=self.max_article_id):
+            self.add_many(article_ids, embeddings)
+            added += len(article_ids)
+        return added
+
+    def refresh(self, supabase) -> "ChunkIndex":
+        """This index with new articles' chunks added, or a reloaded one after rewrites.
+
+        Sync only sees article ids above `max_article_id`, so chunks replaced by enrichment
+        (`store_chunks(replace=True)`) are picked up by reloading every chunk once the rewrites
+        version moves. The new index is loaded aside; searches keep using this one meanwhile.
+        """
+        rewrite_version = read_index_version(supabase, REWRITES_INDEX)
+        if rewrite_version is not None and rewrite_version != self.rewrite_version:
+            print("Reloading the chunk index after rewrites...")
+            return ChunkIndex.load(supabase, self.dim, dtype=self.dtype, pooling=self.pooling, nprobe=self.nprobe)
+        print(f"Chunk index synced: {self.sync(supabase)} new chunks.")
+        return self
+
+    # --- updates ---
+
+    def _decode(self, rows) -> np.ndarray:
+        vectors = self.codes[rows].astype(np.float32)
+        if self.dtype == "int8":
+            vectors *= self.scales[rows][:, None]
+        return vectors
+
+    def add_many(self, article_ids: list, embeddings: np.ndarray):
+        """Appends chunk vectors; `article_ids` has one entry per chunk."""
+        embeddings = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim))
+        if self.dtype == "int8":
+            codes, scales = quantize_int8(embeddings)
+        else:
+            codes, scales = to_float16(embeddings), np.ones(len(embeddings), dtype=np.float32)
+        with self._lock:
+            owners = np.empty(len(article_ids), dtype=np.int32)
+            for i, article_id in enumerate(article_ids):
+                article_id = int(article_id)
+                position = self._positions.get(article_id)
+                if position is None:
+                    position = self._positions[article_id] = len(self.article_ids)
+                    self.article_ids.append(article_id)
+                owners[i] = position
+                self.max_article_id = max(self.max_article_id, article_id)
+
+            needed = self._size + len(codes)
+            if needed > self.codes.shape[0]:
+                # Grow geometrically so incremental inserts stay amortized O(1).
+                capacity = max(needed, 2 * self.codes.shape[0], 4096)
+                self.codes = np.concatenate([self.codes[:self._size], np.zeros((capacity - self._size, self.dim), dtype=self.codes.dtype)])
+                self.scales = np.concatenate([self.scales[:self._size], np.ones(capacity - self._size, dtype=np.float32)])
+                self.owners = np.concatenate([self.owners[:self._size], np.zeros(capacity - self._size, dtype=np.int32)])
+            self.codes[self._size:needed] = codes
+            self.scales[self._size:needed] = scales
+            self.owners[self._size:needed] = owners
+            self._size = needed
+
+            unpartitioned = self._size - self._partitioned
+            if self.centroids is None:
+                if self._size >= PARTITION_MIN_CHUNKS:
+                    self._partition(retrain=True)
+            elif unpartitioned >= PARTITION_DELTA:
+                # Retrain once the index doubled since the centroids were learned, else reuse them
+                self._partition(retrain=self._size >= 2 * self._trained_at)
+
+    def _partition(self, retrain: bool):
+        """Groups every chunk by its nearest centroid (k-means over sqrt(n) lists when retraining)."""
+        size = self._size
+        if retrain:
+            rng = np.random.default_rng(0)
+            sample = np.sort(rng.choice(size, min(size, 50_000), replace=False))
+            self.centroids = train_centroids(self._decode(sample), max(1, int(np.sqrt(size))))
+            self._trained_at = size
+            start = 0
+            assignments = np.empty(size, dtype=np.int32)
+        else:
+            # Rows already partitioned keep their list; only the new ones are assigned
+            start = self._partitioned
+            assignments = np.empty(size, dtype=np.int32)
+            assignments[:start] = np.repeat(np.arange(len(self.centroids), dtype=np.int32), np.diff(self.offsets))
+        for block in range(start, size, SCORE_BLOCK):
+            rows = np.arange(block, min(block + SCORE_BLOCK, size))
+            assignments[rows] = assign_lists(self._decode(rows), self.centroids)
+
+        order = np.argsort(assignments, kind="stable")
+        self.codes[:size] = self.codes[order]
+        self.scales[:size] = self.scales[order]
+        self.owners[:size] = self.owners[order]
+        counts = np.bincount(assignments, minlength=len(self.centroids))
+        self.offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self._partitioned = size
+
+    # --- search ---
+
+    def _candidate_rows(self, query: np.ndarray) -> np.ndarray:
+        if self.centroids is None:
+            return np.arange(self._size)
+        probe = top_k(self.centroids @ query, self.nprobe)
+        ranges = [np.arange(self.offsets[i], self.offsets[i + 1]) for i in probe]
+        ranges.append(np.arange(self._partitioned, self._size))
+        return np.concatenate(ranges)
+
+    def search(self, query, k: int = 10):
+        """Top-k (article ids, pooled scores), best first."""
+        query = normalize_rows(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        with self._lock:
+            rows = self._candidate_rows(query)
+            scores = np.concatenate([
+                self._decode(rows[start:start + SCORE_BLOCK]) @ query for start in range(0, len(rows), SCORE_BLOCK)
+            ]) if len(rows) else np.zeros(0, dtype=np.float32)
+            owners = self.owners[rows]
+            article_ids = np.asarray(self.article_ids, dtype=np.int64)
+
+        if self.pooling == "mean":
+            articles, inverse = np.unique(owners, return_inverse=True)
+            pooled = np.bincount(inverse, weights=scores) / np.bincount(inverse)
+        else:
+            # Sorted best-first, the first occurrence of each article is its best passage
+            order = np.argsort(-scores, kind="stable")
+            articles, first = np.unique(owners[order], return_index=True)
+            pooled = scores[order][first]
+        best = top_k(pooled, k)
+        return article_ids[articles[best]], pooled[best].astype(np.float32)
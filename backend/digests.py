@@ -0,0 +1,79 @@
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+from embeddings import encode_texts
+
+# --- SETTINGS ---
+# Set ARTICLE_DIGESTS=1 to store a digest (extractive summary + keywords) with every article; needs
+# the digest/keywords columns from README_SETUP.md. Summaries fall back to raw content without one.
+ARTICLE_DIGESTS = os.getenv("ARTICLE_DIGESTS", "0") == "1"
+DIGEST_SENTENCES = int(os.getenv("DIGEST_SENTENCES", "3"))
+DIGEST_KEYWORDS = 8
+# Only the first sentences of long articles are ranked, which bounds the encode cost per article.
+MAX_CANDIDATE_SENTENCES = 40
+MIN_SENTENCE_CHARS = 40
+MAX_SENTENCE_CHARS = 400
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+(?=["“(\[A-Z0-9])')
+WORD = re.compile(r"[a-z][a-z0-9+#\-]{2,}")
+STOPWORDS = frozenset("""
+about above after again against all also and any are because been before being below between both but
+can could did does doing down during each even every few for from further get got had has have having her
+here hers him his how however into its itself just like make made many may more most much must new not now
+off once one only other our ours out over own same she should since some such than that the their theirs
+them then there these they this those through too under until use used using very was way we well were what
+when where which while who whom why will with within without would you your yours also it's we're don't
+""".split())
+
+
+def split_sentences(text: str) -> list:
+    """Candidate sentences for the extractive summary, in document order."""
+    sentences = []
+    for sentence in SENTENCE_BOUNDARY.split(" ".join((text or "").split())):
+        if MIN_SENTENCE_CHARS <= len(sentence) <= MAX_SENTENCE_CHARS and sentence not in sentences:
+            sentences.append(sentence)
+            if len(sentences) >= MAX_CANDIDATE_SENTENCES:
+                break
+    return sentences
+
+
+def central_sentences(vectors: np.ndarray, k: int = DIGEST_SENTENCES) -> list:
+    """Positions of the k sentences most similar to all the others, in document order.
+
+    With L2-normalized rows, the row sums of the cosine-similarity matrix are one
+    matrix-vector product against the summed sentence vectors.
+    """
+    centrality = vectors @ vectors.sum(axis=0)
+    return sorted(np.argsort(-centrality, kind="stable")[:k].tolist())
+
+
+def extract_keywords(title: str, text: str, k: int = DIGEST_KEYWORDS) -> list:
+    """Most frequent non-stopword terms; title terms count three times."""
+    counts = Counter(word for word in WORD.findall((text or "").lower()) if word not in STOPWORDS)
+    for word in WORD.findall((title or "").lower()):
+        if word not in STOPWORDS:
+            counts[word] += 3
+    return [word for word, _ in counts.most_common(k)]
+
+
+def add_digests(model, rows: list, text_key: str = "content", k: int = DIGEST_SENTENCES) -> list:
+    """Fills `digest` and `keywords` on every row, encoding the sentences of all rows in one batched pass."""
+    sentences = [split_sentences(row.get(text_key)) for row in rows]
+    flat = [sentence for row_sentences in sentences for sentence in row_sentences]
+    vectors = encode_texts(model, flat, normalize=True, max_chars=MAX_SENTENCE_CHARS)
+
+    start = 0
+    for row, row_sentences in zip(rows, sentences):
+        row_vectors = vectors[start:start + len(row_sentences)]
+        start += len(row_sentences)
+        if len(row_sentences) > k:
+            row["digest"] = " ".join(row_sentences[i] for i in central_sentences(row_vectors, k))
+        elif row_sentences:
+            row["digest"] = " ".join(row_sentences)
+        else:
+            row["digest"] = " ".join((row.get(text_key) or "").split())[:MAX_SENTENCE_CHARS]
+        row["keywords"] = extract_keywords(row.get("title"), row.get(text_key))
+    return rows
@@ -0,0 +1,306 @@
+import os
+import re
+import threading
+from typing import Optional
+
+import numpy as np
+
+from vector_index import PAGE_SIZE
+
+# --- SETTINGS ---
+CACHE_DIR = os.getenv("ERBLOGX_CACHE_DIR", ".cache")
+DUPLICATE_INDEX_PATH = os.path.join(CACHE_DIR, "minhash.npz")
+# "skip" drops near-duplicate articles before they are embedded, "link" stores them without an
+# embedding and with `duplicate_of` set to the canonical article, "off" disables the check.
+NEAR_DUPLICATES = os.getenv("NEAR_DUPLICATES", "skip")
+LINK_DUPLICATES = NEAR_DUPLICATES == "link"
+# Estimated Jaccard similarity of word shingles above which two articles are the same post.
+# A mirrored copy with a syndication header, a few edits or a cut-off tail scores 0.75-0.9;
+# unrelated posts stay near 0.
+DUPLICATE_JACCARD = float(os.getenv("DUPLICATE_JACCARD", "0.7"))
+# MinHash values per article, looked up as BANDS bands of NUM_HASHES // BANDS values each.
+# 16 bands of 4 make a pair at Jaccard 0.7 a candidate with probability 0.99, at 0.3 with 0.12.
+NUM_HASHES = 64
+BANDS = 16
+# Words per shingle; texts shorter than MIN_WORDS (titles, one-line summaries) are never matched.
+SHINGLE_WORDS = 3
+MIN_WORDS = 50
+# Characters of a token that are hashed (long identifiers and hashes are cut).
+MAX_TOKEN_CHARS = 24
+# Shingles hashed per numpy pass, bounding the scratch memory of very long pages.
+SHINGLE_BLOCK = 4096
+# Signatures added since the last re-sort are scanned directly until there are this many.
+DELTA_LIMIT = 4096
+
+WORD = re.compile(r"\w+")
+_seeds = np.random.default_rng(0x5EED).integers(1, 2 ** 63, size=(2, NUM_HASHES), dtype=np.uint64)
+HASH_MULTIPLIERS = _seeds[0] | np.uint64(1)
+HASH_OFFSETS = _seeds[1]
+
+# States of an article claimed during a run.
+RELEASED, PENDING, WRITTEN = 0, 1, 2
+
+
+class PendingDuplicate(Exception):
+    """Raised by `claim` for a copy of an article accepted in this run that isn't stored yet."""
+
+
+def _token_hashes(tokens: list) -> np.ndarray:
+    """FNV-1a of every token's code points (its first MAX_TOKEN_CHARS), computed column by column."""
+    codes = np.array([token[:MAX_TOKEN_CHARS] for token in tokens]).view(np.uint32).reshape(len(tokens), -1)
+    hashes = np.full(len(tokens), 0xCBF29CE484222325, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for column in codes.T.astype(np.uint64):
+            # Shorter tokens are zero-padded; skipping the padding keeps a token's hash independent of its neighbours
+            hashes = np.where(column != 0, (hashes ^ column) * np.uint64(0x100000001B3), hashes)
+    return hashes
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, so related inputs get unrelated 64-bit hashes."""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def shingle_hashes(text: str) -> Optional[np.ndarray]:
+    """Distinct 64-bit hashes of the SHINGLE_WORDS-word shingles of `text`, None if it is too short."""
+    tokens = WORD.findall((text or "").lower())
+    if len(tokens) < MIN_WORDS:
+        return None
+    hashes = _token_hashes(tokens)
+    count = len(tokens) - SHINGLE_WORDS + 1
+    shingles = hashes[:count].copy()
+    with np.errstate(over="ignore"):
+        for offset in range(1, SHINGLE_WORDS):
+            shingles = shingles * np.uint64(0x100000001B3) ^ hashes[offset:offset + count]
+        return np.unique(_mix(shingles))
+
+
+def minhash(text: str) -> Optional[np.ndarray]:
+    """NUM_HASHES uint32 MinHash values of the word shingles of `text`, or None when it is too short.
+
+    Value i is the smallest of the shingle hashes under the i-th random affine map, so the share
+    of equal values between two signatures estimates the Jaccard similarity of their shingle sets.
+    Copies of a post that differ in boilerplate, tracking links or a few edits share most shingles.
+    """
+    shingles = shingle_hashes(text)
+    if shingles is None:
+        return None
+    signature = np.full(NUM_HASHES, np.iinfo(np.uint64).max, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for start in range(0, len(shingles), SHINGLE_BLOCK):
+            block = shingles[start:start + SHINGLE_BLOCK, None] * HASH_MULTIPLIERS + HASH_OFFSETS
+            np.minimum(signature, block.min(axis=0), out=signature)
+    return (signature >> np.uint64(32)).astype(np.uint32)
+
+
+def band_keys(signatures: np.ndarray, bands: int = BANDS) -> np.ndarray:
+    """(n, bands) uint64 keys, one hash per band of consecutive MinHash values."""
+    signatures = np.atleast_2d(signatures).astype(np.uint64)
+    rows = signatures.shape[1] // bands
+    banded = signatures[:, :bands * rows].reshape(len(signatures), bands, rows)
+    keys = np.zeros(banded.shape[:2], dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for row in range(rows):
+            keys = keys * np.uint64(0x100000001B3) ^ banded[:, :, row]
+        return _mix(keys)
+
+
+class DuplicateIndex:
+    """MinHash signatures of stored articles, for finding near-duplicates before they are embedded.
+
+    Signatures (NUM_HASHES uint32 values, 256 bytes per article) and article ids are kept in
+    arrays and persisted with the highest article id seen, like the URL index. For LSH each band
+    of the signature is hashed to one key, with a sorted copy per band for `searchsorted`
+    lookups; signatures added since the last sort sit in a small tail that is compared directly.
+    Candidates are confirmed by their estimated Jaccard similarity. Articles accepted during a run
+    but not written yet are held by queue key, so a later copy in the same run is caught too.
+    """
+
+    def __init__(self, path: str = DUPLICATE_INDEX_PATH, threshold: float = DUPLICATE_JACCARD):
+        self.path = path
+        self.threshold = threshold
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.signatures = np.zeros((0, NUM_HASHES), dtype=np.uint32)
+        self.max_id = 0
+        self._band_keys = None  # (BANDS, _sorted) sorted band keys of the first `_sorted` signatures
+        self._band_order = None  # (BANDS, _sorted) positions in that sorted order
+        self._sorted = 0
+        self._size = 0
+        self._pending = {}      # queue key -> row of _pending_signatures, for articles claimed this run
+        self._pending_signatures = np.zeros((0, NUM_HASHES), dtype=np.uint32)
+        self._pending_state = np.zeros(0, dtype=np.int8)  # PENDING, WRITTEN or RELEASED per row
+        self._pending_count = 0
+        self._lock = threading.Lock()
+        self.stats = {"checked": 0, "duplicates": 0}
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        sorted_bytes = self._band_keys.nbytes + self._band_order.nbytes if self._band_keys is not None else 0
+        return self.ids[:self._size].nbytes + self.signatures[:self._size].nbytes + sorted_bytes
+
+    @classmethod
+    def load(cls, supabase, path: str = DUPLICATE_INDEX_PATH) -> "DuplicateIndex":
+        index = cls(path)
+        if os.path.exists(path):
+            try:
+                with np.load(path) as data:
+                    index.add_many(data["ids"], data["signatures"])
+                    index.max_id = int(data["max_id"])
+            except Exception as e:
+                print(f"Could not read duplicate index at {path}, rebuilding. Error: {e}")
+                index = cls(path)
+
+        known_before = len(index)
+        try:
+            index.sync(supabase)
+        except Exception as e:
+            print(f"Duplicate index sync failed, articles stored since the last run won't be matched. Error: {e}")
+        print(f"Duplicate index ready: {len(index)} articles ({len(index) - known_before} new since last run).")
+        return index
+
+    def sync(self, supabase, page_size: int = PAGE_SIZE):
+        """Fingerprints every article with an id above `max_id`."""
+        while True:
+            query = supabase.table('articles').select('id, content').gt('id', self.max_id)
+            if LINK_DUPLICATES:
+                query = query.is_('duplicate_of', 'null')
+            rows = query.order('id').limit(page_size).execute().data or []
+            ids, signatures = [], []
+            for row in rows:
+                signature = minhash(row.get('content'))
+                if signature is not None:
+                    ids.append(row['id'])
+                    signatures.append(signature)
+            if ids:
+                self.add_many(ids, np.stack(signatures))
+            if rows:
+                self.max_id = max(self.max_id, max(row['id'] for row in rows))
+            if len(rows) < page_size:
+                return
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(tmp_path, ids=self.ids[:self._size], signatures=self.signatures[:self._size],
+                 max_id=np.int64(self.max_id))
+        os.replace(tmp_path, self.path)
+
+    # --- updates ---
+
+    def add_many(self, ids, signatures):
+        ids = np.asarray(ids, dtype=np.int64)
+        signatures = np.asarray(signatures, dtype=np.uint32).reshape(-1, NUM_HASHES)
+        with self._lock:
+            needed = self._size + len(ids)
+            if needed > len(self.ids):
+                # Grow geometrically so incremental inserts stay amortized O(1).
+                capacity = max(needed, 2 * len(self.ids), 4096)
+                self.ids = np.resize(self.ids, capacity)
+                self.signatures = np.resize(self.signatures, (capacity, NUM_HASHES))
+            self.ids[self._size:needed] = ids
+            self.signatures[self._size:needed] = signatures
+            self._size = needed
+            if needed - self._sorted > DELTA_LIMIT:
+                self._sort()
+
+    def _sort(self):
+        keys = band_keys(self.signatures[:self._size]).T
+        order = np.argsort(keys, axis=1, kind="stable")
+        self._band_keys = np.take_along_axis(keys, order, axis=1)
+        self._band_order = order.astype(np.int32)
+        self._sorted = self._size
+
+    # --- lookups ---
+
+    def _candidates(self, signature: np.ndarray) -> np.ndarray:
+        positions = [np.arange(self._sorted, self._size)]
+        if self._sorted:
+            for band, key in enumerate(band_keys(signature)[0]):
+                keys = self._band_keys[band]
+                lo, hi = np.searchsorted(keys, key, side="left"), np.searchsorted(keys, key, side="right")
+                positions.append(self._band_order[band, lo:hi])
+        return np.unique(np.concatenate(positions))
+
+    def find(self, signature: np.ndarray) -> Optional[int]:
+        """Id of the most similar stored article at or above the threshold (oldest on ties), or None."""
+        with self._lock:
+            positions = self._candidates(signature)
+            if not len(positions):
+                return None
+            similarity = (self.signatures[positions] == signature).mean(axis=1)
+            close = similarity >= self.threshold
+            if not close.any():
+                return None
+            positions, similarity = positions[close], similarity[close]
+            best = np.lexsort((self.ids[positions], -similarity))[0]
+            return int(self.ids[positions[best]])
+
+    def claim(self, key: str, text: str):
+        """Checks an article about to be embedded: returns (canonical id or None, is_duplicate).
+
+        A new article is remembered under `key` until the index is next synced, so retrying the
+        same key is never reported as its own duplicate. A copy of an article accepted and written
+        earlier in the run has no id to link to yet and comes back as (None, True); a copy of one
+        whose write hasn't succeeded yet raises PendingDuplicate, so it is retried rather than
+        dropped in case that write ends up failing.
+        """
+        signature = minhash(text)
+        if signature is None:
+            with self._lock:
+                self.stats["checked"] += 1
+            return None, False
+        canonical = self.find(signature)
+        with self._lock:
+            if canonical is not None:
+                self.stats["checked"] += 1
+                self.stats["duplicates"] += 1
+                return canonical, True
+            own = self._pending.get(key)
+            count = self._pending_count
+            state = self._pending_state[:count]
+            close = ((self._pending_signatures[:count] == signature).mean(axis=1) >= self.threshold) & (state > 0)
+            if own is not None:
+                close[own] = False
+            if (close & (state == WRITTEN)).any():
+                self.stats["checked"] += 1
+                self.stats["duplicates"] += 1
+                return None, True
+            if close.any():
+                raise PendingDuplicate("copy of an article whose write hasn't succeeded yet")
+            self.stats["checked"] += 1
+            if own is None:
+                if count == len(self._pending_signatures):
+                    capacity = max(1024, 2 * count)
+                    self._pending_signatures = np.resize(self._pending_signatures, (capacity, NUM_HASHES))
+                    self._pending_state = np.resize(self._pending_state, capacity)
+                own = self._pending[key] = count
+                self._pending_count += 1
+            self._pending_signatures[own] = signature
+            self._pending_state[own] = PENDING
+            return None, False
+
+    def written(self, keys):
+        """Marks claimed articles as stored; later copies of them are duplicates from now on."""
+        with self._lock:
+            for key in keys:
+                row = self._pending.get(key)
+                if row is not None:
+                    self._pending_state[row] = WRITTEN
+
+    def release(self, keys):
+        """Forgets claimed articles whose write failed for good, so a copy can be stored instead."""
+        with self._lock:
+            for key in keys:
+                row = self._pending.pop(key, None)
+                if row is not None:
+                    self._pending_state[row] = RELEASED
+
+    def report(self) -> str:
+        s = self.stats
+        return (f"Near-duplicates: {s['duplicates']} of {s['checked']} new articles ({NEAR_DUPLICATES}), "
+                f"{len(self)} articles indexed.")
@@ -0,0 +1,268 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+
+from quantize import format_embedding
+
+# --- SETTINGS ---
+# Articles are embedded from their first MAX_EMBED_CHARS characters, same as the old per-item path.
+MAX_EMBED_CHARS = 4000
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+NORMALIZE_EMBEDDINGS = os.getenv("NORMALIZE_EMBEDDINGS", "1") == "1"
+MODEL_NAME = 'all-mpnet-base-v2'
+# torch (SentenceTransformer), onnx (onnxruntime fp32) or onnx-int8 (dynamically quantized weights)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+CACHE_DIR = os.getenv("ERBLOGX_CACHE_DIR", ".cache")
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join(CACHE_DIR, "onnx"))
+
+
+def encode_texts(model, texts: list, batch_size: int = EMBED_BATCH_SIZE,
+                 normalize: bool = NORMALIZE_EMBEDDINGS, max_chars: int = MAX_EMBED_CHARS) -> np.ndarray:
+    """Encodes a whole buffer of texts in length-sorted batches.
+
+    Texts are truncated to `max_chars`, sorted by length so each batch pads to
+    similarly sized inputs, encoded `batch_size` at a time and returned as a
+    float32 matrix in the original order.
+    """
+    if not texts:
+        return np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+    truncated = [(text or "")[:max_chars] for text in texts]
+    order = np.argsort([len(text) for text in truncated], kind="stable")
+
+    vectors = np.empty((len(truncated), model.get_sentence_embedding_dimension()), dtype=np.float32)
+    for start in range(0, len(order), batch_size):
+        bucket = order[start:start + batch_size]
+        vectors[bucket] = model.encode(
+            [truncated[i] for i in bucket],
+            batch_size=batch_size,
+            normalize_embeddings=normalize,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+    return vectors
+
+
+def embed_rows(model, rows: list, text_key: str = "content", embedding_key: str = "embedding",
+               batch_size: int = EMBED_BATCH_SIZE) -> list:
+    """Fills `embedding_key` on every row from one batched pass over `text_key`, in the compact payload format."""
+    vectors = encode_texts(model, [row[text_key] for row in rows], batch_size=batch_size)
+    for row, vector in zip(rows, vectors):
+        row[embedding_key] = format_embedding(vector)
+    return rows
+
+
+# --- embedder backends ---
+# Every backend exposes the subset of the SentenceTransformer API used in this repo:
+# `encode(texts_or_text, batch_size=..., normalize_embeddings=..., ...)` and
+# `get_sentence_embedding_dimension()`, so main.py, scraper.py and vector.py don't care which one runs.
+
+def export_onnx(path: str = ONNX_MODEL_DIR, quantize: bool = True, name: str = MODEL_NAME):
+    """Exports the transformer behind the sentence-transformer to ONNX, plus an int8 copy if asked."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize
+
+    st = SentenceTransformer(name, device="cpu")
+    transformer = st[0].auto_model.eval()
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask)[0]
+
+    os.makedirs(path, exist_ok=True)
+    st.tokenizer.save_pretrained(path)
+    dummy = st.tokenizer(["an example sentence"], return_tensors="pt")
+    fp32_path = os.path.join(path, "model.onnx")
+    torch.onnx.export(
+        LastHiddenState(transformer),
+        (dummy["input_ids"], dummy["attention_mask"]),
+        fp32_path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["last_hidden_state"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "last_hidden_state": {0: "batch", 1: "sequence"},
+        },
+        opset_version=17,
+        dynamo=False,
+    )
+    with open(os.path.join(path, "embedder.json"), "w") as f:
+        json.dump({
+            "model": name,
+            "max_seq_length": st.max_seq_length,
+            "dimension": st.get_sentence_embedding_dimension(),
+            "normalize": any(isinstance(module, Normalize) for module in st),
+        }, f)
+    print(f"Exported {name} to {fp32_path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        int8_path = os.path.join(path, "model-int8.onnx")
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        print(f"Quantized to {int8_path}")
+
+
+class OnnxEmbedder:
+    """Mean-pooled sentence embeddings from an exported transformer, run with onnxruntime on CPU."""
+
+    def __init__(self, session, tokenizer, max_seq_length: int, dimension: int, normalize: bool):
+        self.session = session
+        self.tokenizer = tokenizer
+        self.max_seq_length = max_seq_length
+        self.dimension = dimension
+        self.normalize = normalize
+        self.device = "cpu (onnxruntime)"
+
+    @classmethod
+    def load(cls, path: str = ONNX_MODEL_DIR, quantized: bool = False) -> "OnnxEmbedder":
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("EMBEDDING_BACKEND=onnx needs onnxruntime: pip install onnxruntime onnx")
+        from transformers import AutoTokenizer
+
+        model_path = os.path.join(path, "model-int8.onnx" if quantized else "model.onnx")
+        if not os.path.exists(model_path):
+            export_onnx(path, quantize=quantized)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if os.getenv("ORT_THREADS"):
+            options.intra_op_num_threads = int(os.getenv("ORT_THREADS"))
+        session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        with open(os.path.join(path, "embedder.json")) as f:
+            meta = json.load(f)
+        return cls(session, AutoTokenizer.from_pretrained(path), meta["max_seq_length"], meta["dimension"],
+                   meta["normalize"])
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, sentences, batch_size: int = 32, normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        vectors = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            batch = self.tokenizer(texts[start:start + batch_size], padding=True, truncation=True,
+                                   max_length=self.max_seq_length, return_tensors="np")
+            feeds = {
+                "input_ids": batch["input_ids"].astype(np.int64),
+                "attention_mask": batch["attention_mask"].astype(np.int64),
+            }
+            hidden = self.session.run(None, feeds)[0]
+            mask = feeds["attention_mask"][..., None].astype(np.float32)
+            vectors[start:start + len(hidden)] = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize or normalize_embeddings:
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors[0] if single else vectors
+
+
+def load_embedder(backend: str = EMBEDDING_BACKEND, name: str = MODEL_NAME):
+    """The embedding model for the configured backend."""
+    if backend == "torch":
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        print(f"Using device: {device}")
+        return SentenceTransformer(name, device=device)
+    if backend in ("onnx", "onnx-int8"):
+        print(f"Using onnxruntime backend ({backend})")
+        return OnnxEmbedder.load(quantized=backend == "onnx-int8")
+    raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}' (expected torch, onnx or onnx-int8)")
+
+
+def check_parity(backend: str = "onnx-int8", texts: list = None, tolerance: float = 0.02) -> float:
+    """Lowest cosine similarity between PyTorch and `backend` embeddings; raises if it is below 1 - tolerance."""
+    texts = texts or [
+        "How we scaled Postgres to millions of writes per second",
+        "Debugging a memory leak in a Rust async runtime",
+        "Kubernetes autoscaling lessons from Black Friday",
+        "Building a feature store for real-time machine learning",
+        "short",
+    ]
+    reference = encode_texts(load_embedder("torch"), texts, normalize=True)
+    candidate = encode_texts(load_embedder(backend), texts, normalize=True)
+    similarity = float((reference * candidate).sum(axis=1).min())
+    print(f"{backend}: min cosine vs torch = {similarity:.5f} (tolerance {tolerance})")
+    if similarity < 1 - tolerance:
+        raise AssertionError(f"{backend} embeddings drifted: min cosine {similarity:.5f} < {1 - tolerance}")
+    return similarity
+
+
+class BackgroundModel:
+    """Loads the sentence-transformer in a background thread so importers don't wait for torch.
+
+    `start()` kicks off the load, `ready` says whether it finished and `get()` blocks until the
+    model is available (loading it on the calling thread if `start()` was never called).
+    """
+
+    def __init__(self, name: str = MODEL_NAME, backend: str = EMBEDDING_BACKEND):
+        self.name = name
+        self.backend = backend
+        self.model = None
+        self.device = None
+        self.error = None
+        self.load_seconds = None
+        self._started = threading.Lock()
+        self._loaded = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self.model is not None
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            print(f"Loading {self.name} ({self.backend} backend)...")
+            model = load_embedder(self.backend, self.name)
+            self.device = str(model.device)
+            self.model = model
+            self.load_seconds = round(time.perf_counter() - started, 3)
+            print(f"Model loaded in {self.load_seconds}s.")
+        except Exception as e:
+            self.error = e
+            print(f"Model load failed. Error: {e}")
+        finally:
+            self._loaded.set()
+
+    def start(self):
+        if self._started.acquire(blocking=False):
+            threading.Thread(target=self._load, name="model-loader", daemon=True).start()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Blocks until the load finished (or `timeout` passed); returns whether the model is ready."""
+        if self._started.acquire(blocking=False):
+            self._load()
+        self._loaded.wait(timeout)
+        return self.ready
+
+    def get(self):
+        if not self.wait():
+            raise RuntimeError(f"Embedding model unavailable: {self.error}")
+        return self.model
+
+
+if __name__ == "__main__":
+    # python embeddings.py export [--no-quantize]   |   python embeddings.py check [--backend onnx] [--tolerance 0.02]
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["export", "check"])
+    parser.add_argument("--no-quantize", action="store_true")
+    parser.add_argument("--backend", default="onnx-int8")
+    parser.add_argument("--tolerance", type=float, default=0.02)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_onnx(quantize=not args.no_quantize)
+    else:
+        check_parity(args.backend, tolerance=args.tolerance)
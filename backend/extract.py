@@ -0,0 +1,206 @@
+import os
+import time
+import signal
+import threading
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, CancelledError, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import trafilatura
+from bs4 import BeautifulSoup
+
+# --- SETTINGS ---
+# Worker processes parsing HTML (trafilatura and BeautifulSoup hold the GIL while they work).
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+# Seconds one document may take before its worker gives up on it.
+EXTRACT_TIMEOUT = float(os.getenv("EXTRACT_TIMEOUT", "10"))
+# Bytes of HTML parsed per document; the rest of a larger page is dropped.
+MAX_HTML_BYTES = int(os.getenv("MAX_HTML_BYTES", str(2 * 1024 * 1024)))
+# Workers are replaced after this many documents, so parser memory growth can't accumulate.
+TASKS_PER_WORKER = 500
+# Documents queued per worker when streaming, bounding the HTML held in memory.
+QUEUED_PER_WORKER = 4
+# Extra seconds past the timeout before a silent pool is considered wedged and restarted.
+WEDGE_GRACE = 5
+
+
+class ExtractionTimeout(BaseException):
+    """Raised in a worker when a document exceeds EXTRACT_TIMEOUT.
+
+    A BaseException, so the broad `except Exception` fallbacks below can't swallow it.
+    """
+
+
+def clean_text(text: str) -> str:
+    """Removes the null character '\u0000' from a string."""
+    if not isinstance(text, str):
+        return ""
+    return text.replace('\u0000', '')
+
+
+def scrape_main_text(html) -> str:
+    """Basic BeautifulSoup scrape of the main article element."""
+    soup = BeautifulSoup(html, 'html.parser')
+    main_content = (soup.find('article') or soup.find('div', class_='post-content') or soup.find('main'))
+    if main_content:
+        for s in main_content(['script', 'style']):
+            s.decompose()
+        return clean_text(main_content.get_text(separator='\n', strip=True))
+    return ""
+
+
+def extract_text(html) -> str:
+    """Article text via trafilatura, falling back to the basic BeautifulSoup scrape."""
+    if not html:
+        return ""
+    try:
+        full = trafilatura.extract(html)
+        if full:
+            return clean_text(full)
+    except Exception:
+        pass
+    try:
+        return scrape_main_text(html)
+    except Exception:
+        return ""
+
+
+def _raise_timeout(signum, frame):
+    raise ExtractionTimeout()
+
+
+def _init_worker():
+    signal.signal(signal.SIGALRM, _raise_timeout)
+
+
+def _extract_in_worker(html, timeout: float, max_bytes: int):
+    """(text, status) for one document, status being ok, truncated or timeout."""
+    status = "ok"
+    data = html.encode("utf-8") if isinstance(html, str) else html
+    if len(data) > max_bytes:
+        # Cut by encoded size; a character split at the end is dropped
+        data, status = data[:max_bytes], "truncated"
+        html = data.decode("utf-8", errors="ignore") if isinstance(html, str) else data
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return extract_text(html), status
+    except ExtractionTimeout:
+        return "", "timeout"
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+class ExtractionPool:
+    """Extracts article text from raw HTML on a pool of worker processes.
+
+    Each document is cut to `max_bytes` and interrupted after `timeout` seconds inside its worker.
+    If documents are in flight but no worker has finished one for longer than that (a parse stuck
+    in C code), the workers are killed and replaced, and the documents they held come back empty.
+    The pool starts on first use and can be shared by many threads.
+    """
+
+    def __init__(self, workers: int = EXTRACT_WORKERS, timeout: float = EXTRACT_TIMEOUT,
+                 max_bytes: int = MAX_HTML_BYTES):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._last_done = time.monotonic()  # when a worker last finished a document (or the pool got busy)
+        self.stats = {"documents": 0, "truncated": 0, "timeouts": 0, "restarts": 0}
+
+    def _submit(self, html):
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that holds the embedding model and live threads is unsafe
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                                     initializer=_init_worker, max_tasks_per_child=TASKS_PER_WORKER)
+            if not self._in_flight:
+                self._last_done = time.monotonic()
+            self._in_flight += 1
+            future = self._executor.submit(_extract_in_worker, html, self.timeout, self.max_bytes)
+            future.executor = self._executor
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future):
+        with self._lock:
+            self._in_flight -= 1
+            self._last_done = time.monotonic()
+
+    def _restart(self, executor):
+        """Kills `executor`'s workers unless it was already replaced; its documents then fail."""
+        with self._lock:
+            if executor is not self._executor:
+                return
+            self._executor = None
+            self.stats["restarts"] += 1
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _wait(self, futures) -> set:
+        """Waits for at least one of `futures`, restarting the pool if it stops making progress."""
+        while True:
+            done, _ = wait(futures, timeout=WEDGE_GRACE, return_when=FIRST_COMPLETED)
+            if done:
+                return done
+            if self._in_flight and time.monotonic() - self._last_done > self.timeout + WEDGE_GRACE:
+                for executor in {future.executor for future in futures}:
+                    self._restart(executor)
+
+    def _result(self, future) -> str:
+        try:
+            text, status = future.result()
+        except (BrokenProcessPool, CancelledError):
+            self._restart(future.executor)
+            text, status = "", "timeout"
+        self.stats["documents"] += 1
+        if status != "ok":
+            self.stats["truncated" if status == "truncated" else "timeouts"] += 1
+        return text
+
+    def extract(self, html) -> str:
+        """Text of one document; blocks the calling thread only."""
+        if not html:
+            return ""
+        future = self._submit(html)
+        self._wait([future])
+        return self._result(future)
+
+    def extract_many(self, documents):
+        """Yields (key, text) for an iterable of (key, html) pairs, in completion order.
+
+        The iterable is consumed lazily with at most QUEUED_PER_WORKER documents per worker in
+        flight, so downloads can keep producing documents while earlier ones are parsed.
+        """
+        documents = iter(documents)
+        pending = {}
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < self.workers * QUEUED_PER_WORKER:
+                try:
+                    key, html = next(documents)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if not html:
+                    yield key, ""
+                    continue
+                pending[self._submit(html)] = key
+            if not pending:
+                return
+            for future in self._wait(list(pending)):
+                yield pending.pop(future), self._result(future)
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    def report(self) -> str:
+        s = self.stats
+        return (f"Extraction: {s['documents']} documents, {s['truncated']} truncated, {s['timeouts']} timed out, "
+                f"{s['restarts']} pool restarts.")
@@ -0,0 +1,110 @@
+import os
+import json
+import calendar
+
+# --- SETTINGS ---
+CACHE_DIR = os.getenv("ERBLOGX_CACHE_DIR", ".cache")
+FEED_CACHE_PATH = os.path.join(CACHE_DIR, "feed_cache.json")
+
+
+def entry_timestamp(entry):
+    """Publication (or update) time of a feed entry as a UTC epoch, if the feed provides one."""
+    parsed = entry.get("published_parsed") or entry.get("updated_parsed")
+    return calendar.timegm(parsed) if parsed else None
+
+
+class FeedCache:
+    """Per-feed HTTP validators and high-water marks, persisted between scraper runs.
+
+    For every feed it remembers the ETag / Last-Modified validators, the size of the last
+    download and the newest entry seen. New state is staged while a feed is processed and
+    only committed once its articles were saved, so a failed run never hides entries.
+    """
+
+    def __init__(self, path: str = FEED_CACHE_PATH):
+        self.path = path
+        self.feeds = {}
+        self._staged = {}
+        self.stats = {"feeds_skipped": 0, "bytes_saved": 0, "bytes_downloaded": 0, "entries_skipped": 0}
+
+    @classmethod
+    def load(cls, path: str = FEED_CACHE_PATH) -> "FeedCache":
+        cache = cls(path)
+        try:
+            with open(path) as f:
+                cache.feeds = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Could not read feed cache at {path}, starting fresh. Error: {e}")
+        return cache
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.feeds, f)
+        os.replace(tmp_path, self.path)
+
+    # --- conditional requests ---
+
+    def request_headers(self, feed_url: str) -> dict:
+        """If-None-Match / If-Modified-Since headers for an HTTP client."""
+        state = self.feeds.get(feed_url, {})
+        headers = {}
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("modified"):
+            headers["If-Modified-Since"] = state["modified"]
+        return headers
+
+    def not_modified(self, feed_url: str):
+        """Records a 304 for this feed."""
+        self.stats["feeds_skipped"] += 1
+        self.stats["bytes_saved"] += self.feeds.get(feed_url, {}).get("size") or 0
+
+    # --- high-water marks ---
+
+    def is_seen(self, feed_url: str, entry) -> bool:
+        """True for entries at or below the feed's high-water mark from earlier runs."""
+        state = self.feeds.get(feed_url)
+        if not state:
+            return False
+        if state.get("newest_id") and entry.get("id") == state["newest_id"]:
+            return True
+        timestamp = entry_timestamp(entry)
+        return bool(timestamp and state.get("newest") and timestamp < state["newest"])
+
+    def filter_unseen(self, feed_url: str, entries: list) -> list:
+        unseen = [entry for entry in entries if not self.is_seen(feed_url, entry)]
+        self.stats["entries_skipped"] += len(entries) - len(unseen)
+        return unseen
+
+    def stage(self, feed_url: str, feed, size=None):
+        """Remembers the validators and newest entry of a freshly downloaded feed."""
+        if size:
+            self.stats["bytes_downloaded"] += size
+        headers = feed.get("headers", {})
+        state = dict(self.feeds.get(feed_url, {}))
+        state["etag"] = feed.get("etag") or headers.get("etag")
+        state["modified"] = feed.get("modified") or headers.get("last-modified")
+        if size:
+            state["size"] = size
+
+        newest = None
+        for entry in feed.entries:
+            timestamp = entry_timestamp(entry)
+            if timestamp and (newest is None or timestamp > newest[0]):
+                newest = (timestamp, entry.get("id"))
+        if newest and newest[0] > (state.get("newest") or 0):
+            state["newest"], state["newest_id"] = newest
+        self._staged[feed_url] = state
+
+    def commit(self, feed_url: str):
+        if feed_url in self._staged:
+            self.feeds[feed_url] = self._staged.pop(feed_url)
+
+    def report(self) -> str:
+        s = self.stats
+        return (f"Feed cache: {s['feeds_skipped']} feeds unchanged, {s['entries_skipped']} old entries skipped, "
+                f"{s['bytes_saved'] / 1e6:.1f} MB saved, {s['bytes_downloaded'] / 1e6:.1f} MB downloaded.")
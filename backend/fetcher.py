@@ -0,0 +1,187 @@
+import os
+import asyncio
+import queue
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+import feedparser
+import httpx
+
+# --- SETTINGS ---
+# Total requests in flight across all hosts, and the cap for any single host.
+MAX_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "32"))
+PER_HOST_CONCURRENCY = int(os.getenv("FETCH_PER_HOST", "4"))
+# Number of feeds being worked on at the same time.
+FEED_WORKERS = int(os.getenv("FETCH_FEED_WORKERS", "16"))
+REQUEST_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "15"))
+USER_AGENT = "Mozilla/5.0 (compatible; erblogx-scraper/1.0; +https://erblogx.vercel.app)"
+
+
+@dataclass
+class FetchedFeed:
+    """A parsed feed plus the raw HTML of the entry pages that were requested for it."""
+    feed_url: str
+    feed: Optional[feedparser.FeedParserDict] = None
+    entries: list = field(default_factory=list)
+    pages: dict = field(default_factory=dict)  # entry link -> raw HTML bytes
+    not_modified: bool = False  # server answered 304 to a conditional request
+    size: int = 0  # bytes of feed XML downloaded
+    error: Optional[str] = None
+
+
+class HostLimiter:
+    """Hands out one semaphore per host so a single slow blog cannot hog the worker pool."""
+
+    def __init__(self, per_host: int):
+        self.per_host = per_host
+        self._semaphores = {}
+
+    def __call__(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc.lower()
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._semaphores[host] = asyncio.Semaphore(self.per_host)
+        return semaphore
+
+
+def create_client() -> httpx.AsyncClient:
+    """Shared, connection-pooled HTTP client for a whole crawl."""
+    return httpx.AsyncClient(
+        timeout=REQUEST_TIMEOUT,
+        follow_redirects=True,
+        headers={"User-Agent": USER_AGENT},
+        limits=httpx.Limits(max_connections=MAX_CONCURRENCY, max_keepalive_connections=MAX_CONCURRENCY),
+    )
+
+
+def feed_response_headers(response: httpx.Response) -> dict:
+    """The response headers feedparser uses (base URL, encoding, validators)."""
+    headers = {"content-location": str(response.url)}
+    for name in ("content-type", "etag", "last-modified"):
+        if name in response.headers:
+            headers[name] = response.headers[name]
+    return headers
+
+
+def download_feed(feed_url: str, headers: Optional[dict] = None) -> FetchedFeed:
+    """Downloads and parses one feed with a blocking request, for the sequential path; raises on errors."""
+    result = FetchedFeed(feed_url=feed_url)
+    response = httpx.get(feed_url, headers={"User-Agent": USER_AGENT, **(headers or {})},
+                         timeout=REQUEST_TIMEOUT, follow_redirects=True)
+    if response.status_code == 304:
+        result.not_modified = True
+        return result
+    response.raise_for_status()
+    result.size = len(response.content)
+    result.feed = feedparser.parse(response.content, response_headers=feed_response_headers(response))
+    return result
+
+
+class Crawler:
+    """Fetches feeds and their article pages concurrently over one pooled client."""
+
+    def __init__(self, client: httpx.AsyncClient, max_concurrency: int = MAX_CONCURRENCY,
+                 per_host: int = PER_HOST_CONCURRENCY):
+        self.client = client
+        self.pool = asyncio.Semaphore(max_concurrency)
+        self.hosts = HostLimiter(per_host)
+
+    async def get(self, url: str, headers: Optional[dict] = None) -> httpx.Response:
+        # Take the host slot first so requests queued behind a slow host don't hold global slots.
+        async with self.hosts(url), self.pool:
+            response = await self.client.get(url, headers=headers)
+        if response.status_code != 304:
+            response.raise_for_status()
+        return response
+
+    async def get_page(self, url: str) -> Optional[bytes]:
+        try:
+            return (await self.get(url)).content
+        except (httpx.HTTPError, ValueError):
+            return None
+
+    async def fetch_feed(self, feed_url: str, select_entries: Callable, needs_page: Callable,
+                         request_headers: Optional[Callable] = None) -> FetchedFeed:
+        result = FetchedFeed(feed_url=feed_url)
+        try:
+            response = await self.get(feed_url, headers=request_headers(feed_url) if request_headers else None)
+            if response.status_code == 304:
+                result.not_modified = True
+                return result
+            result.size = len(response.content)
+            result.feed = await asyncio.to_thread(feedparser.parse, response.content,
+                                                  response_headers=feed_response_headers(response))
+            # select_entries may hit the database, so keep it off the event loop.
+            result.entries = await asyncio.to_thread(select_entries, feed_url, result.feed)
+        except Exception as e:
+            result.error = str(e).splitlines()[0] if str(e) else type(e).__name__
+            return result
+
+        links = [entry.get("link") for entry in result.entries if needs_page(entry)]
+        pages = await asyncio.gather(*(self.get_page(link) for link in links))
+        result.pages = {link: page for link, page in zip(links, pages) if page}
+        return result
+
+
+async def crawl_feeds(feed_urls: list, select_entries: Callable, needs_page: Callable,
+                      deliver: Callable, workers: int = FEED_WORKERS, request_headers: Optional[Callable] = None):
+    """Runs a bounded pool of feed workers and hands every finished feed to `deliver`."""
+    pending = asyncio.Queue()
+    for feed_url in feed_urls:
+        pending.put_nowait(feed_url)
+
+    async with create_client() as client:
+        crawler = Crawler(client)
+
+        async def worker():
+            while True:
+                try:
+                    feed_url = pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                result = await crawler.fetch_feed(feed_url, select_entries, needs_page, request_headers)
+                await asyncio.to_thread(deliver, result)
+
+        await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+
+
+def iter_fetched_feeds(feed_urls: list, select_entries: Callable, needs_page: Callable,
+                       workers: int = FEED_WORKERS, request_headers: Optional[Callable] = None):
+    """Crawls feeds on a background event loop and yields each FetchedFeed as soon as it is ready.
+
+    `select_entries(feed_url, feed)` returns the entries worth keeping (e.g. not already stored),
+    `needs_page(entry)` says whether the entry's full article page should be downloaded and the
+    optional `request_headers(feed_url)` supplies conditional-GET headers for the feed request.
+    The caller can clean, embed and insert one feed while the others are still downloading.
+    """
+    results = queue.Queue(maxsize=max(1, workers) * 2)
+    done = object()
+
+    def run():
+        try:
+            asyncio.run(crawl_feeds(feed_urls, select_entries, needs_page, results.put, workers, request_headers))
+        except Exception as e:
+            print(f"Concurrent fetcher stopped early. Error: {e}")
+        finally:
+            results.put(done)
+
+    thread = threading.Thread(target=run, name="feed-fetcher", daemon=True)
+    thread.start()
+    while True:
+        item = results.get()
+        if item is done:
+            break
+        yield item
+    thread.join()
+
+
+def fetch_pages(urls: list) -> list:
+    """Downloads pages concurrently under the crawl's host limits; raw HTML or None per URL, in order."""
+    async def run():
+        async with create_client() as client:
+            crawler = Crawler(client)
+            return await asyncio.gather(*(crawler.get_page(url) for url in urls))
+
+    return asyncio.run(run()) if urls else []
@@ -1,93 +1,357 @@
 import os
-import requests
+import json
 import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from supabase import create_client, Client
-from dotenv import load_dotenv
+from typing import Callable, Optional
 
-# --- SETUP ---
-load_dotenv()
+import requests
+from requests.adapters import HTTPAdapter
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_ANON = os.getenv("SUPABASE_ANON")
+from fetcher import MAX_CONCURRENCY, USER_AGENT
+from url_index import url_key
 
-if not SUPABASE_URL or not SUPABASE_ANON:
-    raise Exception("Supabase credentials not found.")
+# --- SETTINGS ---
+HN_API_BASE = os.getenv("HN_API_BASE", "https://hacker-news.firebaseio.com/v0")
+CACHE_DIR = os.getenv("ERBLOGX_CACHE_DIR", ".cache")
+HN_CURSOR_PATH = os.path.join(CACHE_DIR, "hn_cursor.json")
+# Worker threads (and pooled connections) fetching items; story pages use the fetcher's limit.
+HN_CONCURRENCY = int(os.getenv("HN_CONCURRENCY", "64"))
+PAGE_WORKERS = MAX_CONCURRENCY
+# Item ids fetched, saved and checkpointed together.
+HN_WINDOW = int(os.getenv("HN_WINDOW", "2000"))
+# Newest ids scanned per run, sized for the twice-monthly workflow (HN adds ~30-40k ids a day).
+# Ids a run falls further behind by are kept as gaps and walked, newest first, by later runs.
+HN_MAX_NEW_ITEMS = int(os.getenv("HN_MAX_NEW_ITEMS", "750000"))
+# Ids below the oldest one scanned so far to walk per run (0 = only new items).
+HN_BACKFILL_ITEMS = int(os.getenv("HN_BACKFILL_ITEMS", "0"))
+# Set HN_FETCH_PAGES=0 to store stories with their title as content instead of the linked page.
+HN_FETCH_PAGES = os.getenv("HN_FETCH_PAGES", "1") == "1"
+HN_RETRIES = 2
+REQUEST_TIMEOUT = 10
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON)
 
+@dataclass
+class HnWindow:
+    """A contiguous range of item ids (or the listed `retry` ids) and the new stories found in it, in id order."""
+    first: int
+    last: int
+    backfill: bool = False
+    gap: bool = False
+    retry: list = None
+    articles: list = field(default_factory=list)
+    items: int = 0
+    failed: list = field(default_factory=list)   # ids that still failed after HN_RETRIES
 
-HN_API_BASE = "https://hacker-news.firebaseio.com/v0"
+    @property
+    def ids(self):
+        return self.retry if self.retry is not None else range(self.first, self.last + 1)
 
 
-def scrape_hacker_news():
-    print("Fetching max item ID from Hacker News...")
-    try:
-        max_item_id = requests.get(f"{HN_API_BASE}/maxitem.json").json()
-        print(f"Max item ID is {max_item_id}.")
-    except requests.RequestException as e:
-        print(f"Could not fetch max item ID. Error: {e}")
-        return
+class HnCursor:
+    """The range of HN item ids already scanned, persisted between runs.
 
-    articles_to_save = []
-    batch_size = 100
+    Every id in `low < id <= high` has been fetched and its stories saved, except the ids in
+    `failed`, which could not be fetched and are retried first by the next run, and the
+    `gaps`: [first, last] ranges skipped when a run was more than `max_new` ids behind. New runs
+    scan upwards from `high` to the current max item, then the gaps newest first and, when
+    asked, backfill downwards from `low`; each window moves the matching end once its articles
+    are written, so an interrupted run resumes where it stopped.
+    """
 
+    def __init__(self, path: str = HN_CURSOR_PATH):
+        self.path = path
+        self.high = 0
+        self.low = 0
+        self.failed = set()
+        self.gaps = []
 
-    # Loop backwards from the max ID
-    for item_id in range(max_item_id, 0, -1):
+    @classmethod
+    def load(cls, path: str = HN_CURSOR_PATH) -> "HnCursor":
+        cursor = cls(path)
         try:
-            # 1. Fetch item details FIRST
-            item_res = requests.get(f"{HN_API_BASE}/item/{item_id}.json")
-            item_res.raise_for_status()
-            item_data = item_res.json()
-            
-            # 2. Filter for valid stories that have a URL
-            if (item_data and 
-                item_data.get("type") == "story" and 
-                not item_data.get("deleted", False) and 
-                item_data.get("url")):
-                
-                external_url = item_data.get("url")
-
-                # 3. Perform the CORRECT duplicate check against the external URL
-                res = supabase.table('articles').select('id').eq('url', external_url).execute()
-                if res.data:
-                    print(f"  -> URL already exists, skipping item {item_id}: {external_url}")
-                    continue # This will now correctly skip to the next item
-
-                # 4. If it's a new article, prepare it for saving
-                published_ts = item_data.get("time")
-                published_dt = datetime.fromtimestamp(published_ts, tz=timezone.utc)
-
-                article = {
-                    "title": item_data.get("title"),
-                    "url": external_url,
-                    "published_date": published_dt.isoformat(),
-                    "company": "Hacker News",
-                    "content": item_data.get("title"),
-                    "summary": f"A story submitted by user {item_data.get('by')}."
-                }
-                
-                articles_to_save.append(article)
-                print(f"Found story: {item_id} - {article['title']}")
-
-            # Insert batch into Supabase when it reaches the desired size
-            if len(articles_to_save) >= batch_size:
-                print(f"\n--- Saving a batch of {len(articles_to_save)} articles... ---\n")
-                supabase.table('articles').insert(articles_to_save).execute()
-                articles_to_save = [] # Reset the batch
-
-            # Be respectful to the API
+            with open(path) as f:
+                state = json.load(f)
+            cursor.high, cursor.low = int(state["high"]), int(state["low"])
+            cursor.failed = {int(i) for i in state.get("failed", [])}
+            cursor.gaps = [[int(first), int(last)] for first, last in state.get("gaps", [])]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Could not read HN cursor at {path}, starting from the newest items. Error: {e}")
+        return cursor
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"high": self.high, "low": self.low, "failed": sorted(self.failed), "gaps": self.gaps}, f)
+        os.replace(tmp_path, self.path)
+
+    def plan(self, max_item: int, max_new: int = HN_MAX_NEW_ITEMS, backfill: int = HN_BACKFILL_ITEMS,
+             window: int = HN_WINDOW) -> list:
+        """Windows still to scan: failed ids first, new ids oldest first, then up to `max_new` gap
+        ids and the backfill ids, both newest first."""
+        retry = sorted(self.failed)
+        windows = [HnWindow(ids[0], ids[-1], retry=ids) for ids in
+                   (retry[start:start + window] for start in range(0, len(retry), window))]
+        if not self.high:
+            # First run: start the scanned range just below the newest ids
+            self.high = self.low = max(0, max_item - max_new)
+        elif max_item - self.high > max_new:
+            # Too far behind: scan the newest ids now and keep the skipped ones for later runs
+            floor = max_item - max_new
+            self.gaps.append([self.high + 1, floor])
+            print(f"!!!!!! HN cursor is {max_item - self.high} ids behind (HN_MAX_NEW_ITEMS={max_new}); "
+                  f"ids {self.high + 1}..{floor} are left for later runs !!!!!!")
+            self.high = floor
+        windows += [HnWindow(first, min(first + window - 1, max_item))
+                    for first in range(self.high + 1, max_item + 1, window)]
+        budget = max_new
+        for first, last in sorted(self.gaps, reverse=True):
+            while last >= first and budget > 0:
+                size = min(window, budget, last - first + 1)
+                windows.append(HnWindow(last - size + 1, last, gap=True))
+                last -= size
+                budget -= size
+        floor = max(0, self.low - backfill)
+        windows += [HnWindow(max(last - window + 1, floor + 1), last, backfill=True)
+                    for last in range(self.low, floor, -window)]
+        return windows
+
+    def advance(self, window: HnWindow):
+        """Marks the window scanned; its ids that failed are kept for the next run."""
+        if window.retry is not None:
+            self.failed.difference_update(window.retry)
+        elif window.gap:
+            # Gaps are walked newest first, so the window is the top of its gap
+            for gap in self.gaps:
+                if gap[0] <= window.first and window.last <= gap[1]:
+                    gap[1] = window.first - 1
+            self.gaps = [gap for gap in self.gaps if gap[0] <= gap[1]]
+        elif window.backfill:
+            self.low = min(self.low, window.first - 1)
+        else:
+            self.high = max(self.high, window.last)
+        self.failed.update(window.failed)
+
+
+def is_story(item) -> bool:
+    return bool(item and item.get("type") == "story" and not item.get("deleted") and not item.get("dead")
+                and item.get("url"))
+
+
+def story_article(item: dict, content: str) -> dict:
+    title = (item.get("title") or "").replace('\u0000', '')
+    return {
+        "title": title,
+        "url": item["url"],
+        "published_date": datetime.fromtimestamp(item.get("time") or 0, tz=timezone.utc).isoformat(),
+        "company": "Hacker News",
+        "content": content or title,
+    }
+
+
+def create_session(pool_size: int = HN_CONCURRENCY) -> requests.Session:
+    """One keep-alive connection pool shared by every worker thread."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+class HnScanner:
+    """Fetches item windows and story pages on two thread pools sharing one pooled session.
+
+    Pages get their own pool so they never wait behind the next window's item requests, and
+    are extracted by the thread that downloaded them.
+    """
+
+    def __init__(self, session: requests.Session, items: ThreadPoolExecutor, pages: ThreadPoolExecutor,
+                 select_urls: Callable, extract: Callable, fetch_pages: bool = HN_FETCH_PAGES):
+        self.session = session
+        self.items = items
+        self.pages = pages
+        self.select_urls = select_urls
+        self.extract = extract
+        self.fetch_pages = fetch_pages
+        self._selected = set()  # URL keys picked earlier in this run, not necessarily saved yet
+
+    def get_item(self, item_id: int):
+        """The item JSON, None for missing ids, or the exception after HN_RETRIES retries."""
+        for attempt in range(HN_RETRIES + 1):
+            try:
+                response = self.session.get(f"{HN_API_BASE}/item/{item_id}.json", timeout=REQUEST_TIMEOUT)
+                response.raise_for_status()
+                return response.json()
+            except (requests.RequestException, ValueError) as e:
+                if attempt == HN_RETRIES:
+                    return e
+                time.sleep(0.5 * 2 ** attempt)
+
+    def get_content(self, url: str) -> str:
+        try:
+            response = self.session.get(url, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+        except requests.RequestException:
+            return ""
+        return self.extract(response.content)
+
+    def submit_items(self, window: HnWindow) -> list:
+        return [self.items.submit(self.get_item, i) for i in window.ids]
+
+    def build(self, window: HnWindow, item_futures: list) -> HnWindow:
+        items = [future.result() for future in item_futures]
+        window.items = len(items)
+        window.failed = [i for i, item in zip(window.ids, items) if isinstance(item, Exception)]
+        stories = [item for item in items if not isinstance(item, Exception) and is_story(item)]
+
+        new_urls = set(self.select_urls([story["url"] for story in stories]))
+        fresh = []
+        for story in stories:
+            key = url_key(story["url"])
+            if story["url"] in new_urls and key not in self._selected:
+                self._selected.add(key)
+                fresh.append(story)
 
+        if self.fetch_pages:
+            contents = [future.result() for future in
+                        [self.pages.submit(self.get_content, story["url"]) for story in fresh]]
+        else:
+            contents = [""] * len(fresh)
+        window.articles = [story_article(story, content) for story, content in zip(fresh, contents)]
+        return window
 
+
+def scan_windows(windows: list, select_urls: Callable, extract: Callable, deliver: Callable,
+                 concurrency: int = HN_CONCURRENCY, fetch_pages: bool = HN_FETCH_PAGES):
+    """Scans windows in order, fetching the next window's items while this one's pages download."""
+    with create_session(concurrency + PAGE_WORKERS) as session, \
+            ThreadPoolExecutor(concurrency, thread_name_prefix="hn-items") as items, \
+            ThreadPoolExecutor(PAGE_WORKERS, thread_name_prefix="hn-pages") as pages:
+        scanner = HnScanner(session, items, pages, select_urls, extract, fetch_pages)
+        upcoming = scanner.submit_items(windows[0]) if windows else None
+        for i, window in enumerate(windows):
+            item_futures = upcoming
+            if i + 1 < len(windows):
+                upcoming = scanner.submit_items(windows[i + 1])
+            deliver(scanner.build(window, item_futures))
+
+
+def fetch_max_item() -> int:
+    response = requests.get(f"{HN_API_BASE}/maxitem.json", timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return int(response.json())
+
+
+class ScanStopped(Exception):
+    """Ends the scanner thread once the consumer of `iter_hn_windows` has stopped."""
+
+
+def iter_hn_windows(windows: list, select_urls: Callable, extract: Callable, concurrency: int = HN_CONCURRENCY,
+                    fetch_pages: bool = HN_FETCH_PAGES):
+    """Scans HN item windows on a background thread and yields each finished HnWindow in order.
+
+    `select_urls(urls)` returns the story URLs not stored yet and `extract(html)` the article
+    text of a downloaded page. The caller embeds and saves one window (then advances the cursor)
+    while the next ones are being fetched; at most two finished windows wait in between.
+    """
+    results = queue.Queue(maxsize=2)
+    done = object()
+    stopped = threading.Event()
+
+    def deliver(window: HnWindow):
+        if stopped.is_set():
+            raise ScanStopped()
+        results.put(window)
+
+    def run():
+        try:
+            scan_windows(windows, select_urls, extract, deliver, concurrency, fetch_pages)
+        except ScanStopped:
+            pass
         except Exception as e:
-            print(f"Could not process item {item_id}. Error: {e}")
-            continue
-    
-    # Save any remaining articles in the last batch
-    if articles_to_save:
-        print(f"\n--- Saving the final batch of {len(articles_to_save)} articles... ---\n")
-        supabase.table('articles').insert(articles_to_save).execute()
+            print(f"HN scanner stopped early. Error: {e}")
+        finally:
+            results.put(done)
+
+    thread = threading.Thread(target=run, name="hn-scanner", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = results.get()
+            if item is done:
+                break
+            yield item
+    finally:
+        # The caller may stop early (closing this generator): unblock the scanner and let it wind down
+        stopped.set()
+        while thread.is_alive():
+            try:
+                results.get(timeout=0.2)
+            except queue.Empty:
+                pass
+        thread.join()
+
+
+def ingest_hacker_news(save: Callable, select_urls: Callable, extract: Callable, cursor: Optional[HnCursor] = None,
+                       max_new: int = HN_MAX_NEW_ITEMS, backfill: int = HN_BACKFILL_ITEMS,
+                       fetch_pages: bool = HN_FETCH_PAGES) -> dict:
+    """Scans every HN item id not covered by the cursor and hands each window's articles to `save`.
+
+    The cursor is saved after every window, so a failed or interrupted run only repeats the
+    window it stopped in. Returns counters for the run.
+    """
+    cursor = cursor or HnCursor.load()
+    stats = {"items": 0, "failed": 0, "articles": 0, "seconds": 0.0}
+    try:
+        max_item = fetch_max_item()
+    except (requests.RequestException, ValueError) as e:
+        print(f"Could not fetch max item ID. Error: {e}")
+        return stats
+
+    windows = cursor.plan(max_item, max_new, backfill)
+    cursor.save()
+    print(f"Scanning {sum(len(w.ids) for w in windows)} HN items "
+          f"(max item {max_item}, scanned so far {cursor.low + 1}..{cursor.high}).")
+    start = time.perf_counter()
+    scanned = iter_hn_windows(windows, select_urls, extract, fetch_pages=fetch_pages)
+    try:
+        for window in scanned:
+            try:
+                if window.articles:
+                    save(window.articles)
+            except Exception as e:
+                # Stop here so the cursor never skips a window whose articles weren't written
+                print(f"  !!!!!! FAILED to save HN items {window.first}..{window.last}. Error: {e} !!!!!!")
+                break
+            cursor.advance(window)
+            cursor.save()
+            stats["items"] += window.items
+            stats["failed"] += len(window.failed)
+            stats["articles"] += len(window.articles)
+            print(f"  -> HN items {window.first}..{window.last}: {len(window.articles)} new stories.")
+    finally:
+        scanned.close()
+    stats["seconds"] = time.perf_counter() - start
+    skipped = sum(last - first + 1 for first, last in cursor.gaps)
+    print(f"HN: {stats['items']} items ({stats['failed']} failed, kept for the next run) and {stats['articles']} "
+          f"new stories in {stats['seconds']:.0f}s." + (f" {skipped} skipped ids still to scan." if skipped else ""))
+    return stats
+
 
 if __name__ == "__main__":
-    scrape_hacker_news()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Ingest Hacker News stories not scanned by earlier runs.")
+    parser.add_argument("--backfill", type=int, default=HN_BACKFILL_ITEMS,
+                        help="older item ids to walk below the oldest one scanned so far")
+    args = parser.parse_args()
+
+    import scraper
+    scraper.main(feeds=False, hn_backfill=args.backfill)
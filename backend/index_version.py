@@ -0,0 +1,91 @@
+import time
+import threading
+from datetime import datetime, timezone
+
+# Single-row-per-index table shared by the API and the ingestion scripts:
+#   create table index_meta (name text primary key, version bigint not null, updated_at timestamptz);
+INDEX_META_TABLE = "index_meta"
+ARTICLES_INDEX = "articles"
+# Bumped by writes that change articles already stored (embedding backfill, enrichment) rather than
+# add new ones. Indexes that page in new ids only are rebuilt when it moves.
+REWRITES_INDEX = "articles_rewrites"
+# Bumped by writes that change what summaries of stored articles are built from (digests, enriched
+# content), so cached summaries of the old prompt inputs are not served.
+SUMMARY_INPUTS_INDEX = "summary_inputs"
+
+
+def bump_index_version(supabase, name: str = ARTICLES_INDEX) -> int:
+    """Publishes a new version for `name` after a write, invalidating cached search results."""
+    version = time.time_ns() // 1000
+    try:
+        supabase.table(INDEX_META_TABLE).upsert({
+            "name": name,
+            "version": version,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }).execute()
+    except Exception as e:
+        print(f"Could not bump index version for '{name}'. Error: {e}")
+    return version
+
+
+def read_index_version(supabase, name: str):
+    """The published version of `name` (0 if it was never bumped), or None if it can't be read."""
+    try:
+        rows = supabase.table(INDEX_META_TABLE).select('version').eq('name', name).limit(1).execute().data
+    except Exception as e:
+        print(f"Could not read index version for '{name}'. Error: {e}")
+        return None
+    return int(rows[0]['version']) if rows else 0
+
+
+class IndexVersion:
+    """The current version of an index as seen by this process.
+
+    The shared version is re-read from Supabase at most every `refresh_seconds`; writes made
+    by this process bump a local generation so they are visible immediately. If the meta table
+    is unavailable the newest article id is used instead, which still tracks inserts.
+    """
+
+    def __init__(self, supabase, name: str = ARTICLES_INDEX, refresh_seconds: float = 30):
+        self.supabase = supabase
+        self.name = name
+        self.refresh_seconds = refresh_seconds
+        self.local = 0
+        self.remote = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _read_remote(self):
+        try:
+            rows = (
+                self.supabase.table(INDEX_META_TABLE)
+                .select('version')
+                .eq('name', self.name)
+                .limit(1)
+                .execute()
+            ).data
+            if rows:
+                return ("meta", rows[0]['version'])
+        except Exception:
+            pass
+        rows = self.supabase.table('articles').select('id').order('id', desc=True).limit(1).execute().data
+        return ("max_id", rows[0]['id'] if rows else 0)
+
+    def current(self) -> tuple:
+        now = time.monotonic()
+        if now - self._checked_at >= self.refresh_seconds:
+            with self._lock:
+                if now - self._checked_at >= self.refresh_seconds:
+                    try:
+                        self.remote = self._read_remote()
+                    except Exception as e:
+                        print(f"Could not read index version, keeping the previous one. Error: {e}")
+                    self._checked_at = now
+        return (self.remote, self.local)
+
+    def bump(self):
+        """Marks a write made by this process and publishes it to the other readers."""
+        with self._lock:
+            self.local += 1
+            self.remote = ("meta", bump_index_version(self.supabase, self.name))
+            self._checked_at = time.monotonic()
@@ -0,0 +1,306 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+# --- SETTINGS ---
+CACHE_DIR = os.getenv("ERBLOGX_CACHE_DIR", ".cache")
+INGEST_QUEUE_PATH = os.getenv("INGEST_QUEUE_PATH", os.path.join(CACHE_DIR, "ingest_queue.sqlite3"))
+# An item that failed this many times in one stage is parked as failed until `--retry-failed`.
+MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "5"))
+# Seconds before the first retry of a failed item; doubles with every further attempt.
+RETRY_BACKOFF = float(os.getenv("INGEST_RETRY_BACKOFF", "30"))
+# Stages wait for retries due within this many seconds; later ones are left for the next run.
+RETRY_WAIT = float(os.getenv("INGEST_RETRY_WAIT", "300"))
+# Threads per stage, e.g. "fetch=2,extract=1,embed=1,write=2".
+STAGE_WORKERS = dict(
+    (name, int(count)) for name, count in
+    (part.split("=") for part in os.getenv("INGEST_STAGE_WORKERS", "fetch=2,extract=1,embed=1,write=1").split(","))
+)
+POLL_SECONDS = 0.2
+
+# Handlers return this for items that should leave the queue without reaching the last stage.
+SKIP = object()
+
+SCHEMA = """
+create table if not exists items (
+    key text primary key,
+    kind text not null,
+    stage text not null,
+    status text not null default 'ready',
+    attempts integer not null default 0,
+    next_attempt real not null default 0,
+    payload text not null,
+    html blob,
+    error text,
+    updated_at real not null
+);
+create index if not exists items_ready on items (kind, stage, status, next_attempt);
+create table if not exists meta (name text primary key, value text not null);
+"""
+
+
+@dataclass
+class QueueItem:
+    key: str
+    kind: str
+    stage: str
+    payload: dict
+    html: Optional[bytes] = None
+    attempts: int = 0
+
+
+class IngestQueue:
+    """Durable work queue between the ingestion stages, stored in a local SQLite file.
+
+    Every item is one article (keyed by its URL hash or article id) waiting for `stage`, with a
+    status of ready, leased (being worked on) or failed. Items finished by a stage move to the
+    next one in the same transaction that stores its result, and leave the queue after the last.
+    Failures are retried with exponential backoff. Leases left over by a killed run are released
+    on open, so the next run resumes with exactly the unfinished items.
+    """
+
+    def __init__(self, path: str = INGEST_QUEUE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("pragma journal_mode=wal")
+        self.db.execute("pragma synchronous=normal")
+        self.db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path: str = INGEST_QUEUE_PATH) -> "IngestQueue":
+        queue = cls(path)
+        released = queue.release_leases()
+        if released:
+            print(f"Ingest queue: resuming {released} items left in progress by the previous run.")
+        return queue
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+    def _execute(self, sql: str, params=()):
+        with self._lock, self.db:
+            return self.db.execute(sql, params).fetchall()
+
+    # --- producers ---
+
+    def put_many(self, kind: str, items: list) -> int:
+        """Adds (key, stage, payload) tuples; keys already queued are left alone. Returns the count added."""
+        now = time.time()
+        rows = [(key, kind, stage, json.dumps(payload), now) for key, stage, payload in items]
+        with self._lock, self.db:
+            before = self.db.total_changes
+            self.db.executemany(
+                "insert or ignore into items (key, kind, stage, payload, updated_at) values (?, ?, ?, ?, ?)", rows)
+            return self.db.total_changes - before
+
+    # --- workers ---
+
+    def lease(self, kind: str, stage: str, limit: int) -> list:
+        """Claims up to `limit` ready items of a stage, oldest first."""
+        with self._lock, self.db:
+            rows = self.db.execute(
+                "select key, payload, html, attempts from items where kind = ? and stage = ? and status = 'ready' "
+                "and next_attempt <= ? order by rowid limit ?", (kind, stage, time.time(), limit)).fetchall()
+            self.db.executemany("update items set status = 'leased' where key = ?", [(row[0],) for row in rows])
+        return [QueueItem(key, kind, stage, json.loads(payload), html, attempts)
+                for key, payload, html, attempts in rows]
+
+    def advance(self, items: list, next_stage: Optional[str]):
+        """Stores the items' payload and HTML and hands them to `next_stage` (None: finished, removed)."""
+        now = time.time()
+        with self._lock, self.db:
+            if next_stage is None:
+                self.db.executemany("delete from items where key = ?", [(item.key,) for item in items])
+                return
+            self.db.executemany(
+                "update items set stage = ?, status = 'ready', attempts = 0, next_attempt = 0, payload = ?, "
+                "html = ?, error = null, updated_at = ? where key = ?",
+                [(next_stage, json.dumps(item.payload), item.html, now, item.key) for item in items])
+
+    def retry(self, item: QueueItem, error: str) -> bool:
+        """Schedules another attempt with backoff; returns False once the item is parked as failed."""
+        attempts = item.attempts + 1
+        failed = attempts >= MAX_ATTEMPTS
+        self._execute(
+            "update items set status = ?, attempts = ?, next_attempt = ?, error = ?, updated_at = ? where key = ?",
+            ("failed" if failed else "ready", attempts, time.time() + RETRY_BACKOFF * 2 ** (attempts - 1),
+             error[:1000], time.time(), item.key))
+        return not failed
+
+    def release_leases(self) -> int:
+        with self._lock, self.db:
+            return self.db.execute("update items set status = 'ready' where status = 'leased'").rowcount
+
+    def retry_failed(self, kind: Optional[str] = None) -> int:
+        with self._lock, self.db:
+            return self.db.execute(
+                "update items set status = 'ready', attempts = 0, next_attempt = 0 where status = 'failed' "
+                "and (? is null or kind = ?)", (kind, kind)).rowcount
+
+    def seconds_until_due(self, kind: str, stage: str) -> Optional[float]:
+        """Wait until the next item of a stage becomes ready, or None when none is ready or in backoff."""
+        (due,), = self._execute(
+            "select min(next_attempt) from items where kind = ? and stage = ? and status = 'ready'", (kind, stage))
+        return None if due is None else max(0.0, due - time.time())
+
+    def backlog(self, kind: Optional[str] = None) -> dict:
+        """{(kind, stage): {"ready": n, "waiting": n, "leased": n, "failed": n}} for items still queued."""
+        rows = self._execute(
+            "select kind, stage, case when status = 'ready' and next_attempt > ? then 'waiting' else status end, "
+            "count(*) from items where (? is null or kind = ?) group by 1, 2, 3", (time.time(), kind, kind))
+        backlog = {}
+        for item_kind, stage, status, count in rows:
+            backlog.setdefault((item_kind, stage), {"ready": 0, "waiting": 0, "leased": 0, "failed": 0})[status] = count
+        return backlog
+
+    # --- discovery state ---
+
+    def get_meta(self, name: str, default=None):
+        rows = self._execute("select value from meta where name = ?", (name,))
+        return json.loads(rows[0][0]) if rows else default
+
+    def set_meta(self, name: str, value):
+        self._execute("insert or replace into meta (name, value) values (?, ?)", (name, json.dumps(value)))
+
+
+@dataclass
+class Stage:
+    """One step of a pipeline: `handler(items)` returns one outcome per item, in order.
+
+    An outcome of None passes the item on, SKIP drops it and anything else (an exception or a
+    message) schedules a retry. Raising fails the whole batch.
+    """
+    name: str
+    handler: Callable
+    batch_size: int = 32
+    workers: int = 0  # 0: from INGEST_STAGE_WORKERS, else 1
+
+
+class StagePipeline:
+    """Runs the stages of one item kind concurrently, each on its own threads pulling from the queue.
+
+    Discovery adds items while the stages run; call `finish_discovery()` when it is done and
+    `join()` to wait for the queue to drain. A stage stops once discovery and every earlier stage
+    have stopped and it has nothing ready, or only retries due later than RETRY_WAIT.
+    """
+
+    def __init__(self, queue: IngestQueue, kind: str, stages: list):
+        self.queue = queue
+        self.kind = kind
+        self.stages = stages
+        self.stats = {stage.name: {"items": 0, "retried": 0, "failed": 0, "skipped": 0, "busy": 0.0}
+                      for stage in stages}
+        self._discovered = threading.Event()
+        self._stopped = [threading.Event() for _ in stages]
+        self._running = [0] * len(stages)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._started_at = None
+
+    def start(self):
+        self._started_at = time.perf_counter()
+        for index, stage in enumerate(self.stages):
+            workers = stage.workers or STAGE_WORKERS.get(stage.name, 1)
+            self._running[index] = workers
+            for n in range(workers):
+                thread = threading.Thread(target=self._work, args=(index,), name=f"{self.kind}-{stage.name}-{n}",
+                                          daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+    def finish_discovery(self):
+        self._discovered.set()
+
+    def join(self):
+        self.finish_discovery()
+        for thread in self._threads:
+            thread.join()
+
+    def _upstream_done(self, index: int) -> bool:
+        return self._discovered.is_set() and all(event.is_set() for event in self._stopped[:index])
+
+    def _work(self, index: int):
+        stage = self.stages[index]
+        next_stage = self.stages[index + 1].name if index + 1 < len(self.stages) else None
+        stats = self.stats[stage.name]
+        try:
+            while True:
+                items = self.queue.lease(self.kind, stage.name, stage.batch_size)
+                if not items:
+                    if not self._upstream_done(index):
+                        time.sleep(POLL_SECONDS)
+                        continue
+                    due = self.queue.seconds_until_due(self.kind, stage.name)
+                    if due is None or due > RETRY_WAIT:
+                        return
+                    time.sleep(max(due, POLL_SECONDS))
+                    continue
+
+                start = time.perf_counter()
+                try:
+                    outcomes = stage.handler(items)
+                except Exception as e:
+                    outcomes = [e] * len(items)
+                passed = [item for item, outcome in zip(items, outcomes) if outcome is None]
+                skipped = [item for item, outcome in zip(items, outcomes) if outcome is SKIP]
+                self.queue.advance(passed, next_stage)
+                self.queue.advance(skipped, None)
+                retried = failed = 0
+                for item, outcome in zip(items, outcomes):
+                    if outcome is not None and outcome is not SKIP:
+                        if self.queue.retry(item, str(outcome) or type(outcome).__name__):
+                            retried += 1
+                        else:
+                            failed += 1
+                with self._lock:
+                    stats["items"] += len(passed)
+                    stats["skipped"] += len(skipped)
+                    stats["retried"] += retried
+                    stats["failed"] += failed
+                    stats["busy"] += time.perf_counter() - start
+        finally:
+            with self._lock:
+                self._running[index] -= 1
+                if not self._running[index]:
+                    self._stopped[index].set()
+
+    def report(self) -> str:
+        elapsed = time.perf_counter() - (self._started_at or time.perf_counter())
+        backlog = self.queue.backlog(self.kind)
+        lines = [f"Ingestion stages for '{self.kind}' ({elapsed:.0f}s):",
+                 f"  {'stage':<8} {'done':>6} {'skipped':>7} {'retried':>7} {'failed':>6} {'busy s':>7} "
+                 f"{'items/s':>7} {'backlog':>7} {'waiting':>7}"]
+        for stage in self.stages:
+            s = self.stats[stage.name]
+            queued = backlog.get((self.kind, stage.name), {})
+            rate = s["items"] / s["busy"] if s["busy"] else 0.0
+            lines.append(f"  {stage.name:<8} {s['items']:>6} {s['skipped']:>7} {s['retried']:>7} {s['failed']:>6} "
+                         f"{s['busy']:>7.1f} {rate:>7.1f} {queued.get('ready', 0) + queued.get('leased', 0):>7} "
+                         f"{queued.get('waiting', 0):>7}")
+        failed = sum(counts["failed"] for counts in backlog.values())
+        if failed:
+            lines.append(f"  {failed} items parked as failed; rerun them with `python ingest_queue.py --retry-failed`.")
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show or reset the local ingestion queue.")
+    parser.add_argument("--retry-failed", action="store_true", help="make failed items ready again")
+    parser.add_argument("--kind", help="only items of this kind (article, enrich)")
+    args = parser.parse_args()
+
+    queue = IngestQueue(INGEST_QUEUE_PATH)
+    if args.retry_failed:
+        print(f"{queue.retry_failed(args.kind)} failed items are ready again.")
+    for (kind, stage), counts in sorted(queue.backlog(args.kind).items()):
+        print(f"{kind:<8} {stage:<8} " + " ".join(f"{status}={count}" for status, count in counts.items()))
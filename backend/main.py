@@ -1,15 +1,35 @@
+import time
+IMPORT_STARTED = time.perf_counter()
+
 from fastapi import FastAPI, HTTPException
 import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from supabase import create_client, Client
 from fastapi.middleware.cors import CORSMiddleware
-from sentence_transformers import SentenceTransformer 
+from fastapi.responses import StreamingResponse
 import numpy as np
 from pydantic import BaseModel
 from typing import List, Union, Optional
-import openai
-import torch
 from datetime import datetime
+from cache import LRUCache, normalize_query
+from index_version import SUMMARY_INPUTS_INDEX, IndexVersion, read_index_version
+from vector_index import ARTICLE_COLUMNS
+from ann_index import IvfIndex, ANN_INDEX_DIR, DEFAULT_NPROBE
+from bm25 import BM25_INDEX_PATH, Bm25Index, reciprocal_rank_fusion
+from chunks import ARTICLE_CHUNKS, ChunkIndex, embed_chunks, insert_chunks
+from duplicates import LINK_DUPLICATES
+from quantize import format_embedding, load_vector_index, LOCAL_INDEX_DTYPE
+from embeddings import BackgroundModel
+from themes import THEMES_INDEX, THEMES_PATH, ThemeEngine
+from vector_index import parse_embedding
+from batcher import Histogram, MicroBatcher
+from summaries import (ZNAPAI_BASE_URL, SUMMARY_CACHE_DIR, SUMMARY_CACHE_TIER, SummaryCache, build_prompts,
+                       extract_themes, sse_event, stream_completion, summary_key, summary_request)
+from search_log import SearchLogBuffer
+import threading
 
 load_dotenv()
 
@@ -22,21 +42,173 @@ if not ZNAPAI_API_KEY:
 
 supabase:Client=create_client(SUPABASE_URL,SUPABASE_ANON)
 
-# Set device for PyTorch
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"Using device: {device}")
+# The Sentence Transformer model (and torch) load in the background, so `/`, `/health`
+# and `/search` are served straight away; semantic endpoints wait for it on first use
+model_loader = BackgroundModel()
+model_loader.start()
+MODEL_WAIT_SECONDS = float(os.getenv("MODEL_WAIT_SECONDS", "60"))
+
+# Blocking work never runs on the event loop: model.encode goes to a small dedicated pool
+# (torch already parallelizes each call), Supabase calls to a wider I/O pool
+encode_executor = ThreadPoolExecutor(max_workers=int(os.getenv("ENCODE_WORKERS", "1")), thread_name_prefix="encode")
+db_executor = ThreadPoolExecutor(max_workers=int(os.getenv("DB_WORKERS", "16")), thread_name_prefix="db")
+
+async def run_in(executor, fn, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+# Query embeddings are cached by normalized query; QUERY_CACHE_TTL=0 keeps entries until evicted
+query_embedding_cache = LRUCache(
+    maxsize=int(os.getenv("QUERY_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("QUERY_CACHE_TTL", "0")) or None,
+)
+
+# Search results are cached per index version, so anything written by the scraper,
+# vector.py or POST /articles makes older entries unreachable
+search_result_cache = LRUCache(maxsize=int(os.getenv("RESULT_CACHE_SIZE", "1024")))
+# Searches are logged to the library table in bulk by a background writer, never in the request path
+search_log = SearchLogBuffer(
+    supabase,
+    batch_size=int(os.getenv("SEARCH_LOG_BATCH", "100")),
+    flush_interval=float(os.getenv("SEARCH_LOG_FLUSH_SECONDS", "2")),
+    max_pending=int(os.getenv("SEARCH_LOG_MAX_PENDING", "10000")),
+)
+search_log.start()
+index_version = IndexVersion(supabase, refresh_seconds=float(os.getenv("INDEX_VERSION_REFRESH", "30")))
+# Digest backfills and enrichment change the prompt inputs of stored articles; summaries are keyed by it
+summary_inputs_version = IndexVersion(supabase, SUMMARY_INPUTS_INDEX,
+                                      refresh_seconds=float(os.getenv("INDEX_VERSION_REFRESH", "30")))
+
+MATCH_THRESHOLD = 0.2  # Lower threshold to catch more relevant results
+MATCH_COUNT = 10       # Get more matches
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", "100"))  # rows /search returns, with BM25 or ilike
+
+# "pgvector" runs the match_articles RPC; "local" searches an in-memory copy of all embeddings;
+# "ann" searches the memory-mapped IVF index built by `python ann_index.py`; "chunks" searches
+# passage embeddings (article_chunks) and pools them back to articles
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "pgvector")
+local_index = None          # VectorIndex or IvfIndex, (re)loaded in the background
+local_index_version = None  # index version the local index was loaded at
+local_index_loading = threading.Lock()
+
+def load_local_index():
+    global local_index, local_index_version
+    version = index_version.current()
+    try:
+        if SEARCH_BACKEND == "ann":
+            # The IVF index is built offline; new articles are paged in and rewritten ones reloaded
+            current = local_index or IvfIndex.load(ANN_INDEX_DIR)
+            index = current.refresh(supabase)
+            if index is not current:
+                # Replaced (delta folded in or rows rewritten): persist it and map it from disk again
+                index.save(ANN_INDEX_DIR)
+                index = IvfIndex.load(ANN_INDEX_DIR)
+            local_index = index
+        elif SEARCH_BACKEND == "chunks":
+            # New articles' chunks are paged in; chunks replaced by enrichment reload the index
+            local_index = ChunkIndex.load(supabase) if local_index is None else local_index.refresh(supabase)
+        else:
+            local_index = load_vector_index(supabase)
+    except Exception as e:
+        print(f"Local vector index load failed, falling back to pgvector until the next index version. Error: {e}")
+    finally:
+        local_index_version = version
+        local_index_loading.release()
 
-# Load the Sentence Transformer model
-print("Loading sentence-transformer model...")
-model = SentenceTransformer('all-mpnet-base-v2', device=device)
-print("Model loaded.")
+def refresh_local_index():
+    """
+    Reloads the local index in the background whenever the index version moves
+    """
+    if SEARCH_BACKEND not in ("local", "ann", "chunks") or local_index_version == index_version.current():
+        return
+    if local_index_loading.acquire(blocking=False):
+        threading.Thread(target=load_local_index, name="local-index-loader", daemon=True).start()
+
+refresh_local_index()
+
+# LEXICAL_SEARCH=1 keeps a BM25 index over titles and content: /search ranks with it instead of
+# a title ilike, and /ai-search?mode=hybrid fuses it with vector search (reciprocal rank fusion)
+LEXICAL_SEARCH = os.getenv("LEXICAL_SEARCH", "0") == "1"
+AI_SEARCH_MODE = os.getenv("AI_SEARCH_MODE", "semantic")
+HYBRID_DEPTH = int(os.getenv("HYBRID_DEPTH", "50"))  # candidates taken from each ranking before fusion
+lexical_index = None          # Bm25Index, loaded and synced in the background
+lexical_index_version = None
+lexical_index_loading = threading.Lock()
+
+def load_lexical_index():
+    global lexical_index, lexical_index_version
+    version = index_version.current()
+    try:
+        current = lexical_index
+        if current is None:
+            current = Bm25Index.load(BM25_INDEX_PATH) if os.path.exists(BM25_INDEX_PATH) else Bm25Index()
+        indexed = len(current)
+        index = current.refresh(supabase)
+        if index is not current or len(index) != indexed:
+            index.save(BM25_INDEX_PATH)
+        lexical_index = index
+    except Exception as e:
+        print(f"BM25 index load failed, using the previous search path until the next index version. Error: {e}")
+    finally:
+        lexical_index_version = version
+        lexical_index_loading.release()
 
-# Initialize OpenAI client for ZnapAI for summarization
-openai_client = openai.OpenAI(
-    api_key=ZNAPAI_API_KEY,
-    base_url="https://api.znapai.com/"
+def refresh_lexical_index():
+    """
+    Pages new articles into the BM25 index (or rebuilds it after rewrites) in the background when the
+    index version moves
+    """
+    if not LEXICAL_SEARCH or lexical_index_version == index_version.current():
+        return
+    if lexical_index_loading.acquire(blocking=False):
+        threading.Thread(target=load_lexical_index, name="lexical-index-loader", daemon=True).start()
+
+refresh_lexical_index()
+
+# OpenAI clients for ZnapAI summarization, created on first use
+openai_client = None
+async_openai_client = None
+
+def get_openai_client():
+    global openai_client
+    if openai_client is None:
+        import openai
+        openai_client = openai.OpenAI(
+            api_key=ZNAPAI_API_KEY,
+            base_url=ZNAPAI_BASE_URL
+        )
+    return openai_client
+
+def get_async_openai_client():
+    global async_openai_client
+    if async_openai_client is None:
+        import openai
+        async_openai_client = openai.AsyncOpenAI(
+            api_key=ZNAPAI_API_KEY,
+            base_url=ZNAPAI_BASE_URL
+        )
+    return async_openai_client
+
+# Summaries are cached by content address (query, article ids, prompt version, model), so re-issued
+# result sets skip both the article fetch and the completion
+summary_cache = SummaryCache(
+    maxsize=int(os.getenv("SUMMARY_CACHE_SIZE", "512")),
+    tier=SUMMARY_CACHE_TIER,
+    path=SUMMARY_CACHE_DIR,
+    supabase=supabase,
 )
 
+# Time to first token and total time of streamed summaries, in milliseconds
+summary_ttft_ms = Histogram([100, 250, 500, 1000, 2000, 5000])
+summary_total_ms = Histogram([500, 1000, 2000, 5000, 10000, 20000])
+
+async def wait_for_model() -> bool:
+    """
+    Waits (off the event loop) for the background model load; False if it isn't ready in time
+    """
+    if model_loader.ready:
+        return True
+    return await asyncio.to_thread(model_loader.wait, MODEL_WAIT_SECONDS)
+
 app = FastAPI()
 
 origins = [
@@ -89,43 +261,167 @@ class SearchRequest(BaseModel):
 def read_root():
     return "erblogx api :)"
 
+@app.on_event("shutdown")
+def flush_search_log():
+    search_log.close()
+
 @app.get("/health")
 def health_check():
+    """
+    Liveness (the process serves requests) and readiness (the model is loaded) reported separately
+    """
     return {
         "status": "healthy",
-        "model_loaded": model is not None,
-        "device": device,
+        "live": True,
+        "ready": model_loader.ready,
+        "model_loaded": model_loader.ready,
+        "model_error": str(model_loader.error) if model_loader.error else None,
+        "device": model_loader.device,
+        "import_seconds": IMPORT_SECONDS,
+        "model_load_seconds": model_loader.load_seconds,
+        "uptime_seconds": round(time.perf_counter() - IMPORT_STARTED, 1),
+        "query_embedding_cache": query_embedding_cache.stats(),
+        "search_result_cache": search_result_cache.stats(),
+        "query_batcher": query_batcher.stats(),
+        "search_log": search_log.stats(),
+        "summary_cache": summary_cache.stats(),
+        "summary_stream": {"ttft_ms": summary_ttft_ms.stats(), "total_ms": summary_total_ms.stats()},
+        "search_backend": SEARCH_BACKEND,
+        "local_index_size": len(local_index) if local_index is not None else None,
+        "local_index_dtype": LOCAL_INDEX_DTYPE,
+        "lexical_index_size": len(lexical_index) if lexical_index is not None else None,
+        "lexical_index_bytes": lexical_index.nbytes if lexical_index is not None else None,
         "timestamp": datetime.utcnow().isoformat()
     }
 
+@app.get("/ready")
+def readiness_check():
+    if not model_loader.ready:
+        raise HTTPException(status_code=503, detail="Model is still loading")
+    return {"ready": True}
+
 @app.get("/test")
 def test_function():
     return "this is test function"
 
-async def log_search_query(query: str, user_id: str, results_count: int, search_type: str):
+def encode_queries(texts: list) -> np.ndarray:
+    embeddings = np.asarray(
+        model_loader.get().encode(texts, batch_size=len(texts), show_progress_bar=False), dtype=np.float32
+    )
+    embeddings.setflags(write=False)  # rows are shared between requests
+    return embeddings
+
+# Concurrent /ai-search queries arriving within QUERY_BATCH_WINDOW_MS (or until QUERY_BATCH_MAX
+# are waiting) are encoded in one forward pass instead of one batch-size-1 call each
+query_batcher = MicroBatcher(
+    encode_queries,
+    executor=encode_executor,
+    window_ms=float(os.getenv("QUERY_BATCH_WINDOW_MS", "5")),
+    max_batch=int(os.getenv("QUERY_BATCH_MAX", "32")),
+)
+
+async def embed_query(q: str) -> np.ndarray:
     """
-    Log search query to the library table
+    Returns the float32 embedding of a search query, skipping the model on a cache hit
     """
-    try:
-        # Prepare query data for insertion
-        query_data = {
-            "query": query,
-            "user_id": user_id,
-            "results_count": results_count,
-            "search_type": search_type,
-            "created_at": datetime.utcnow().isoformat()
-        }
+    key = normalize_query(q)
+    embedding = query_embedding_cache.get(key)
+    if embedding is None:
+        embedding = await query_batcher.submit(key)
+        query_embedding_cache.set(key, embedding)
+    return embedding
+
+def add_to_local_index(rows: list, embedding, version_before_write):
+    """
+    Appends a freshly inserted article so the local index doesn't need a full reload
+    """
+    global local_index_version
+    if local_index is None or not rows or SEARCH_BACKEND == "chunks":
+        return
+    local_index.add(rows[0], embedding)
+    if local_index_version == version_before_write:
+        # The index was current before this write, so it still is
+        local_index_version = index_version.current()
+
+def ann_match_articles(query_embedding: np.ndarray, match_count: int = MATCH_COUNT) -> list:
+    """
+    Top matches from an id-only index (IVF or chunks), hydrated with one primary-key lookup
+    """
+    if SEARCH_BACKEND == "chunks":
+        ids, scores = local_index.search(query_embedding, match_count)
+    else:
+        ids, scores = local_index.search(query_embedding, match_count, DEFAULT_NPROBE)
+    hits = [(int(i), float(score)) for i, score in zip(ids, scores) if score > MATCH_THRESHOLD]
+    if not hits:
+        return []
+    rows_by_id = hydrate_articles([i for i, _ in hits])
+    return [dict(rows_by_id[i], similarity=score) for i, score in hits if i in rows_by_id]
+
+def match_articles(query_embedding: np.ndarray, match_count: int = MATCH_COUNT) -> list:
+    """
+    Top matches for a query embedding from the configured search backend
+    """
+    refresh_local_index()
+    if SEARCH_BACKEND in ("ann", "chunks") and local_index is not None:
+        return ann_match_articles(query_embedding, match_count)
+    if SEARCH_BACKEND == "local" and local_index is not None:
+        return local_index.search(query_embedding, MATCH_THRESHOLD, match_count)
+
+    data, count = supabase.rpc('match_articles', {
+        'query_embedding': query_embedding.tolist(),
+        'match_threshold': MATCH_THRESHOLD,
+        'match_count': match_count
+    }).execute()
+    return data[1]
+
+def canonical_articles(query):
+    """
+    Leaves out copies linked to a canonical article (NEAR_DUPLICATES=link)
+    """
+    return query.is_('duplicate_of', 'null') if LINK_DUPLICATES else query
 
-        # Insert into Supabase library table
-        response = supabase.table('library').insert(query_data).execute()
-        
-        # Print detailed response for debugging
-        print(f"Search query logging response: {response}")
-        
-        return True
-    except Exception as e:
-        print(f"Error logging search query: {str(e)}")
-        return False
+def hydrate_articles(ids: list) -> dict:
+    if not ids:
+        return {}
+    rows = canonical_articles(supabase.table('articles').select(ARTICLE_COLUMNS).in_('id', ids)).execute().data
+    return {row['id']: row for row in rows}
+
+def lexical_match_articles(q: str, match_count: int = SEARCH_LIMIT) -> list:
+    """
+    BM25 top matches over titles and content
+    """
+    ids, scores = lexical_index.search(q, match_count)
+    rows_by_id = hydrate_articles(ids.tolist())
+    return [dict(rows_by_id[i], bm25=float(score)) for i, score in zip(ids.tolist(), scores) if i in rows_by_id]
+
+def hybrid_match_articles(q: str, query_embedding: np.ndarray) -> list:
+    """
+    Vector and BM25 rankings fused with reciprocal rank fusion; exact terms (tool names,
+    identifiers) surface even when their embeddings rank them low
+    """
+    semantic = match_articles(query_embedding, HYBRID_DEPTH)
+    lexical_ids, lexical_scores = lexical_index.search(q, HYBRID_DEPTH)
+    bm25_by_id = dict(zip(lexical_ids.tolist(), lexical_scores.tolist()))
+    fused = reciprocal_rank_fusion([row['id'] for row in semantic], lexical_ids.tolist())[:MATCH_COUNT]
+
+    rows_by_id = {row['id']: row for row in semantic}
+    rows_by_id.update(hydrate_articles([i for i, _ in fused if i not in rows_by_id]))
+    return [
+        dict(rows_by_id[i], similarity=rows_by_id[i].get('similarity'), bm25=bm25_by_id.get(i), rrf_score=score)
+        for i, score in fused if i in rows_by_id
+    ]
+
+def log_search_query(query: str, user_id: str, results_count: int, search_type: str) -> bool:
+    """
+    Queue a search for the library table; returns False if the log buffer is full and it was dropped
+    """
+    return search_log.log({
+        "query": query,
+        "user_id": user_id,
+        "results_count": results_count,
+        "search_type": search_type,
+        "created_at": datetime.utcnow().isoformat()
+    })
 
 @app.get("/search")
 async def search_query(q: str, user_id: Optional[str] = None):
@@ -133,12 +429,28 @@ async def search_query(q: str, user_id: Optional[str] = None):
     Search articles and optionally log the query
     """
     try:
-        data, count = supabase.table('articles').select('*').ilike('title', f'%{q}%').execute()
-        search_query = data[1]
+        version = await run_in(db_executor, index_version.current)
+        refresh_lexical_index()
+        if lexical_index is not None:
+            # BM25 over titles and content, ranked
+            cache_key = ("bm25", normalize_query(q), None, SEARCH_LIMIT, version)
+            search_query = search_result_cache.get(cache_key)
+            if search_query is None:
+                search_query = await run_in(db_executor, lexical_match_articles, q)
+                search_result_cache.set(cache_key, search_query)
+        else:
+            # ilike is case-insensitive, so only case is folded into the cache key
+            cache_key = ("search", q.lower(), None, SEARCH_LIMIT, version)
+            search_query = search_result_cache.get(cache_key)
+            if search_query is None:
+                query = canonical_articles(supabase.table('articles').select('*').ilike('title', f'%{q}%'))
+                data, count = await run_in(db_executor, query.limit(SEARCH_LIMIT).execute)
+                search_query = data[1]
+                search_result_cache.set(cache_key, search_query)
 
         # Log the search query only if user_id is provided
         if user_id:
-            await log_search_query(
+            log_search_query(
                 query=q, 
                 user_id=user_id, 
                 results_count=len(search_query), 
@@ -151,29 +463,37 @@ async def search_query(q: str, user_id: Optional[str] = None):
         return {"error": str(e), "results": []}
 
 @app.get("/ai-search")
-async def semantic_search_articles(q: str, user_id: Optional[str] = None):
+async def semantic_search_articles(q: str, user_id: Optional[str] = None, mode: Optional[str] = None):
     """
-    Performs AI-powered semantic search and optionally logs the query
+    Performs AI-powered semantic search and optionally logs the query;
+    mode=hybrid also ranks with BM25 and fuses both (needs LEXICAL_SEARCH=1)
     """
     if not q:
         return {"results": []}
 
     try:
-        # 1. Create an embedding for the user's search query
-        query_embedding = model.encode(q).tolist()
-
-        # 2. Call the database function to find matches
-        data, count = supabase.rpc('match_articles', {
-            'query_embedding': query_embedding,
-            'match_threshold': 0.2,  # Lower threshold to catch more relevant results
-            'match_count': 10       # Get more matches
-        }).execute()
-
-        search_results = data[1]
+        version = await run_in(db_executor, index_version.current)
+        refresh_lexical_index()
+        hybrid = (mode or AI_SEARCH_MODE) == "hybrid" and lexical_index is not None
+        cache_key = ("hybrid" if hybrid else "ai-search", normalize_query(q), MATCH_THRESHOLD, MATCH_COUNT, version)
+        search_results = search_result_cache.get(cache_key)
+        if search_results is None:
+            if not await wait_for_model():
+                return {"error": "Search model is still loading, please retry shortly", "results": []}
+
+            # 1. Create an embedding for the user's search query
+            query_embedding = await embed_query(q)
+
+            # 2. Find matches with pgvector or the local index (fused with BM25 in hybrid mode)
+            if hybrid:
+                search_results = await run_in(db_executor, hybrid_match_articles, q, query_embedding)
+            else:
+                search_results = await run_in(db_executor, match_articles, query_embedding)
+            search_result_cache.set(cache_key, search_results)
 
         # Log the semantic search query only if user_id is provided
         if user_id:
-            await log_search_query(
+            log_search_query(
                 query=q, 
                 user_id=user_id, 
                 results_count=len(search_results), 
@@ -185,6 +505,76 @@ async def semantic_search_articles(q: str, user_id: Optional[str] = None):
         print(f"Semantic search error: {str(e)}")
         return {"error": str(e), "results": []}
 
+def parse_article_ids(article_ids: list) -> list:
+    try:
+        return [int(id_val) for id_val in article_ids]
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid article ID format. All IDs must be convertible to integers. Error: {str(e)}")
+
+SUMMARY_ARTICLE_COLUMNS = 'id, title, content, company, url, digest, keywords'
+
+# Topic centroids learned at ingestion (themes.py); loaded on the first summary, None if unavailable.
+# At most every THEMES_REFRESH seconds the published version is checked: a new one is loaded, and a
+# failed load is retried.
+THEMES_REFRESH_SECONDS = float(os.getenv("THEMES_REFRESH", "60"))
+theme_engine = None
+theme_engine_version = None   # themes version the engine was loaded at
+theme_engine_checked_at = None
+theme_engine_lock = threading.Lock()
+
+def get_theme_engine():
+    global theme_engine, theme_engine_version, theme_engine_checked_at
+    checked_at = theme_engine_checked_at
+    if checked_at is not None and time.monotonic() - checked_at < THEMES_REFRESH_SECONDS:
+        return theme_engine
+    with theme_engine_lock:
+        if theme_engine_checked_at is not checked_at:
+            return theme_engine  # another thread just checked
+        theme_engine_checked_at = time.monotonic()
+        version = read_index_version(supabase, THEMES_INDEX)
+        if theme_engine is not None and (version is None or version == theme_engine_version):
+            return theme_engine
+        try:
+            if version or not os.path.exists(THEMES_PATH):
+                # Published topics live in Supabase; the local file only exists next to the scraper
+                engine = ThemeEngine.load_from_supabase(supabase)
+            else:
+                engine = ThemeEngine.load(THEMES_PATH)
+            theme_engine, theme_engine_version = engine, version
+            print(f"Loaded {len(engine)} themes.")
+        except Exception as e:
+            print(f"Themes unavailable, using {'the previous' if theme_engine else 'keyword'} themes. Error: {e}")
+    return theme_engine
+
+def summary_themes(articles: list) -> list:
+    """
+    Ranked corpus themes for the articles' embeddings, or the keyword scan without a theme engine
+    """
+    engine = get_theme_engine()
+    embeddings = [parse_embedding(article['embedding']) for article in articles if article.get('embedding')]
+    if engine is not None and embeddings:
+        themes = engine.themes(np.stack(embeddings))
+        if themes:
+            return themes
+    return extract_themes(articles)
+
+def fetch_summary_articles(article_ids: list) -> list:
+    """
+    Fetch the articles to summarize from Supabase (404 if none exist)
+    """
+    print(f"Fetching {len(article_ids)} articles for summarization...")
+    try:
+        columns = SUMMARY_ARTICLE_COLUMNS + (', embedding' if get_theme_engine() is not None else '')
+        response = supabase.table('articles').select(columns).in_('id', article_ids).execute()
+    except Exception as e:
+        # Databases without the digest columns yet: summarize from raw content
+        print(f"Digest columns unavailable, using content. Error: {e}")
+        response = supabase.table('articles').select('id, title, content, company, url').in_('id', article_ids).execute()
+    if not response.data:
+        raise HTTPException(status_code=404, detail="No articles found")
+    print(f"Found {len(response.data)} articles")
+    return response.data
+
 @app.post("/summarize-results")
 def summarize_search_results(request: SummarizeRequest):
     """Summarizes all articles from search results using GPT-4o-mini via ZnapAI"""
@@ -198,81 +588,21 @@ def summarize_search_results(request: SummarizeRequest):
         raise HTTPException(status_code=400, detail="No articles provided for summarization")
     
     try:
-
-        try:
-            integer_article_ids = [int(id_val) for id_val in request.article_ids]
-        except (ValueError, TypeError) as e:
-            raise HTTPException(status_code=400, detail=f"Invalid article ID format. All IDs must be convertible to integers. Error: {str(e)}")
-           
-        
-        # Fetch article contents from Supabase
-        print(f"Fetching {len(integer_article_ids)} articles for summarization...")
-        
-        response = supabase.table('articles').select('id, title, content, company, url').in_('id', integer_article_ids).execute()
-        
-        if not response.data:
-            raise HTTPException(status_code=404, detail="No articles found")
-        
-        articles = response.data
-        print(f"Found {len(articles)} articles")
-        
-        # Prepare content for AI summarization
-        article_texts = []
-        for article in articles:
-            article_summary = f"Title: {article['title']}\nCompany: {article['company']}\nContent: {article['content'][:1000]}..."  # Limit content to avoid token limits
-            article_texts.append(article_summary)
-        
-        # Create prompt for GPT-4o-mini
-        combined_content = "\n\n---\n\n".join(article_texts)
-        
-        system_prompt = """You are an expert technical analyst who specializes in summarizing engineering and technology articles. 
-        Your task is to analyze multiple articles and provide a comprehensive, insightful summary that identifies:
-        1. Key themes and trends
-        2. Common technical approaches or solutions
-        3. Emerging patterns in the engineering space
-        4. Important insights that would be valuable to software engineers
-
-        Keep your summary concise but informative, focusing on actionable insights and technical trends.
-        **Format your response using markdown for readability.** Use headings, bullet points, and bold text to structure the information."""
-
-        user_prompt = f"""Based on the user's search query: "{request.query}"
-
-        Please analyze and summarize the following {len(articles)} engineering articles. Identify the main themes, technical approaches, and key insights that would be most valuable to software engineers:
-
-        {combined_content}
-
-        Provide a comprehensive summary that covers:
-        1. The main themes and topics discussed across these articles
-        2. Key technical insights and approaches mentioned
-        3. Common patterns or trends you notice
-        4. Practical takeaways for engineers
-
-        Keep the summary engaging and informative, around 200-300 words.
-        **Please use markdown for formatting.** For example:
-        
-        ### Key Themes
-        - **Theme 1:** Description of the theme.
-        - **Theme 2:** Description of the theme.
-
-        ### Technical Insights
-        - **Insight 1:** Description of the insight.
-        """
-
+        article_ids = parse_article_ids(request.article_ids)
+        cache_key = summary_key(request.query, article_ids, summary_inputs_version.current())
+        cached = summary_cache.get(cache_key)
+        if cached is not None:
+            print(f"Summary cache hit for query='{request.query}'")
+            return SummarizeResponse(query=request.query, **cached)
+
+        articles = fetch_summary_articles(article_ids)
+        system_prompt, user_prompt = build_prompts(request.query, articles)
         print(f"Prepared prompts. System prompt length: {len(system_prompt)}, User prompt length: {len(user_prompt)}")
-        print(f"API Key configured: {bool(ZNAPAI_API_KEY)}, API Key length: {len(ZNAPAI_API_KEY) if ZNAPAI_API_KEY else 0}")
 
         # Call ZnapAI API
         print("Calling ZnapAI API for summarization...")
         try:
-            completion = openai_client.chat.completions.create(
-                model="gpt-4o-mini",  # Changed from gpt-4.1-mini to gpt-4o-mini based on ZnapAI docs
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=500,
-                temperature=0.7
-            )
+            completion = get_openai_client().chat.completions.create(**summary_request(system_prompt, user_prompt))
             
             ai_summary = completion.choices[0].message.content
             print(f"AI Summary generated successfully: {ai_summary[:100]}...")
@@ -286,19 +616,9 @@ def summarize_search_results(request: SummarizeRequest):
                 detail=f"ZnapAI API Error: {str(api_error)}. Please check your API key and model availability."
             )
         
-        # Extract themes (simple keyword extraction from titles)
-        themes = []
-        all_titles = " ".join([article['title'].lower() for article in articles])
-        common_tech_terms = ['api', 'database', 'cloud', 'microservices', 'kubernetes', 'docker', 'ai', 'machine learning', 'performance', 'scalability', 'security', 'testing', 'devops', 'frontend', 'backend', 'infrastructure']
-        
-        for term in common_tech_terms:
-            if term in all_titles:
-                themes.append(term.title())
-        
-        # Limit to top 5 themes
-        themes = themes[:5] if themes else ["Engineering", "Technology"]
-        
+        themes = summary_themes(articles)
         print(f"Generated summary successfully. Themes: {themes}")
+        summary_cache.set(cache_key, ai_summary, themes, len(articles))
         
         return SummarizeResponse(
             summary=ai_summary,
@@ -307,10 +627,67 @@ def summarize_search_results(request: SummarizeRequest):
             themes=themes
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Summarization error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to generate summary: {str(e)}")
 
+@app.post("/summarize-results/stream")
+async def stream_search_summary(request: SummarizeRequest):
+    """
+    Streams the summary as server-sent events: `meta` (themes, article count), one `token`
+    event per delta from ZnapAI, then `done` with ttft_ms and total_ms (or `error`)
+    """
+    if not ZNAPAI_API_KEY:
+        raise HTTPException(status_code=500, detail="ZnapAI API key not configured")
+    if not request.article_ids:
+        raise HTTPException(status_code=400, detail="No articles provided for summarization")
+
+    started = time.perf_counter()
+    article_ids = parse_article_ids(request.article_ids)
+    inputs_version = await run_in(db_executor, summary_inputs_version.current)
+    cache_key = summary_key(request.query, article_ids, inputs_version)
+    cached = await run_in(db_executor, summary_cache.get, cache_key)
+
+    if cached is not None:
+        async def cached_events():
+            yield sse_event("meta", {"query": request.query, "article_count": cached["article_count"],
+                                     "themes": cached["themes"], "cached": True})
+            yield sse_event("token", {"text": cached["summary"]})
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+            yield sse_event("done", {"ttft_ms": elapsed_ms, "total_ms": elapsed_ms, "cached": True})
+        return StreamingResponse(cached_events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    articles = await run_in(db_executor, fetch_summary_articles, article_ids)
+    system_prompt, user_prompt = build_prompts(request.query, articles)
+    themes = await run_in(db_executor, summary_themes, articles)
+
+    async def events():
+        yield sse_event("meta", {"query": request.query, "article_count": len(articles), "themes": themes, "cached": False})
+        ttft_ms = None
+        parts = []
+        try:
+            async for text in stream_completion(get_async_openai_client(), system_prompt, user_prompt):
+                if ttft_ms is None:
+                    ttft_ms = round((time.perf_counter() - started) * 1000, 1)
+                    summary_ttft_ms.observe(ttft_ms)
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+        except Exception as api_error:
+            print(f"ZnapAI streaming error: {str(api_error)}")
+            yield sse_event("error", {"detail": f"ZnapAI API Error: {str(api_error)}"})
+            return
+        total_ms = round((time.perf_counter() - started) * 1000, 1)
+        summary_total_ms.observe(total_ms)
+        print(f"Streamed summary: ttft {ttft_ms} ms, total {total_ms} ms")
+        # Only complete streams are cached; a client disconnect cancels the generator before this
+        await run_in(db_executor, summary_cache.set, cache_key, "".join(parts), themes, len(articles))
+        yield sse_event("done", {"ttft_ms": ttft_ms, "total_ms": total_ms, "cached": False})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.get("/test-znapai")
 def test_znapai_connection():
     """Test ZnapAI API connection with a simple request"""
@@ -319,7 +696,7 @@ def test_znapai_connection():
     
     try:
         print("Testing ZnapAI API connection...")
-        completion = openai_client.chat.completions.create(
+        completion = get_openai_client().chat.completions.create(
             model="gpt-4o-mini",
             messages=[
                 {"role": "user", "content": "Hello! Please respond with 'API connection successful'"}
@@ -353,9 +730,12 @@ async def create_article(article: ArticleCreate):
     try:
         # Generate embedding if not provided
         if not article.embedding:
-            article_embedding = model.encode(article.title + " " + article.content[:1000]).tolist()
+            if not await wait_for_model():
+                raise HTTPException(status_code=503, detail="Embedding model is still loading")
+            article_embedding = await run_in(encode_executor, model_loader.get().encode,
+                                             article.title + " " + article.content[:1000])
         else:
-            article_embedding = article.embedding
+            article_embedding = np.asarray(article.embedding, dtype=np.float32)
 
         # Prepare data for insertion
         article_data = {
@@ -363,11 +743,21 @@ async def create_article(article: ArticleCreate):
             "content": article.content,
             "url": article.url,
             "company": article.company,
-            "embedding": article_embedding
+            "embedding": format_embedding(article_embedding)
         }
 
         # Insert article into Supabase
-        response = supabase.table('articles').insert(article_data).execute()
+        version_before_write = await run_in(db_executor, index_version.current)
+        response = await run_in(db_executor, supabase.table('articles').insert(article_data).execute)
+        if ARTICLE_CHUNKS and response.data and await wait_for_model():
+            # Passage embeddings cover the whole content, not just the first 1000 characters
+            try:
+                chunk_rows = await run_in(encode_executor, embed_chunks, model_loader.get(), response.data)
+                await run_in(db_executor, insert_chunks, supabase, chunk_rows)
+            except Exception as e:
+                print(f"Storing article chunks failed (backfill with CHUNKS=1 python vector.py). Error: {e}")
+        await run_in(db_executor, index_version.bump)
+        add_to_local_index(response.data, article_embedding, version_before_write)
         
         # Check the response
         if response and len(response) > 1 and response[1]:
@@ -375,6 +765,11 @@ async def create_article(article: ArticleCreate):
         else:
             raise HTTPException(status_code=500, detail="Failed to insert article")
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Article insertion error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error inserting article: {str(e)}")
+
+IMPORT_SECONDS = round(time.perf_counter() - IMPORT_STARTED, 3)
+print(f"main.py imported in {IMPORT_SECONDS}s (model loading in the background).")
@@ -0,0 +1,145 @@
+import os
+import tempfile
+import numpy as np
+
+from vector_index import VectorIndex, normalize_rows, top_k
+
+# --- SETTINGS ---
+# Significant digits written per component when sending embeddings to PostgREST.
+# float32 round-trips exactly with 9 digits; float16 precision needs only 4.
+PAYLOAD_DIGITS = {"float32": 9, "float16": 4}
+EMBEDDING_PAYLOAD = os.getenv("EMBEDDING_PAYLOAD", "float32")
+# In-memory storage of the local search index: float32, float16 or int8
+LOCAL_INDEX_DTYPE = os.getenv("LOCAL_INDEX_DTYPE", "float32")
+QUANTIZED_DTYPES = ("float16", "int8")
+# Set LOCAL_INDEX_RERANK=1 to re-score quantized candidates against float32 copies (better recall,
+# but the copies take as much space as a float32 index, in a memory-mapped scratch file).
+LOCAL_INDEX_RERANK = os.getenv("LOCAL_INDEX_RERANK", "0") == "1"
+# Rows scored per block when dequantizing, which bounds the temporary float32 buffer.
+SCORE_BLOCK = 16384
+
+
+# --- encoding / decoding ---
+
+def quantize_int8(vectors: np.ndarray):
+    """Symmetric per-vector int8: codes = round(x / scale), scale = max|x| / 127."""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def dequantize_int8(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    return codes.astype(np.float32) * scales[:, None]
+
+
+def to_float16(vectors: np.ndarray) -> np.ndarray:
+    return np.asarray(vectors, dtype=np.float32).astype(np.float16)
+
+
+def format_embedding(vector, payload: str = EMBEDDING_PAYLOAD) -> str:
+    """pgvector text literal ('[0.0123,...]') with only as many digits as the payload format keeps.
+
+    A float32 `.tolist()` serializes each component as a 17-digit float64, so this alone
+    roughly halves the JSON sent per row without changing the stored value.
+    """
+    digits = PAYLOAD_DIGITS[payload]
+    return "[" + ",".join(f"{x:.{digits}g}" for x in np.asarray(vector, dtype=np.float32).tolist()) + "]"
+
+
+# --- quantized search ---
+
+class QuantizedVectorIndex(VectorIndex):
+    """VectorIndex that keeps vectors as float16 or per-vector-scaled int8.
+
+    Queries are scored against the compact codes directly (block by block, so no full float32
+    copy is ever materialized). With `rerank=True` the float32 originals are spilled to a
+    memory-mapped scratch file and the best `rerank_factor * k` candidates are re-scored
+    exactly, which recovers nearly all of the recall lost to quantization; `nbytes` counts
+    those copies too, since they are paged in as queries touch them.
+    """
+
+    def __init__(self, dim: int = 768, dtype: str = "int8", rerank: bool = LOCAL_INDEX_RERANK, rerank_factor: int = 4):
+        if dtype not in QUANTIZED_DTYPES:
+            raise ValueError(f"Unknown quantized dtype {dtype!r}, expected one of {QUANTIZED_DTYPES}")
+        super().__init__(dim)
+        self.dtype = dtype
+        self.rerank = rerank
+        self.rerank_factor = rerank_factor
+        self.matrix = np.zeros((0, dim), dtype=np.int8 if dtype == "int8" else np.float16)
+        self.scales = np.zeros(0, dtype=np.float32)
+        self._originals = None
+        self._originals_file = None
+
+    @property
+    def nbytes(self) -> int:
+        originals = self._originals.nbytes if self._originals is not None else 0
+        return self.matrix.nbytes + self.scales.nbytes + originals
+
+    def _grow_originals(self, capacity: int):
+        """Moves the float32 originals to a larger anonymous memory-mapped scratch file."""
+        scratch = tempfile.TemporaryFile(prefix="erblogx-f32-")
+        grown = np.memmap(scratch, dtype=np.float32, mode="w+", shape=(capacity, self.dim))
+        if self._originals is not None:
+            grown[:self._size] = self._originals[:self._size]
+        self._originals, self._originals_file = grown, scratch
+
+    def add_many(self, rows: list, embeddings: np.ndarray):
+        embeddings = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim))
+        if self.dtype == "int8":
+            codes, scales = quantize_int8(embeddings)
+        else:
+            codes, scales = to_float16(embeddings), np.ones(len(embeddings), dtype=np.float32)
+        rows = [self._slim(row) for row in rows]
+        with self._lock:
+            needed = self._size + len(rows)
+            if needed > self.matrix.shape[0]:
+                capacity = max(needed, 2 * self.matrix.shape[0], 1024)
+                grown = np.zeros((capacity, self.dim), dtype=self.matrix.dtype)
+                grown[:self._size] = self.matrix[:self._size]
+                self.matrix = grown
+                grown_scales = np.ones(capacity, dtype=np.float32)
+                grown_scales[:self._size] = self.scales[:self._size]
+                self.scales = grown_scales
+                if self.rerank:
+                    self._grow_originals(capacity)
+            self.matrix[self._size:needed] = codes
+            self.scales[self._size:needed] = scales
+            if self.rerank:
+                self._originals[self._size:needed] = embeddings
+            self.rows.extend(rows)
+            self._size = needed
+
+    def scores(self, query) -> np.ndarray:
+        query = normalize_rows(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        size = self._size
+        out = np.empty(size, dtype=np.float32)
+        for start in range(0, size, SCORE_BLOCK):
+            block = self.matrix[start:min(start + SCORE_BLOCK, size)]
+            out[start:start + len(block)] = block.astype(np.float32) @ query
+        if self.dtype == "int8":
+            out *= self.scales[:size]
+        return out
+
+    def search(self, query, match_threshold: float = 0.2, match_count: int = 10) -> list:
+        if not self.rerank:
+            return super().search(query, match_threshold, match_count)
+
+        query = normalize_rows(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        # Sorted row order keeps the reads from the memory-mapped originals sequential.
+        candidates = np.sort(top_k(self.scores(query), match_count * self.rerank_factor))
+        exact = np.asarray(self._originals[candidates]) @ query
+        results = []
+        for i in top_k(exact, match_count):
+            if exact[i] <= match_threshold:
+                break
+            results.append(dict(self.rows[candidates[i]], similarity=float(exact[i])))
+        return results
+
+
+def load_vector_index(supabase, dtype: str = LOCAL_INDEX_DTYPE) -> VectorIndex:
+    """Loads the local search index in the configured storage format."""
+    if dtype == "float32":
+        return VectorIndex.load(supabase)
+    return QuantizedVectorIndex.load(supabase, dtype=dtype)
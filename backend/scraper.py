@@ -1,37 +1,47 @@
 import os
-import torch
-from sentence_transformers import SentenceTransformer
-import feedparser
-import requests
-from bs4 import BeautifulSoup
 from supabase import create_client, Client
 from dotenv import load_dotenv
 import xml.etree.ElementTree as ET
-import trafilatura
+from fetcher import download_feed, fetch_pages, iter_fetched_feeds
+from extract import ExtractionPool, clean_text
+from embeddings import embed_rows, load_embedder
+from digests import ARTICLE_DIGESTS, add_digests
+from chunks import ARTICLE_CHUNKS, store_chunks
+from hn import HN_BACKFILL_ITEMS, HN_FETCH_PAGES, ingest_hacker_news
+from ingest_queue import MAX_ATTEMPTS, SKIP, IngestQueue, Stage, StagePipeline
+from url_index import UrlIndex, url_key
+from duplicates import LINK_DUPLICATES, NEAR_DUPLICATES, DuplicateIndex, PendingDuplicate
+from bulk_writer import WRITE_BATCH_ROWS, BulkWriter
+from feed_cache import FeedCache
+from index_version import bump_index_version
+from themes import build_themes
 
 # --- SETUP ---
 # Load environment variables
 load_dotenv()
 
-# Initialize Supabase client
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_ANON = os.getenv("SUPABASE_ANON")
-if not SUPABASE_URL or not SUPABASE_ANON:
-    raise Exception("Supabase credentials not found.")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON)
 
-#sentence transformer
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"Using device: {device}")
-embedding_model = SentenceTransformer('all-mpnet-base-v2', device=device)
+# Everything below is created in main(), since the extraction workers are spawned processes that
+# import this module again and must not open clients, thread pools or models of their own.
+supabase: Client = None
+#sentence transformer (torch or onnxruntime, see EMBEDDING_BACKEND)
+embedding_model = None
 
-# --- HELPER FUNCTIONS ---
+# Stored article URLs, per-feed HTTP cache and content signatures
+url_index = UrlIndex()
+feed_cache = FeedCache()
+duplicate_index = DuplicateIndex()
+# HTML parsing runs in worker processes, off the threads that download and embed
+extraction_pool = None
+# Article inserts from every feed and HN go through one batching writer
+article_writer = None
+# Durable queue between the ingestion stages
+ingest_queue = None
+ARTICLE_KIND = "article"
 
-def clean_text(text: str) -> str:
-    """Removes the null character '\u0000' from a string."""
-    if not isinstance(text, str):
-        return ""
-    return text.replace('\u0000', '')
+# --- HELPER FUNCTIONS ---
 
 def get_feed_urls_from_opml(opml_file_path: str) -> list:
     """Parses an OPML file and returns a list of feed URLs."""
@@ -46,140 +56,269 @@ def get_feed_urls_from_opml(opml_file_path: str) -> list:
         print(f"ERROR: OPML file not found at '{opml_file_path}'.")
         return []
 
-def get_full_article_content(url: str) -> str:
-    """Attempts to get full text via trafilatura, then falls back to basic BeautifulSoup scrape."""
-    try:
-        downloaded = trafilatura.fetch_url(url)
-        full = trafilatura.extract(downloaded)
-        if full:
-            return clean_text(full)
-    except Exception:
-        pass
-
-    # fallback
-    try:
-        response = requests.get(url, timeout=15)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-        main_content = (soup.find('article') or soup.find('div', class_='post-content') or soup.find('main'))
-        if main_content:
-            for s in main_content(['script', 'style']):
-                s.decompose()
-            return clean_text(main_content.get_text(separator='\n', strip=True))
-    except requests.RequestException:
-        pass
-        return ""
+def extract_article_content(html) -> str:
+    """Article text of downloaded HTML (trafilatura, then a basic BeautifulSoup scrape)."""
+    return extraction_pool.extract(html)
 
-# --- MAIN EXECUTION ---
-def main():
-    """Main function to run the ingestion pipeline."""
-    opml_path = 'blogs.opml'
-    all_feed_urls = get_feed_urls_from_opml(opml_path)
+def needs_full_content(entry) -> bool:
+    """Feeds that only ship a short summary need the article page scraped."""
+    return len(entry.get("summary", "")) < 200
 
-    if not all_feed_urls:
-        print("No feed URLs found. Exiting.")
-        return
+def select_new_entries(feed_url: str, feed) -> list:
+    """Returns the feed entries that are newer than the last run and whose links are not stored yet."""
+    entries = feed_cache.filter_unseen(feed_url, feed.entries)
+    links = [entry.get("link", "") for entry in entries]
+    new_links = set(url_index.filter_new(supabase, [link for link in links if link]))
 
-    for feed_url in all_feed_urls:
+    new_entries = []
+    for entry in entries:
+        entry_link = entry.get("link", "")
+        if entry_link in new_links:
+            new_links.discard(entry_link)
+            new_entries.append(entry)
+    return new_entries
+
+def entry_article(feed, entry) -> dict:
+    """The article row for a feed entry; its summary stands in until the page text is extracted."""
+    return {
+        "title": clean_text(entry.get("title", "No Title Found")),
+        "url": entry.get("link", ""),
+        "published_date": entry.get("published", None),
+        "company": clean_text(feed.feed.get("title", "")),
+        "content": clean_text(entry.get("summary", "")),
+    }
+
+def insert_articles(rows: list) -> list:
+    """Inserts new articles, records their URLs and invalidates cached search results.
+
+    Returns the error per row (None when written); the other rows are stored either way.
+    """
+    if ARTICLE_DIGESTS:
+        add_digests(embedding_model, [row for row in rows if not row.get("duplicate_of")])
+        for row in rows:
+            row.setdefault("digest", None)
+            row.setdefault("keywords", None)
+    errors = article_writer.write(rows)
+    written = [row for row, error in zip(rows, errors) if error is None]
+    for article in written:
+        url_index.add(article["url"])
+    if ARTICLE_CHUNKS:
+        store_chunks(supabase, embedding_model, [row for row in written if not row.get("duplicate_of")])
+    if written:
+        bump_index_version(supabase)
+    return errors
+
+def queue_articles(articles: list, stage: str) -> int:
+    items = [(str(url_key(article["url"])), stage, article) for article in articles]
+    return ingest_queue.put_many(ARTICLE_KIND, items)
+
+def queue_entries(feed, entries: list):
+    """Queues new entries: short summaries go to the fetch stage for their page, the rest straight to embed."""
+    to_fetch, to_embed = [], []
+    for entry in entries:
+        article = entry_article(feed, entry)
+        if needs_full_content(entry):
+            to_fetch.append(article)
+        elif article["content"]:
+            to_embed.append(article)
+        else:
+            print(f"  -> Skipping article with no content: {article['title']}")
+    queued = queue_articles(to_fetch, "fetch") + queue_articles(to_embed, "embed")
+    if queued:
+        print(f"  --> Queued {queued} new articles.")
+    else:
+        print("  -> No new articles found for this feed.")
+
+def discover_feeds_sequentially(feed_urls: list):
+    for feed_url in feed_urls:
         print(f"\n--- Processing feed: {feed_url} ---")
         try:
-            feed = feedparser.parse(feed_url)
-            articles_to_save = []
-
-            for entry in feed.entries:
-                entry_link = entry.get("link", "")
-                if not entry_link:
-                    continue
-
-                res = supabase.table('articles').select('id').eq('url', entry_link).execute()
-                if res.data:
-                    continue
-
-                summary = entry.get("summary", "")
-                content = ""
-                if len(summary) < 200:
-                    full_content = get_full_article_content(entry_link)
-                    content = full_content if full_content else clean_text(summary)
-                else:
-                    content = clean_text(summary)
-                
-                if not content:
-                    print(f"  -> Skipping article with no content: {entry.get('title', '')}")
-                    continue
-
-                embedding = embedding_model.encode(content[:4000]).tolist()
-
-                article = {
-                    "title": clean_text(entry.get("title", "No Title Found")),
-                    "url": entry_link,
-                    "published_date": entry.get("published", None),
-                    "company": clean_text(feed.feed.get("title", "")),
-                    "content": content,
-                    "embedding": embedding 
-                }
-                
-                articles_to_save.append(article)
-            
-            if articles_to_save:
-                print(f"  --> Found {len(articles_to_save)} new articles. Saving to Supabase...")
-                supabase.table('articles').insert(articles_to_save, returning="minimal").execute()
-            else:
-                print("  -> No new articles found for this feed.")
+            fetched = download_feed(feed_url, feed_cache.request_headers(feed_url))
+            if fetched.not_modified:
+                feed_cache.not_modified(feed_url)
+                print("  -> Feed unchanged since last run.")
+                continue
+
+            # Sized from the body: content-length is often missing on gzip or chunked responses
+            feed_cache.stage(feed_url, fetched.feed, size=fetched.size)
+            queue_entries(fetched.feed, select_new_entries(feed_url, fetched.feed))
+            # The entries are durably queued, so the feed's high-water mark can move on
+            feed_cache.commit(feed_url)
 
         except Exception as e:
             print(f"  !!!!!! FAILED to process feed {feed_url}. Error: {e} !!!!!!")
             continue
 
-    # --- HACKER NEWS SCRAPING ---
-    print("\n--- Processing latest 500 Hacker News stories ---")
-    try:
-        HN_API_BASE = "https://hacker-news.firebaseio.com/v0"
+def discover_feeds_concurrently(feed_urls: list):
+    """Downloads feeds in parallel; article pages are left to the fetch stage."""
+    fetched_feeds = iter_fetched_feeds(feed_urls, select_new_entries, lambda entry: False,
+                                       request_headers=feed_cache.request_headers)
+    for fetched in fetched_feeds:
+        print(f"\n--- Processing feed: {fetched.feed_url} ---")
+        if fetched.error:
+            print(f"  !!!!!! FAILED to process feed {fetched.feed_url}. Error: {fetched.error} !!!!!!")
+            continue
+        if fetched.not_modified:
+            feed_cache.not_modified(fetched.feed_url)
+            print("  -> Feed unchanged since last run.")
+            continue
+        try:
+            feed_cache.stage(fetched.feed_url, fetched.feed, size=fetched.size)
+            queue_entries(fetched.feed, fetched.entries)
+            feed_cache.commit(fetched.feed_url)
 
-        latest_ids = requests.get(f"{HN_API_BASE}/newstories.json", timeout=10).json()[:500]
-        if not latest_ids:
-            print("Could not fetch newstories list. Aborting HN scrape.")
-            return
+        except Exception as e:
+            print(f"  !!!!!! FAILED to process feed {fetched.feed_url}. Error: {e} !!!!!!")
+            continue
 
-        print(f"Retrieved {len(latest_ids)} story IDs.")
+# --- STAGES ---
+# discovery (feeds, HN) -> fetch -> extract -> embed -> write, joined by the durable ingest queue
 
-        hn_batch = []
-        for item_id in latest_ids:
-            try:
-                data = requests.get(f"{HN_API_BASE}/item/{item_id}.json", timeout=10).json()
-                if not data or data.get("type") != "story" or data.get("deleted") or not data.get("url"):
-                    continue
+def fetch_stage(items: list) -> list:
+    """Downloads article pages; an article whose page fails keeps its summary (or HN title) as content."""
+    pages = fetch_pages([item.payload["url"] for item in items])
+    outcomes = []
+    for item, page in zip(items, pages):
+        item.html = page
+        outcomes.append(None if page or item.payload.get("content") else "page download failed")
+    return outcomes
 
-                url = data["url"]
-                if supabase.table('articles').select('id').eq('url', url).execute().data:
-                    continue
+def extract_stage(items: list) -> list:
+    with_html = {item.key: item for item in items if item.html}
+    for key, text in extraction_pool.extract_many((key, item.html) for key, item in with_html.items()):
+        if text:
+            with_html[key].payload["content"] = text
+    outcomes = []
+    for item in items:
+        item.html = None
+        outcomes.append(None if item.payload.get("content") else SKIP)
+    return outcomes
 
-                title = clean_text(data.get("title", ""))
-                content = get_full_article_content(url) or title
+def check_duplicates(items: list) -> list:
+    """SKIP for near-duplicates of stored (or already written) articles; with NEAR_DUPLICATES=link
+    copies of a stored article are kept instead, marked with `duplicate_of` and no embedding.
+    Copies of an article whose write is still pending are retried later."""
+    outcomes = []
+    for item in items:
+        try:
+            canonical, duplicate = duplicate_index.claim(item.key, item.payload["content"])
+        except PendingDuplicate as e:
+            outcomes.append(e)
+            continue
+        if LINK_DUPLICATES:
+            item.payload["duplicate_of"] = canonical
+        if duplicate and not (LINK_DUPLICATES and canonical is not None):
+            print(f"  -> Skipping near-duplicate: {item.payload['title']}")
+            outcomes.append(SKIP)
+        else:
+            outcomes.append(None)
+    return outcomes
 
-                embedding = embedding_model.encode(content[:4000]).tolist()
+def embed_stage(items: list) -> list:
+    outcomes = check_duplicates(items) if NEAR_DUPLICATES != "off" else [None] * len(items)
+    rows = [item.payload for item, outcome in zip(items, outcomes) if outcome is None]
+    # One batched encode per leased batch instead of one model call per article; linked copies aren't encoded
+    embed_rows(embedding_model, [row for row in rows if not row.get("duplicate_of")])
+    for row in rows:
+        row.setdefault("embedding", None)
+    return outcomes
 
-                published_ts = data.get("time")
-                from datetime import datetime, timezone
-                published_dt = datetime.fromtimestamp(published_ts, tz=timezone.utc).isoformat()
+def write_stage(items: list) -> list:
+    print(f"  --> Saving {len(items)} new articles to Supabase...")
+    # Rows that still fail after the writer's retries and splits go back to the queue on their own
+    errors = insert_articles([item.payload for item in items])
+    if NEAR_DUPLICATES != "off":
+        duplicate_index.written([item.key for item, error in zip(items, errors) if error is None])
+        # An article parked as failed no longer holds back its copies
+        duplicate_index.release([item.key for item, error in zip(items, errors)
+                                 if error is not None and item.attempts + 1 >= MAX_ATTEMPTS])
+    return errors
 
-                hn_batch.append({
-                    "title": title,
-                    "url": url,
-                    "published_date": published_dt,
-                    "company": "Hacker News",
-                    "content": content,
-                    "embedding": embedding
-                })
+def article_stages() -> list:
+    return [
+        Stage("fetch", fetch_stage, batch_size=64),
+        Stage("extract", extract_stage, batch_size=32),
+        Stage("embed", embed_stage, batch_size=64),
+        Stage("write", write_stage, batch_size=WRITE_BATCH_ROWS),
+    ]
 
-                if len(hn_batch) >= 100:
-                    supabase.table('articles').insert(hn_batch, returning="minimal").execute()
-                    hn_batch = []
+# --- MAIN EXECUTION ---
+def main(feeds: bool = True, hn_backfill: int = HN_BACKFILL_ITEMS):
+    """Main function to run the ingestion pipeline."""
+    global supabase, embedding_model, url_index, feed_cache, duplicate_index, extraction_pool, article_writer
+    global ingest_queue
+    if not SUPABASE_URL or not SUPABASE_ANON:
+        raise Exception("Supabase credentials not found.")
+    supabase = create_client(SUPABASE_URL, SUPABASE_ANON)
+    extraction_pool = ExtractionPool()
+    article_writer = BulkWriter(supabase, 'articles')
+    embedding_model = load_embedder()
+    url_index = UrlIndex.load(supabase)
+    feed_cache = FeedCache.load()
+    if NEAR_DUPLICATES != "off":
+        duplicate_index = DuplicateIndex.load(supabase)
+    ingest_queue = IngestQueue.open()
+    # The stages start on whatever an interrupted run left queued while discovery adds more
+    pipeline = StagePipeline(ingest_queue, ARTICLE_KIND, article_stages()).start()
+    try:
+        if feeds:
+            run_ingestion()
+        run_hacker_news(hn_backfill)
+        pipeline.join()
+        # Set BUILD_THEMES=1 to relearn the summary themes over the updated corpus
+        if os.getenv("BUILD_THEMES") == "1":
+            refresh_themes()
+    finally:
+        url_index.save()
+        feed_cache.save()
+        extraction_pool.close()
+        print(feed_cache.report())
+        print(extraction_pool.report())
+        if NEAR_DUPLICATES != "off":
+            duplicate_index.save()
+            print(duplicate_index.report())
+        print(pipeline.report())
+        article_writer.close()
+        print(article_writer.report())
+        ingest_queue.close()
 
-            except Exception:
-                continue
+def refresh_themes():
+    try:
+        engine = build_themes(supabase)
+        engine.save()
+        engine.publish(supabase)
+        print(f"Published {len(engine)} themes.")
+    except Exception as e:
+        print(f"Theme build failed, keeping the previous themes. Error: {e}")
 
-        if hn_batch:
-            supabase.table('articles').insert(hn_batch, returning="minimal").execute()
+def run_ingestion():
+    opml_path = 'blogs.opml'
+    all_feed_urls = get_feed_urls_from_opml(opml_path)
+
+    if not all_feed_urls:
+        print("No feed URLs found. Exiting.")
+        return
+
+    # Set CONCURRENT_FETCH=1 to download feeds in parallel.
+    if os.getenv("CONCURRENT_FETCH") == "1":
+        discover_feeds_concurrently(all_feed_urls)
+    else:
+        discover_feeds_sequentially(all_feed_urls)
+
+def select_hn_urls(urls: list) -> list:
+    return url_index.filter_new(supabase, urls)
+
+def queue_hn_articles(articles: list):
+    # Stories carry their title as content until the fetch and extract stages replace it
+    queued = queue_articles(articles, "fetch" if HN_FETCH_PAGES else "embed")
+    print(f"  --> Queued {queued} new Hacker News stories.")
+
+def run_hacker_news(backfill: int = HN_BACKFILL_ITEMS):
+    print("\n--- Processing Hacker News items since the last run ---")
+    try:
+        # Pages are downloaded by the fetch stage, not by the HN scanner
+        ingest_hacker_news(queue_hn_articles, select_hn_urls, extract_article_content, backfill=backfill,
+                           fetch_pages=False)
     except Exception as e:
         print(f"HN scraping failed: {e}")
 
@@ -0,0 +1,108 @@
+import time
+import threading
+from collections import deque
+
+# Table the API records searches in (one row per logged query)
+LIBRARY_TABLE = "library"
+
+
+class SearchLogBuffer:
+    """Collects search-log rows in memory and writes them with bulk inserts from a background thread.
+
+    `log(row)` never blocks: it appends to a bounded buffer and returns False (counting the row
+    as dropped) when `max_pending` rows are already waiting, which is how a slow Supabase pushes
+    back. The writer flushes as soon as `batch_size` rows are pending or `flush_interval` seconds
+    after the oldest one arrived; `close()` stops it and writes whatever is left.
+    """
+
+    def __init__(self, supabase, table: str = LIBRARY_TABLE, batch_size: int = 100,
+                 flush_interval: float = 2.0, max_pending: int = 10_000):
+        self.supabase = supabase
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.logged = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+        self.flushes = 0
+        self._pending = deque()
+        self._oldest_at = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="search-log-writer", daemon=True)
+            self._thread.start()
+
+    def log(self, row: dict) -> bool:
+        with self._cond:
+            if self._closed or len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            if not self._pending:
+                self._oldest_at = time.monotonic()
+            self._pending.append(row)
+            self.logged += 1
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def _take_batch(self) -> list:
+        """Waits until a flush is due and pops up to `batch_size` rows (empty once closed and drained)."""
+        with self._cond:
+            while not self._closed:
+                if len(self._pending) >= self.batch_size:
+                    break
+                if self._pending:
+                    remaining = self._oldest_at + self.flush_interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                else:
+                    self._cond.wait()
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            self._oldest_at = time.monotonic() if self._pending else None
+            return batch
+
+    def _write(self, batch: list):
+        try:
+            self.supabase.table(self.table).insert(batch, returning="minimal").execute()
+            self.written += len(batch)
+        except Exception as e:
+            # Analytics are best-effort: a failed batch is counted and dropped, not retried
+            self.failed_flushes += 1
+            self.dropped += len(batch)
+            print(f"Error logging {len(batch)} search queries: {e}")
+        self.flushes += 1
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            self._write(batch)
+
+    def close(self, timeout: float = 10.0):
+        """Stops accepting rows and waits (up to `timeout`) for the pending ones to be written."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        else:
+            while self._pending:
+                self._write([self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))])
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "logged": self.logged,
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+        }
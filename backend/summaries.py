@@ -0,0 +1,182 @@
+import os
+import json
+import hashlib
+import tempfile
+
+from cache import LRUCache, normalize_query
+
+# --- SETTINGS ---
+ZNAPAI_BASE_URL = os.getenv("ZNAPAI_BASE_URL", "https://api.znapai.com/")
+SUMMARY_MODEL = "gpt-4o-mini"  # Changed from gpt-4.1-mini to gpt-4o-mini based on ZnapAI docs
+SUMMARY_MAX_TOKENS = 500
+SUMMARY_TEMPERATURE = 0.7
+# Bump whenever the prompts change so cached summaries made with the old ones are not served
+PROMPT_VERSION = 2
+# memory, disk (JSON files under SUMMARY_CACHE_DIR) or db (the summary_cache Supabase table)
+SUMMARY_CACHE_TIER = os.getenv("SUMMARY_CACHE_TIER", "memory")
+SUMMARY_CACHE_DIR = os.getenv("SUMMARY_CACHE_DIR", os.path.join(os.getenv("ERBLOGX_CACHE_DIR", ".cache"), "summaries"))
+SUMMARY_CACHE_TABLE = "summary_cache"
+# Characters of each article sent to the model, to stay within token limits
+ARTICLE_PROMPT_CHARS = 1000
+
+COMMON_TECH_TERMS = ['api', 'database', 'cloud', 'microservices', 'kubernetes', 'docker', 'ai', 'machine learning', 'performance', 'scalability', 'security', 'testing', 'devops', 'frontend', 'backend', 'infrastructure']
+
+SYSTEM_PROMPT = """You are an expert technical analyst who specializes in summarizing engineering and technology articles.
+        Your task is to analyze multiple articles and provide a comprehensive, insightful summary that identifies:
+        1. Key themes and trends
+        2. Common technical approaches or solutions
+        3. Emerging patterns in the engineering space
+        4. Important insights that would be valuable to software engineers
+
+        Keep your summary concise but informative, focusing on actionable insights and technical trends.
+        **Format your response using markdown for readability.** Use headings, bullet points, and bold text to structure the information."""
+
+
+def article_prompt(article: dict) -> str:
+    """Prompt block for one article: its precomputed digest and keywords, or a prefix of the raw content."""
+    if article.get('digest'):
+        keywords = ", ".join(article.get('keywords') or [])
+        return f"Title: {article['title']}\nCompany: {article['company']}\nKeywords: {keywords}\nDigest: {article['digest']}"
+    return f"Title: {article['title']}\nCompany: {article['company']}\nContent: {(article.get('content') or '')[:ARTICLE_PROMPT_CHARS]}..."
+
+
+def build_prompts(query: str, articles: list) -> tuple:
+    """(system prompt, user prompt) asking for a markdown summary of `articles` for `query`."""
+    article_texts = []
+    for article in articles:
+        article_texts.append(article_prompt(article))
+    combined_content = "\n\n---\n\n".join(article_texts)
+
+    user_prompt = f"""Based on the user's search query: "{query}"
+
+        Please analyze and summarize the following {len(articles)} engineering articles. Identify the main themes, technical approaches, and key insights that would be most valuable to software engineers:
+
+        {combined_content}
+
+        Provide a comprehensive summary that covers:
+        1. The main themes and topics discussed across these articles
+        2. Key technical insights and approaches mentioned
+        3. Common patterns or trends you notice
+        4. Practical takeaways for engineers
+
+        Keep the summary engaging and informative, around 200-300 words.
+        **Please use markdown for formatting.** For example:
+
+        ### Key Themes
+        - **Theme 1:** Description of the theme.
+        - **Theme 2:** Description of the theme.
+
+        ### Technical Insights
+        - **Insight 1:** Description of the insight.
+        """
+    return SYSTEM_PROMPT, user_prompt
+
+
+def summary_request(system_prompt: str, user_prompt: str, **kwargs) -> dict:
+    """Keyword arguments for `chat.completions.create`."""
+    return dict(
+        model=SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        max_tokens=SUMMARY_MAX_TOKENS,
+        temperature=SUMMARY_TEMPERATURE,
+        **kwargs,
+    )
+
+
+def extract_themes(articles: list) -> list:
+    """Simple keyword extraction from titles, at most 5 themes."""
+    all_titles = " ".join([article['title'].lower() for article in articles])
+    themes = [term.title() for term in COMMON_TECH_TERMS if term in all_titles]
+    return themes[:5] if themes else ["Engineering", "Technology"]
+
+
+async def stream_completion(client, system_prompt: str, user_prompt: str):
+    """Yields the text deltas of a streamed completion from an `AsyncOpenAI` client as they arrive."""
+    stream = await client.chat.completions.create(**summary_request(system_prompt, user_prompt, stream=True))
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def sse_event(event: str, data) -> str:
+    """One server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# --- summary cache ---
+
+def summary_key(query: str, article_ids: list, inputs_version=None, model: str = SUMMARY_MODEL,
+                prompt_version: int = PROMPT_VERSION) -> str:
+    """Content address of a summary: hash of normalized query, sorted article ids, the version of the
+    articles' prompt inputs (digests, content), prompt version and model."""
+    payload = json.dumps([normalize_query(query), sorted(int(i) for i in article_ids), inputs_version,
+                          prompt_version, model])
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+class SummaryCache:
+    """Summaries by content address, in a size-bounded memory tier plus an optional persistent tier.
+
+    The persistent tier is either a directory of small JSON files (`tier="disk"`) or a Supabase
+    table (`tier="db"`, see README_SETUP.md). Persistent hits are promoted to memory. Errors in
+    the persistent tier are logged and treated as misses.
+    """
+
+    def __init__(self, maxsize: int = 512, tier: str = "memory", path: str = None, supabase=None,
+                 table: str = SUMMARY_CACHE_TABLE):
+        self.memory = LRUCache(maxsize=maxsize)
+        self.tier = tier
+        self.path = path
+        self.supabase = supabase
+        self.table = table
+        self.persistent_hits = 0
+        if tier == "disk":
+            os.makedirs(path, exist_ok=True)
+
+    def _read(self, key: str):
+        if self.tier == "disk":
+            try:
+                with open(os.path.join(self.path, f"{key}.json")) as f:
+                    return json.load(f)
+            except FileNotFoundError:
+                return None
+        if self.tier == "db":
+            rows = self.supabase.table(self.table).select('summary, themes, article_count').eq('key', key).limit(1).execute().data
+            return rows[0] if rows else None
+        return None
+
+    def _write(self, key: str, value: dict):
+        if self.tier == "disk":
+            fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(value, f)
+            os.replace(tmp_path, os.path.join(self.path, f"{key}.json"))
+        elif self.tier == "db":
+            self.supabase.table(self.table).upsert(dict(value, key=key), returning="minimal").execute()
+
+    def get(self, key: str):
+        value = self.memory.get(key)
+        if value is None and self.tier != "memory":
+            try:
+                value = self._read(key)
+            except Exception as e:
+                print(f"Summary cache read failed. Error: {e}")
+            if value is not None:
+                self.persistent_hits += 1
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, summary: str, themes: list, article_count: int):
+        value = {"summary": summary, "themes": themes, "article_count": article_count}
+        self.memory.set(key, value)
+        if self.tier != "memory":
+            try:
+                self._write(key, value)
+            except Exception as e:
+                print(f"Summary cache write failed. Error: {e}")
+
+    def stats(self) -> dict:
+        return dict(self.memory.stats(), tier=self.tier, persistent_hits=self.persistent_hits)
@@ -0,0 +1,10 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# main.py builds its clients at import; point them somewhere harmless before any test imports it
+os.environ.setdefault("SUPABASE_URL", "http://localhost:9")
+os.environ.setdefault("SUPABASE_ANON", "anon-key")
+os.environ["ZNAPAI_API_KEY"] = "fake"
+os.environ["SUMMARY_CACHE_TIER"] = "memory"
@@ -0,0 +1,127 @@
+"""/summarize-results/stream against benchmarks.fake_llm_server, with Supabase stubbed."""
+import json
+
+import httpx
+import openai
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from benchmarks.fake_llm_server import CANNED_SUMMARY, create_app
+
+ARTICLES = [
+    {"id": 1, "title": "Sharding Postgres", "content": "How we sharded our database.", "company": "Acme",
+     "url": "https://acme.dev/sharding"},
+    {"id": 2, "title": "Kubernetes at scale", "content": "Running ten thousand pods.", "company": "Initech",
+     "url": "https://initech.dev/k8s"},
+]
+
+
+class FakeQuery:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def select(self, *args, **kwargs):
+        return self
+
+    def in_(self, column, values):
+        self.rows = [row for row in self.rows if row[column] in values]
+        return self
+
+    def execute(self):
+        return type("Response", (), {"data": self.rows})()
+
+
+class FakeSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    def table(self, name):
+        self.queries += 1
+        return FakeQuery(list(self.rows))
+
+
+def parse_events(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def llm_client(transport) -> openai.AsyncOpenAI:
+    return openai.AsyncOpenAI(api_key="fake", base_url="http://fake-llm/", max_retries=0,
+                              http_client=httpx.AsyncClient(transport=transport))
+
+
+@pytest.fixture
+def client(monkeypatch):
+    supabase = FakeSupabase(ARTICLES)
+    monkeypatch.setattr(main, "supabase", supabase)
+    monkeypatch.setattr(main, "get_theme_engine", lambda: None)
+    monkeypatch.setattr(main, "summary_cache", main.SummaryCache(maxsize=16))
+    monkeypatch.setattr(main.summary_inputs_version, "current", lambda: (("meta", 1), 0))
+    monkeypatch.setattr(main, "async_openai_client",
+                        llm_client(httpx.ASGITransport(app=create_app(first_token_delay=0, token_delay=0))))
+    with TestClient(main.app) as test_client:
+        test_client.supabase = supabase
+        yield test_client
+
+
+def stream(client, query: str = "scaling databases", article_ids=(1, 2)) -> list:
+    response = client.post("/summarize-results/stream", json={"query": query, "article_ids": list(article_ids)})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    return parse_events(response.text)
+
+
+def test_streams_meta_tokens_and_done(client):
+    events = stream(client)
+
+    kind, meta = events[0]
+    assert kind == "meta"
+    assert meta["article_count"] == 2 and meta["cached"] is False
+    assert meta["themes"]
+    tokens = [data["text"] for kind, data in events if kind == "token"]
+    assert len(tokens) > 1
+    assert "".join(tokens) == CANNED_SUMMARY
+    kind, done = events[-1]
+    assert kind == "done"
+    assert done["cached"] is False and done["ttft_ms"] <= done["total_ms"]
+
+
+def test_repeated_request_is_served_from_the_summary_cache(client):
+    stream(client)
+    queries = client.supabase.queries
+    events = stream(client, query="  Scaling   Databases ", article_ids=(2, 1))
+
+    assert [kind for kind, _ in events] == ["meta", "token", "done"]
+    assert events[0][1]["cached"] is True and events[-1][1]["cached"] is True
+    assert events[1][1]["text"] == CANNED_SUMMARY
+    assert client.supabase.queries == queries  # no article fetch on a hit
+
+
+def test_new_prompt_inputs_miss_the_summary_cache(client, monkeypatch):
+    stream(client)
+    # e.g. `DIGESTS=1 python vector.py` gave the articles digests since the summary was cached
+    monkeypatch.setattr(main.summary_inputs_version, "current", lambda: (("meta", 2), 0))
+    assert stream(client)[0][1]["cached"] is False
+
+
+def test_upstream_error_ends_the_stream_with_an_error_event(client, monkeypatch):
+    failing = httpx.MockTransport(lambda request: httpx.Response(503, json={"error": {"message": "overloaded"}}))
+    monkeypatch.setattr(main, "async_openai_client", llm_client(failing))
+    events = stream(client)
+
+    assert [kind for kind, _ in events] == ["meta", "error"]
+    assert "ZnapAI API Error" in events[-1][1]["detail"]
+    # Failed streams are not cached: the next request streams from the model again
+    monkeypatch.setattr(main, "async_openai_client",
+                        llm_client(httpx.ASGITransport(app=create_app(first_token_delay=0, token_delay=0))))
+    assert stream(client)[0][1]["cached"] is False
+
+
+def test_unknown_articles_are_a_404(client):
+    response = client.post("/summarize-results/stream", json={"query": "q", "article_ids": [99]})
+    assert response.status_code == 404
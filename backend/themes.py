@@ -0,0 +1,144 @@
+import os
+from collections import Counter
+from datetime import datetime, timezone
+
+import numpy as np
+
+from ann_index import train_centroids
+from digests import ARTICLE_DIGESTS, STOPWORDS, WORD
+from index_version import bump_index_version
+from vector_index import iter_embedded_articles, normalize_rows, parse_embedding
+
+# --- SETTINGS ---
+CACHE_DIR = os.getenv("ERBLOGX_CACHE_DIR", ".cache")
+THEMES_PATH = os.getenv("THEMES_PATH", os.path.join(CACHE_DIR, "themes.npz"))
+# Published for the API:
+#   create table themes (id int primary key, label text not null, centroid vector(768), updated_at timestamptz);
+THEMES_TABLE = "themes"
+# Index version bumped on every publish, so the API reloads the new topics
+THEMES_INDEX = "themes"
+THEME_COUNT = int(os.getenv("THEME_COUNT", "48"))
+TERMS_PER_LABEL = 2
+
+
+def topic_labels(assignments: np.ndarray, texts: list, topics: int, terms: int = TERMS_PER_LABEL) -> list:
+    """Labels every topic with its most distinctive terms (class-based TF-IDF over member texts).
+
+    A term scores high when it is frequent in the topic and appears in few other topics,
+    so generic words shared by the whole corpus don't become labels.
+    """
+    counts = [Counter() for _ in range(topics)]
+    for topic, text in zip(assignments, texts):
+        counts[topic].update(word for word in WORD.findall((text or "").lower()) if word not in STOPWORDS)
+    topic_frequency = Counter(word for topic_counts in counts for word in topic_counts)
+
+    labels, used = [], set()
+    for topic_counts in counts:
+        total = sum(topic_counts.values()) or 1
+        ranked = sorted(
+            topic_counts,
+            key=lambda word: -(topic_counts[word] / total) * np.log(1 + topics / topic_frequency[word]),
+        )
+        label = " & ".join(word.title() for word in ranked[:terms]) or "Engineering"
+        # Two topics with the same top terms get a third one to tell them apart
+        if label in used and len(ranked) > terms:
+            label = f"{label} & {ranked[terms].title()}"
+        used.add(label)
+        labels.append(label)
+    return labels
+
+
+class ThemeEngine:
+    """Ranked themes for a set of article embeddings, from topic centroids learned over the corpus.
+
+    Centroids are k-means (cosine) over every article embedding, labelled from the titles and
+    keywords of their members. At query time all result embeddings are scored against all
+    centroids in one matrix product; each article votes for its nearest topic with its similarity.
+    """
+
+    def __init__(self, centroids: np.ndarray, labels: list):
+        self.centroids = normalize_rows(np.asarray(centroids, dtype=np.float32))
+        self.labels = list(labels)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, texts: list, topics: int = THEME_COUNT, seed: int = 0) -> "ThemeEngine":
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        centroids = train_centroids(vectors, topics, seed=seed)
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        return cls(centroids, topic_labels(assignments, texts, len(centroids)))
+
+    def themes(self, embeddings, k: int = 5) -> list:
+        embeddings = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(-1, self.centroids.shape[1]))
+        if not len(embeddings):
+            return []
+        similarity = embeddings @ self.centroids.T
+        nearest = similarity.argmax(axis=1)
+        votes = np.bincount(nearest, weights=similarity[np.arange(len(nearest)), nearest], minlength=len(self))
+        return [self.labels[i] for i in np.argsort(-votes, kind="stable")[:k] if votes[i] > 0]
+
+    # --- persistence ---
+
+    def save(self, path: str = THEMES_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path, centroids=self.centroids.astype(np.float16), labels=np.array(self.labels))
+
+    @classmethod
+    def load(cls, path: str = THEMES_PATH) -> "ThemeEngine":
+        with np.load(path) as data:
+            return cls(data["centroids"], data["labels"].tolist())
+
+    def publish(self, supabase, table: str = THEMES_TABLE):
+        """Replaces the topics stored in Supabase, where the API reads them from."""
+        from quantize import format_embedding
+
+        updated_at = datetime.now(timezone.utc).isoformat()
+        supabase.table(table).upsert([
+            {"id": i, "label": label, "centroid": format_embedding(centroid), "updated_at": updated_at}
+            for i, (label, centroid) in enumerate(zip(self.labels, self.centroids))
+        ], returning="minimal").execute()
+        supabase.table(table).delete().gte('id', len(self)).execute()
+        bump_index_version(supabase, THEMES_INDEX)
+
+    @classmethod
+    def load_from_supabase(cls, supabase, table: str = THEMES_TABLE) -> "ThemeEngine":
+        rows = supabase.table(table).select('id, label, centroid').order('id').execute().data
+        if not rows:
+            raise LookupError(f"No themes in '{table}'")
+        return cls(np.stack([parse_embedding(row['centroid']) for row in rows]), [row['label'] for row in rows])
+
+
+def build_themes(supabase, topics: int = THEME_COUNT) -> ThemeEngine:
+    """Learns topics over every embedded article in Supabase."""
+    columns = 'id, title, keywords' if ARTICLE_DIGESTS else 'id, title'
+    texts, vectors = [], []
+    for rows, embeddings in iter_embedded_articles(supabase, columns):
+        texts.extend(f"{row['title']} {' '.join(row.get('keywords') or [])}" for row in rows)
+        vectors.append(embeddings)
+    if not vectors:
+        raise LookupError("No embedded articles to learn themes from")
+    print(f"Learning {topics} themes over {len(texts)} articles...")
+    return ThemeEngine.build(np.concatenate(vectors), texts, topics)
+
+
+if __name__ == "__main__":
+    # Offline build:  python themes.py [--topics N] [--no-publish]
+    import argparse
+    from dotenv import load_dotenv
+    from supabase import create_client
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--topics", type=int, default=THEME_COUNT)
+    parser.add_argument("--path", default=THEMES_PATH)
+    parser.add_argument("--no-publish", action="store_true", help="only write the local file")
+    args = parser.parse_args()
+
+    load_dotenv()
+    supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_ANON"))
+    engine = build_themes(supabase, args.topics)
+    engine.save(args.path)
+    if not args.no_publish:
+        engine.publish(supabase)
+    print(f"Saved {len(engine)} themes to {args.path}: {', '.join(engine.labels[:10])}...")
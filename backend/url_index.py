@@ -0,0 +1,133 @@
+import os
+import hashlib
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+import numpy as np
+
+# --- SETTINGS ---
+CACHE_DIR = os.getenv("ERBLOGX_CACHE_DIR", ".cache")
+INDEX_PATH = os.path.join(CACHE_DIR, "url_index.npz")
+PAGE_SIZE = 1000
+# PostgREST puts `in_` filters in the query string, so keep each lookup short.
+LOOKUP_CHUNK = 50
+
+TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ref", "ref_src", "source"}
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form used for dedup: no scheme, www, fragment, tracking params or trailing slash."""
+    parts = urlsplit((url or "").strip())
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+
+    path = parts.path.rstrip("/")
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    )
+    return f"{host}{path}?{urlencode(query)}" if query else f"{host}{path}"
+
+
+def url_key(url: str) -> int:
+    """64-bit hash of the normalized URL."""
+    digest = hashlib.blake2b(normalize_url(url).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class UrlIndex:
+    """Local index of every stored article URL, kept as 64-bit hashes of the normalized form.
+
+    The hashes are persisted as a sorted array together with the highest article id seen,
+    so each run only pages in the rows inserted since the previous one. `complete` says whether
+    that sync succeeded, i.e. whether a miss can be trusted without asking Supabase.
+    """
+
+    def __init__(self, path: str = INDEX_PATH):
+        self.path = path
+        self.keys = set()
+        self.max_id = 0
+        self.complete = False
+
+    @classmethod
+    def load(cls, supabase, path: str = INDEX_PATH, rebuild: bool = False) -> "UrlIndex":
+        index = cls(path)
+        if not rebuild and os.path.exists(path):
+            try:
+                data = np.load(path)
+                index.keys = set(data["keys"].tolist())
+                index.max_id = int(data["max_id"])
+            except Exception as e:
+                print(f"Could not read URL index at {path}, rebuilding. Error: {e}")
+                index.keys, index.max_id = set(), 0
+
+        known_before = len(index.keys)
+        try:
+            index.sync(supabase)
+            index.complete = True
+        except Exception as e:
+            print(f"URL index sync failed, unknown URLs will be checked against Supabase. Error: {e}")
+        print(f"URL index ready: {len(index.keys)} URLs ({len(index.keys) - known_before} new since last run).")
+        return index
+
+    def sync(self, supabase, page_size: int = PAGE_SIZE):
+        """Pages in the URLs of every article with an id above `max_id`."""
+        while True:
+            rows = (
+                supabase.table('articles')
+                .select('id, url')
+                .gt('id', self.max_id)
+                .order('id')
+                .limit(page_size)
+                .execute()
+            ).data or []
+            for row in rows:
+                if row.get('url'):
+                    self.keys.add(url_key(row['url']))
+            if rows:
+                self.max_id = max(self.max_id, max(row['id'] for row in rows))
+            if len(rows) < page_size:
+                return
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        keys = np.fromiter(self.keys, dtype=np.uint64, count=len(self.keys))
+        keys.sort()
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(tmp_path, keys=keys, max_id=np.int64(self.max_id))
+        os.replace(tmp_path, self.path)
+
+    def __contains__(self, url: str) -> bool:
+        return url_key(url) in self.keys
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, url: str):
+        self.keys.add(url_key(url))
+
+    def filter_new(self, supabase, urls: list) -> list:
+        """Returns the URLs that are not stored yet, dropping near-duplicates within `urls` too.
+
+        Index hits are skipped without a network call, and so are misses once the index is fully
+        synced. Only when the sync failed are misses confirmed with chunked `in_` queries.
+        """
+        candidates, seen = [], set()
+        for url in urls:
+            key = url_key(url)
+            if key in self.keys or key in seen:
+                continue
+            seen.add(key)
+            candidates.append(url)
+
+        if not candidates or self.complete:
+            return candidates
+
+        for start in range(0, len(candidates), LOOKUP_CHUNK):
+            chunk = candidates[start:start + LOOKUP_CHUNK]
+            rows = supabase.table('articles').select('url').in_('url', chunk).execute().data or []
+            for row in rows:
+                self.add(row['url'])
+        return [url for url in candidates if url not in self]
@@ -1,153 +1,262 @@
 import os
-import trafilatura
 from supabase import create_client, Client
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
-import torch
+from embeddings import encode_texts, load_embedder
+from quantize import format_embedding
+from index_version import REWRITES_INDEX, SUMMARY_INPUTS_INDEX, bump_index_version
+from digests import ARTICLE_DIGESTS, add_digests
+from chunks import ARTICLE_CHUNKS, CHUNKS_TABLE, store_chunks
+from extract import ExtractionPool
+from duplicates import LINK_DUPLICATES
+from bulk_writer import BulkWriter
+from fetcher import fetch_pages
+from ingest_queue import IngestQueue, Stage, StagePipeline
 load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_ANON = os.getenv("SUPABASE_ANON")
-supabase:Client=create_client(SUPABASE_URL,SUPABASE_ANON)
 
-# Device / model setup
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"Vector generator using device: {device}")
-model = SentenceTransformer('all-mpnet-base-v2', device=device)
+# The client, model, writer and extraction pool are created under __main__ below, since the
+# extraction workers are spawned processes that import this module again
+supabase: Client = None
+# Model setup (torch or onnxruntime, see EMBEDDING_BACKEND)
+model = None
+# Every upsert into articles goes through one batching writer (rows accumulate across pages)
+article_writer = None
 
 # Existing batch embedding function
 def generate_and_update_embeddings(batch_size: int = 20):
     """Generate embeddings for articles that already have content but no embedding."""
 
+    last_id = 0  # keyset cursor: rows without usable content are passed over instead of re-queried forever
+    rows_before = article_writer.stats["rows"]
     while True:
         print(f"\nFetching a batch of {batch_size} articles missing embeddings...")
 
-        # Supabase Python client doesn't yet expose a clean `.is_()` for PostgREST `is`. Use `or_` with null check.
-        response = (
-            supabase
-            .table('articles')
-            .select('id, content')
-            .or_('embedding.is.null')
-            .limit(batch_size)
-            .execute()
-        )
+        query = supabase.table('articles').select('id, content').is_('embedding', 'null').gt('id', last_id)
+        if LINK_DUPLICATES:
+            query = query.is_('duplicate_of', 'null')  # linked copies stay unembedded
+        response = query.order('id').limit(batch_size).execute()
 
         if not response.data:
+            article_writer.flush()
+            if article_writer.stats["rows"] > rows_before:
+                # Existing rows gained embeddings: the in-memory indexes reload them, not just new ids
+                bump_index_version(supabase, REWRITES_INDEX)
+                bump_index_version(supabase)
             print("All articles already have embeddings. 🎉")
             break
+        last_id = response.data[-1]['id']
 
-        updates = []
+        rows = []
         for row in response.data:
             content = row.get('content', '') or ''
             if not content or content.strip() in ("SCRAPE_FAILED",):
                 continue  # skip problematic rows
+            rows.append(row)
 
-            embedding = model.encode(content[:4000]).tolist()
-
-            updates.append({
-                'id': row['id'],
-                'embedding': embedding
-            })
+        # Encode the whole page in one batched pass
+        vectors = encode_texts(model, [row['content'] for row in rows])
+        updates = [
+            {'id': row['id'], 'embedding': format_embedding(vector)}
+            for row, vector in zip(rows, vectors)
+        ]
 
         if updates:
-            print(f"Updating {len(updates)} rows with new embeddings...")
-            # Use returning='minimal' to reduce payload and avoid timeouts
-            supabase.table('articles').upsert(updates, returning="minimal").execute()
-            print("Batch upsert complete.")
+            print(f"Queueing {len(updates)} rows with new embeddings...")
+            article_writer.add_many(updates)
 
 # --- NEW ENRICHMENT FUNCTION ---
+# Runs as stages on the durable ingest queue: discover -> fetch -> extract -> embed -> write
 
-def enrich_and_embed_articles(batch_size: int = 20):
-    """Scrape full content for Hacker-News articles (or any others) whose content is missing or obviously incomplete,
-    then generate fresh embeddings.
+extraction_pool = None
+ENRICH_KIND = "enrich"
+# Discovery only looks above the id reached by earlier runs; ENRICH_RESCAN=1 walks the whole table
+# again, for older rows that need enrichment since (title-only HN stories, SCRAPE_FAILED resets)
+ENRICH_RESCAN = os.getenv("ENRICH_RESCAN") == "1"
 
-    Criteria handled *client-side* (because PostgREST can't compare two columns):
+def needs_enrichment(row) -> bool:
+    """Criteria handled *client-side* (because PostgREST can't compare two columns):
       • content is None / NULL
       • content == title  (title-only placeholder)
       • len(content) < 300 characters  (very short — likely summary)
       • content == 'SCRAPE_FAILED' (previous failed attempt)
     """
+    content = row['content']
+    if content is None or content == 'SCRAPE_FAILED':
+        return True
+    return content.strip() == (row['title'] or '').strip() or len(content) < 300
 
-    processed_any = False
+def discover_enrichment(queue: IngestQueue, batch_size: int = 200, rescan: bool = ENRICH_RESCAN) -> int:
+    """Queues candidate rows above the id reached by earlier runs (or all, with `rescan`), moving
+    that cursor per page."""
+    last_id = 0 if rescan else queue.get_meta("enrich_after_id", 0)
+    queued = 0
     while True:
-        print(f"\nQuerying potential rows to enrich (batch size={batch_size}) …")
-
-        # First attempt – quickly grab rows with NULL or explicit failure markers (server-side filter)
-        response = (
+        rows = (
             supabase
             .table('articles')
             .select('id, url, title, content')
-            .or_('content.is.null,content.eq.SCRAPE_FAILED')
+            .or_('content.is.null,content.eq.SCRAPE_FAILED,company.eq.Hacker News')
+            .gt('id', last_id)
+            .order('id')
             .limit(batch_size)
             .execute()
-        )
-
-        rows = response.data or []
-
-        # If that returns fewer than we want, fall back to HN rows that look suspiciously short
-        if len(rows) < batch_size:
-            remaining = batch_size - len(rows)
-            hn_resp = (
-                supabase
-                .table('articles')
-                .select('id, url, title, content')
-                .eq('company', 'Hacker News')
-                .limit(remaining * 3)  # fetch a few extra and filter locally
-                .execute()
-            )
-            for r in hn_resp.data or []:
-                if r['content'] is None:
-                    rows.append(r)
-                    continue
-                if r['content'].strip() == r['title'].strip():
-                    rows.append(r)
-                elif len(r['content']) < 300:
-                    rows.append(r)
-                if len(rows) >= batch_size:
-                    break
-
+        ).data or []
         if not rows:
-            if not processed_any:
-                print("No articles matched the enrichment criteria. ✅")
-            else:
-                print("Enrichment complete. ✅")
-            break
+            return queued
+        last_id = rows[-1]['id']
+        items = [(f"{ENRICH_KIND}:{row['id']}", "fetch", {'id': row['id'], 'url': row['url'], 'title': row['title']})
+                 for row in rows if needs_enrichment(row)]
+        queued += queue.put_many(ENRICH_KIND, items)
+        queue.set_meta("enrich_after_id", last_id)
 
-        print(f"Processing {len(rows)} articles …")
+def fetch_stage(items: list) -> list:
+    pages = fetch_pages([item.payload['url'] for item in items])
+    for item, page in zip(items, pages):
+        item.html = page
+    # An unreachable page is not retried here; extraction marks it SCRAPE_FAILED like any short page
+    return [None] * len(items)
 
-        updates = []
-        for article in rows:
-            print(f"  -> Scraping {article['url']}")
+def extract_stage(items: list) -> list:
+    by_key = {item.key: item for item in items}
+    for key, full_content in extraction_pool.extract_many((item.key, item.html) for item in items):
+        item = by_key[key]
+        print(f"  -> Scraped {item.payload['url']}")
+        if not full_content or len(full_content) < 200:
+            # Still could not get good content
+            print("     × Extraction failed or very short. Marking as SCRAPE_FAILED.")
+            item.payload['failed'] = True
+        else:
+            item.payload['content'] = full_content
+        item.html = None
+    return [None] * len(items)
 
-            try:
-                downloaded = trafilatura.fetch_url(article['url'])
-                full_content = trafilatura.extract(downloaded) or ""
-            except Exception:
-                full_content = ""
+def embed_stage(items: list) -> list:
+    enriched = [item.payload for item in items if not item.payload.get('failed')]
+    vectors = encode_texts(model, [row['content'] for row in enriched])
+    for row, vector in zip(enriched, vectors):
+        row['embedding'] = format_embedding(vector)
+    return [None] * len(items)
+
+def write_stage(items: list) -> list:
+    failed = [item.payload['id'] for item in items if item.payload.get('failed')]
+    enriched = [item.payload for item in items if not item.payload.get('failed')]
+    if failed:
+        supabase.table('articles').update({'content': 'SCRAPE_FAILED'}).in_('id', failed).execute()
+    if enriched:
+        if ARTICLE_DIGESTS:
+            # The content changed, so its digest is recomputed too (titles only feed keywords)
+            add_digests(model, enriched)
+        updates = [{key: row[key] for key in ('id', 'content', 'embedding', 'digest', 'keywords') if key in row}
+                   for row in enriched]
+        print(f"Upserting {len(updates)} enriched rows …")
+        errors = dict(zip((row['id'] for row in updates), article_writer.write(updates)))
+        written = [row for row in enriched if errors[row['id']] is None]
+        if ARTICLE_CHUNKS and written:
+            store_chunks(supabase, model, written, replace=True)
+        if written:
+            bump_index_version(supabase)
+        print(f"Batch saved ({len(written)} of {len(updates)} rows).")
+        # Rows the writer could not store go back to the queue for a retry
+        return [errors.get(item.payload['id']) for item in items]
+    return [None] * len(items)
 
-            if not full_content or len(full_content) < 200:
-                # Still could not get good content
-                print("     × Extraction failed or very short. Marking as SCRAPE_FAILED.")
-                supabase.table('articles').update({'content': 'SCRAPE_FAILED'}).eq('id', article['id']).execute()
-                continue
+def enrich_and_embed_articles(queue: IngestQueue):
+    """Scrape full content for Hacker-News articles (or any others) whose content is missing or obviously incomplete,
+    then generate fresh embeddings. Rows left queued by an interrupted run are finished first.
+    """
+    pipeline = StagePipeline(queue, ENRICH_KIND, [
+        Stage("fetch", fetch_stage, batch_size=32),
+        Stage("extract", extract_stage, batch_size=20),
+        Stage("embed", embed_stage, batch_size=64),
+        Stage("write", write_stage, batch_size=50),
+    ]).start()
+    try:
+        print(f"Queued {discover_enrichment(queue)} articles to enrich.")
+        pipeline.join()
+    finally:
+        if pipeline.stats["write"]["items"]:
+            # Content and embeddings of existing rows changed (or they were marked SCRAPE_FAILED)
+            bump_index_version(supabase, REWRITES_INDEX)
+            bump_index_version(supabase, SUMMARY_INPUTS_INDEX)
+            bump_index_version(supabase)
+        print(pipeline.report())
 
-            embedding = model.encode(full_content[:4000]).tolist()
+def generate_missing_digests(batch_size: int = 100):
+    """Backfill the extractive digest and keywords of articles stored before digests existed."""
+    last_id = 0
+    rows_before = article_writer.stats["rows"]
+    while True:
+        rows = (
+            supabase
+            .table('articles')
+            .select('id, title, content')
+            .is_('digest', 'null')
+            .gt('id', last_id)
+            .order('id')
+            .limit(batch_size)
+            .execute()
+        ).data or []
+        if not rows:
+            article_writer.flush()
+            if article_writer.stats["rows"] > rows_before:
+                # Summaries cached from raw content are rebuilt from the digests
+                bump_index_version(supabase, SUMMARY_INPUTS_INDEX)
+            print("All articles have digests. 🎉")
+            break
+        last_id = rows[-1]['id']
 
-            updates.append({
-                'id': article['id'],
-                'content': full_content,
-                'embedding': embedding
-            })
+        add_digests(model, rows)
+        updates = [{'id': row['id'], 'digest': row['digest'], 'keywords': row['keywords']} for row in rows]
+        print(f"Queueing {len(updates)} rows with digests...")
+        article_writer.add_many(updates)
 
-        if updates:
-            print(f"Upserting {len(updates)} enriched rows …")
-            supabase.table('articles').upsert(updates, returning="minimal").execute()
-            processed_any = True
-            print("Batch saved.")
+def generate_missing_chunks(batch_size: int = 50):
+    """Backfill passage embeddings for articles newer than the newest one already chunked."""
+    newest = supabase.table(CHUNKS_TABLE).select('article_id').order('article_id', desc=True).limit(1).execute().data
+    last_id = newest[0]['article_id'] if newest else 0
+    while True:
+        rows = (
+            supabase
+            .table('articles')
+            .select('id, content')
+            .gt('id', last_id)
+            .order('id')
+            .limit(batch_size)
+            .execute()
+        ).data or []
+        if not rows:
+            print("All articles have chunk embeddings. 🎉")
+            break
+        last_id = rows[-1]['id']
+        rows = [row for row in rows if row.get('content') and row['content'] != 'SCRAPE_FAILED']
+        print(f"Stored {store_chunks(supabase, model, rows)} chunks for {len(rows)} articles.")
+        bump_index_version(supabase)
 
-# To run enrichment, execute this file with ENRICH=1 env var.
+# To run enrichment, execute this file with ENRICH=1 env var; DIGESTS=1 backfills article digests
+# and CHUNKS=1 passage embeddings.
 if __name__ == "__main__":
-    if os.getenv("ENRICH") == "1":
-        enrich_and_embed_articles()
-    else:
-    generate_and_update_embeddings()
+    supabase = create_client(SUPABASE_URL, SUPABASE_ANON)
+    article_writer = BulkWriter(supabase, 'articles', upsert=True)
+    extraction_pool = ExtractionPool()
+    model = load_embedder()
+    try:
+        if os.getenv("ENRICH") == "1":
+            ingest_queue = IngestQueue.open()
+            try:
+                enrich_and_embed_articles(ingest_queue)
+            finally:
+                extraction_pool.close()
+                print(extraction_pool.report())
+                ingest_queue.close()
+        elif os.getenv("DIGESTS") == "1":
+            generate_missing_digests()
+        elif os.getenv("CHUNKS") == "1":
+            generate_missing_chunks()
+        else:
+            generate_and_update_embeddings()
+    finally:
+        article_writer.close()
+        print(article_writer.report())
+
 
@@ -0,0 +1,121 @@
+import json
+import threading
+import numpy as np
+
+# Columns kept in memory for each article; matches what the frontend renders from match_articles.
+ARTICLE_COLUMNS = 'id, title, url, company, published_date, content'
+# Only a preview of the content is held in memory (the result cards show a clamped snippet).
+CONTENT_PREVIEW_CHARS = 1000
+PAGE_SIZE = 500
+
+
+def parse_embedding(value) -> np.ndarray:
+    """PostgREST returns pgvector columns as '[0.1,0.2,...]' strings."""
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+
+def iter_embedded_articles(supabase, columns: str = 'id', after_id: int = 0, page_size: int = PAGE_SIZE):
+    """Yields (rows, float32 embedding matrix) pages of embedded articles with id > after_id."""
+    last_id = after_id
+    while True:
+        rows = (
+            supabase.table('articles')
+            .select(f'{columns}, embedding')
+            .filter('embedding', 'not.is', 'null')
+            .gt('id', last_id)
+            .order('id')
+            .limit(page_size)
+            .execute()
+        ).data or []
+        if rows:
+            embeddings = np.stack([parse_embedding(row.pop('embedding')) for row in rows])
+            last_id = rows[-1]['id']
+            yield rows, embeddings
+        if len(rows) < page_size:
+            return
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class VectorIndex:
+    """Exact cosine search over every article embedding, held in one contiguous float32 matrix.
+
+    Rows are L2-normalized on insert, so a query is one matrix-vector product followed by
+    `argpartition`. `search` mirrors the match_articles RPC: rows with similarity above
+    `match_threshold`, best first, at most `match_count` of them.
+    """
+
+    def __init__(self, dim: int = 768):
+        self.dim = dim
+        self.matrix = np.zeros((0, dim), dtype=np.float32)
+        self.rows = []
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes
+
+    @classmethod
+    def load(cls, supabase, dim: int = 768, page_size: int = PAGE_SIZE, **kwargs) -> "VectorIndex":
+        """Pages every embedded article out of Supabase."""
+        index = cls(dim, **kwargs)
+        for rows, embeddings in iter_embedded_articles(supabase, ARTICLE_COLUMNS, page_size=page_size):
+            index.add_many(rows, embeddings)
+        print(f"Local vector index loaded: {len(index)} articles, {index.nbytes / 1e6:.0f} MB.")
+        return index
+
+    def add_many(self, rows: list, embeddings: np.ndarray):
+        embeddings = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim))
+        rows = [self._slim(row) for row in rows]
+        with self._lock:
+            needed = self._size + len(rows)
+            if needed > self.matrix.shape[0]:
+                # Grow geometrically so incremental inserts stay amortized O(1).
+                grown = np.zeros((max(needed, 2 * self.matrix.shape[0], 1024), self.dim), dtype=np.float32)
+                grown[:self._size] = self.matrix[:self._size]
+                self.matrix = grown
+            self.matrix[self._size:needed] = embeddings
+            self.rows.extend(rows)
+            self._size = needed
+
+    def add(self, row: dict, embedding):
+        self.add_many([row], np.asarray(embedding, dtype=np.float32)[None, :])
+
+    @staticmethod
+    def _slim(row: dict) -> dict:
+        row = {key: value for key, value in row.items() if key != 'embedding'}
+        if isinstance(row.get('content'), str):
+            row['content'] = row['content'][:CONTENT_PREVIEW_CHARS]
+        return row
+
+    def scores(self, query) -> np.ndarray:
+        query = normalize_rows(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        return self.matrix[:self._size] @ query
+
+    def search(self, query, match_threshold: float = 0.2, match_count: int = 10) -> list:
+        scores = self.scores(query)
+        results = []
+        for i in top_k(scores, match_count):
+            if scores[i] <= match_threshold:
+                break
+            results.append(dict(self.rows[i], similarity=float(scores[i])))
+        return results